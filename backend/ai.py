@@ -0,0 +1,328 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+import metrics
+from cache import ResponseCache, make_key, normalize_text
+
+
+# ==================================
+# ASYNC OPENAI GATEWAY
+# ==================================
+# All AI routes go through `ai` so a slow completion never blocks the worker
+# and a full class can't starve the rest of the API:
+#   OPENAI_BASE_URL     point at a local stub server for testing (optional)
+#   AI_MAX_CONCURRENCY  completions allowed in flight at once (default 8)
+#   AI_MAX_QUEUE        requests allowed to wait for a slot (default 64, 503 beyond)
+#   AI_TIMEOUT          per-request deadline in seconds, queueing included (default 30)
+#   AI_CACHE_SIZE       cached answers kept in memory (default 1024, 0 disables)
+#   AI_CACHE_TTL        seconds a cached answer stays valid (default 86400)
+#   AI_CACHE_PATH       SQLite file so the cache survives restarts (optional)
+#
+# Identical prompts that arrive while one is already being answered join
+# that upstream call instead of starting their own (single-flight), whether
+# or not the cache is enabled: 40 clicks on the same passage cost one
+# completion. Streamed answers are replayed to every joined request.
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+
+
+def _landed(flights: dict, key: str):
+    """Done-callback that drops a finished flight (and marks its error as seen)."""
+    def callback(future: asyncio.Future):
+        if flights.get(key) is future:
+            del flights[key]
+        if not future.cancelled():
+            future.exception()
+    return callback
+
+
+class SharedStream:
+    """The deltas of one upstream stream so far, replayable by every request that joined it."""
+
+    def __init__(self):
+        self.parts: list[str] = []
+        self.done = False
+        self.error: BaseException | None = None
+        self.task: asyncio.Task | None = None
+        self._changed = asyncio.Event()
+
+    def push(self, delta: str):
+        self.parts.append(delta)
+        self._wake()
+
+    def finish(self, error: BaseException | None = None):
+        self.done = True
+        self.error = error
+        self._wake()
+
+    def _wake(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def follow(self):
+        i = 0
+        while True:
+            while i < len(self.parts):
+                yield self.parts[i]
+                i += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class AIGateway:
+    def __init__(self, api_key: str | None, base_url: str | None = None,
+                 max_concurrency: int = 8, max_queue: int = 64, timeout: float = 30.0,
+                 cache: ResponseCache | None = None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.cache = cache
+        self._client = None  # AsyncOpenAI, created on first use
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._flights: dict[str, asyncio.Future] = {}  # cache key → answer being generated
+        self._streams: dict[str, SharedStream] = {}
+        self.waiting = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.coalesced = 0
+
+    @classmethod
+    def from_env(cls) -> "AIGateway":
+        cache_size = int(os.getenv("AI_CACHE_SIZE", "1024"))
+        cache = ResponseCache(
+            max_entries=cache_size,
+            ttl=float(os.getenv("AI_CACHE_TTL", "86400")),
+            path=os.getenv("AI_CACHE_PATH") or None,
+        ) if cache_size > 0 else None
+        return cls(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=os.getenv("OPENAI_BASE_URL") or None,
+            max_concurrency=int(os.getenv("AI_MAX_CONCURRENCY", "8")),
+            max_queue=int(os.getenv("AI_MAX_QUEUE", "64")),
+            timeout=float(os.getenv("AI_TIMEOUT", "30")),
+            cache=cache,
+        )
+
+    @property
+    def client(self):
+        if self._client is None:
+            # Imported here: the openai package alone adds ~0.2 s to a cold start
+            from openai import AsyncOpenAI
+
+            # Retries are left to the caller; the deadline below bounds the whole call
+            self._client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url,
+                                       timeout=self.timeout, max_retries=0)
+        return self._client
+
+    @asynccontextmanager
+    async def _slot(self):
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="AI service is busy, please try again shortly.")
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    async def _create(self, messages: list[dict], model: str, **params):
+        async with self._slot():
+            return await self.client.chat.completions.create(model=model, messages=messages, **params)
+
+    def cache_key(self, endpoint: str, messages: list[dict], model: str, params: dict) -> str:
+        return make_key(
+            endpoint,
+            model,
+            [(m["role"], normalize_text(m["content"])) for m in messages],
+            params,
+        )
+
+    def shared(self, endpoint: str, messages: list[dict], model: str = DEFAULT_MODEL, **params) -> bool:
+        """
+        True when this prompt would be answered without a new upstream call
+        (in flight, or cached in memory). Leaves cache stats and LRU order alone.
+        """
+        key = self.cache_key(endpoint, messages, model, params)
+        if key in self._flights or key in self._streams:
+            return True
+        return self.cache is not None and self.cache.peek(key)
+
+    async def complete(self, messages: list[dict], model: str = DEFAULT_MODEL,
+                       timeout: float | None = None, cache_as: str | None = None,
+                       **params) -> str:
+        """
+        Runs one chat completion under the concurrency limit and returns the
+        message text. Raises 503 when the queue is full and 504 past the deadline.
+        With `cache_as` set (the endpoint name), answers are served from and
+        stored in the response cache, and identical prompts in flight share
+        one upstream call.
+        """
+        if not cache_as:
+            return await self._complete(messages, model, timeout, None, **params)
+
+        key = self.cache_key(cache_as, messages, model, params)
+        if self.cache is not None:
+            cached = await self.cache.aget(key)
+            if cached is not None:
+                return cached
+
+        flight = self._flights.get(key)
+        if flight is None:
+            # A task of its own, so a caller that disconnects doesn't cancel it for the others
+            flight = self._flights[key] = asyncio.ensure_future(
+                self._complete(messages, model, timeout, key, **params))
+            flight.add_done_callback(_landed(self._flights, key))
+        else:
+            self.coalesced += 1
+            metrics.openai_coalesced.inc(operation="complete")
+        return await asyncio.shield(flight)
+
+    async def _complete(self, messages: list[dict], model: str, timeout: float | None, key: str | None,
+                        **params) -> str:
+        started = time.perf_counter()
+        try:
+            completion = await asyncio.wait_for(self._create(messages, model, **params),
+                                                timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            metrics.record_ai("complete", time.perf_counter() - started, "timeout")
+            raise HTTPException(status_code=504, detail="AI request timed out.")
+        except HTTPException:
+            raise
+        except Exception:
+            self.failed += 1
+            metrics.record_ai("complete", time.perf_counter() - started, "error")
+            raise
+        self.completed += 1
+        metrics.record_ai("complete", time.perf_counter() - started, "ok", completion.usage)
+        content = completion.choices[0].message.content
+        if key is not None and self.cache is not None and content:
+            self.cache.set(key, content)
+        return content
+
+    async def stream(self, messages: list[dict], model: str = DEFAULT_MODEL,
+                     timeout: float | None = None, cache_as: str | None = None,
+                     **params):
+        """
+        Async generator yielding text deltas as the completion is produced.
+        Holds a concurrency slot until the stream ends; the deadline covers the
+        whole stream. A cached answer is yielded as a single chunk. With
+        `cache_as` set, a request for a prompt already streaming joins that
+        stream: it gets the deltas so far at once, then the rest as they come.
+        """
+        if not cache_as:
+            async for delta in self._stream(messages, model, timeout, None, **params):
+                yield delta
+            return
+
+        key = self.cache_key(cache_as, messages, model, params)
+        if self.cache is not None:
+            cached = await self.cache.aget(key)
+            if cached is not None:
+                yield cached
+                return
+
+        shared = self._streams.get(key)
+        if shared is None:
+            shared = self._streams[key] = SharedStream()
+            shared.task = asyncio.ensure_future(self._pump(shared, key, messages, model, timeout, **params))
+        else:
+            self.coalesced += 1
+            metrics.openai_coalesced.inc(operation="stream")
+        async for delta in shared.follow():
+            yield delta
+
+    async def _pump(self, shared: SharedStream, key: str, messages: list[dict], model: str,
+                    timeout: float | None, **params):
+        """Feeds one upstream stream into `shared`; runs on even if the request that started it goes away."""
+        try:
+            async for delta in self._stream(messages, model, timeout, key, **params):
+                shared.push(delta)
+            shared.finish()
+        except Exception as e:
+            shared.finish(e)
+        finally:
+            if self._streams.get(key) is shared:
+                del self._streams[key]
+
+    async def _stream(self, messages: list[dict], model: str, timeout: float | None, key: str | None,
+                      **params):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout or self.timeout)
+        started = time.perf_counter()
+        parts = []
+        try:
+            async with self._slot():
+                chunks = await asyncio.wait_for(
+                    self.client.chat.completions.create(model=model, messages=messages,
+                                                        stream=True, **params),
+                    deadline - loop.time(),
+                )
+                iterator = chunks.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(iterator.__anext__(), deadline - loop.time())
+                    except StopAsyncIteration:
+                        break
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            metrics.record_ai("stream", time.perf_counter() - started, "timeout")
+            raise HTTPException(status_code=504, detail="AI request timed out.")
+        except HTTPException:
+            raise
+        except Exception:
+            self.failed += 1
+            metrics.record_ai("stream", time.perf_counter() - started, "error")
+            raise
+        self.completed += 1
+        metrics.record_ai("stream", time.perf_counter() - started, "ok")
+        content = "".join(parts)
+        if key is not None and self.cache is not None and content:
+            self.cache.set(key, content)
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "max_queue": self.max_queue,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "coalesced": self.coalesced,
+            "shared_in_flight": len(self._flights) + len(self._streams),
+            "cache": self.cache.stats() if self.cache is not None else None,
+        }
+
+    async def close(self):
+        if self.cache is not None:
+            await self.cache.flush()
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+ai = AIGateway.from_env()
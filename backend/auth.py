@@ -0,0 +1,175 @@
+import asyncio
+import os
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import Depends, HTTPException, Request
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+from passlib.context import CryptContext
+
+from cache import ResponseCache
+
+
+# ==================================
+# PASSWORD HASHING (bcrypt in a process pool)
+# ==================================
+#   BCRYPT_ROUNDS       cost factor for new hashes (default 12); older hashes
+#                       are upgraded transparently on the next successful login
+#   HASH_WORKERS        bcrypt worker processes (default: CPU count)
+#   HASH_MAX_QUEUE      hash/verify jobs allowed to wait (default 64, 503 beyond)
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# The one password context used everywhere
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, hashed: str) -> tuple[bool, str | None]:
+    if not hashed:
+        return False, None
+    try:
+        return pwd_context.verify_and_update(password, hashed)
+    except ValueError:
+        # Unrecognised / corrupt hash: treat as a failed login, not a crash
+        return False, None
+
+
+def _load_backend() -> str:
+    return pwd_context.handler("bcrypt").get_backend()
+
+
+class PasswordHasher:
+    def __init__(self, workers: int | None = None, max_queue: int = 64):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self._pool: ProcessPoolExecutor | None = None
+        self.pending = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls) -> "PasswordHasher":
+        workers = os.getenv("HASH_WORKERS")
+        return cls(
+            workers=int(workers) if workers else None,
+            max_queue=int(os.getenv("HASH_MAX_QUEUE", "64")),
+        )
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    async def _submit(self, fn, *args):
+        # Backpressure: jobs beyond workers + max_queue are refused outright
+        # instead of piling up behind a login storm
+        if self.pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Too many sign-in attempts right now, please retry.",
+                                headers={"Retry-After": "1"})
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def warm(self):
+        """Starts the worker processes and loads bcrypt in them, so the first login doesn't."""
+        await asyncio.gather(*[
+            asyncio.get_running_loop().run_in_executor(self.pool, _load_backend) for _ in range(self.workers)
+        ])
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(_hash, password)
+
+    async def verify(self, password: str, hashed: str) -> tuple[bool, str | None]:
+        """
+        Returns (valid, new_hash). `new_hash` is set when the stored hash uses
+        outdated settings (e.g. a lower BCRYPT_ROUNDS) and should be saved.
+        """
+        return await self._submit(_verify_and_update, password, hashed)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_queue": self.max_queue,
+            "rejected": self.rejected,
+            "bcrypt_rounds": BCRYPT_ROUNDS,
+        }
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+passwords = PasswordHasher.from_env()
+
+
+# ==================================
+# SESSION TOKENS (signed, stateless)
+# ==================================
+#   SESSION_SECRET        signing key; set it in production so tokens survive
+#                         restarts and work across workers
+#   SESSION_TTL           token lifetime in seconds (default 28800 = 8 h)
+#   LOGIN_NEGATIVE_TTL    seconds an unknown email is remembered (default 30)
+
+SESSION_TTL = int(os.getenv("SESSION_TTL", "28800"))
+
+_serializer = URLSafeTimedSerializer(
+    os.getenv("SESSION_SECRET") or secrets.token_urlsafe(32),
+    salt="brightpath-session",
+)
+
+# Emails with no account, so repeated bad logins skip the database
+unknown_emails = ResponseCache(max_entries=10000, ttl=float(os.getenv("LOGIN_NEGATIVE_TTL", "30")))
+
+
+def issue_token(user: dict) -> str:
+    return _serializer.dumps({
+        "id": user["id"],
+        "name": user["name"],
+        "email": user["email"],
+        "role": user["role"],
+    })
+
+
+def read_token(token: str) -> dict:
+    try:
+        return _serializer.loads(token, max_age=SESSION_TTL)
+    except SignatureExpired:
+        raise HTTPException(status_code=401, detail="Session expired, please log in again.")
+    except BadSignature:
+        raise HTTPException(status_code=401, detail="Invalid session token.")
+
+
+def current_user(request: Request) -> dict:
+    """
+    FastAPI dependency: the signed-in user from `Authorization: Bearer <token>`,
+    verified without touching the database.
+    """
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return read_token(token)
+
+
+def require_role(*roles: str):
+    """
+    FastAPI dependency factory: the signed-in user, or 403 unless their token
+    carries one of `roles`. Still no database hit.
+    """
+    def dependency(user: dict = Depends(current_user)) -> dict:
+        if user.get("role") not in roles:
+            raise HTTPException(status_code=403, detail="You don't have permission to do this.")
+        return user
+    return dependency
+
+
+admin_only = require_role("admin")
+staff_only = require_role("admin", "teacher")  # admins and teachers may record marks
@@ -0,0 +1,130 @@
+import asyncio
+from urllib.parse import unquote, urlsplit
+
+import orjson
+from starlette.middleware.exceptions import ExceptionMiddleware
+from starlette.responses import StreamingResponse
+from starlette.routing import Match
+
+from refdata import ref
+
+
+# ==================================
+# BATCHED READS (POST /batch)
+# ==================================
+# Runs several GET requests against the app's own routes in one HTTP
+# request. Each sub-request goes straight to the router (with FastAPI's
+# exception handlers, so a 404 or 422 becomes that item's status) and
+# skips CORS, compression and per-request metrics; its Supabase calls count
+# towards the batch's own Server-Timing. All items run concurrently inside
+# one ref.pinned() block, so they share a single read of each reference
+# dataset.
+
+# Request headers passed on to every sub-request
+FORWARDED_HEADERS = {b"authorization", b"cookie", b"user-agent", b"x-forwarded-for"}
+
+
+class BatchError(ValueError):
+    """A sub-request that is rejected before it runs (bad path, unbatchable route)."""
+
+
+def streams(route) -> bool:
+    """
+    Routes declared with response_class=StreamingResponse (SSE feeds,
+    downloads) stay open or are meant to be saved, so they can't be batched.
+    """
+    response_class = getattr(route, "response_class", None)
+    response_class = getattr(response_class, "value", response_class)  # unwrap FastAPI's Default(...)
+    return isinstance(response_class, type) and issubclass(response_class, StreamingResponse)
+
+
+class BatchDispatcher:
+    def __init__(self, app):
+        self.app = app
+        self._handler = None
+
+    @property
+    def handler(self):
+        # Built on first use, after every exception handler is registered
+        if self._handler is None:
+            handlers = {k: v for k, v in self.app.exception_handlers.items() if k not in (500, Exception)}
+            self._handler = ExceptionMiddleware(self.app.router, handlers=handlers)
+        return self._handler
+
+    def scope(self, parent: dict, path: str, etag: str | None) -> dict:
+        if not path.startswith("/") or path.startswith("//"):
+            raise BatchError("path must be a path on this API, e.g. /get-subjects")
+        url = urlsplit(path)
+        headers = [(k, v) for k, v in parent["headers"] if k in FORWARDED_HEADERS]
+        headers.append((b"accept", b"application/json"))
+        if etag:
+            headers.append((b"if-none-match", etag.encode("latin-1")))
+        scope = {
+            "type": "http",
+            "asgi": parent.get("asgi", {"version": "3.0"}),
+            "http_version": parent.get("http_version", "1.1"),
+            "method": "GET",
+            "scheme": parent.get("scheme", "http"),
+            "server": parent.get("server"),
+            "client": parent.get("client"),
+            "root_path": parent.get("root_path", ""),
+            "path": unquote(url.path),  # routing matches decoded paths, as a server would pass them
+            "raw_path": url.path.encode(),
+            "query_string": url.query.encode(),
+            "headers": headers,
+            "app": self.app,
+        }
+        if "state" in parent:
+            scope["state"] = parent["state"].copy()
+        for route in self.app.router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL and streams(route):
+                raise BatchError(f"{route.path} streams its response and can't be batched")
+        return scope
+
+    async def call(self, scope: dict) -> dict:
+        """Runs one sub-request; returns its status, headers and parsed body."""
+        response = {"status": 500, "headers": {}, "body": []}
+
+        async def receive():
+            if response.get("received"):
+                await asyncio.Event().wait()  # no disconnect until the batch is done
+            response["received"] = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = {k.decode("latin-1").lower(): v.decode("latin-1")
+                                       for k, v in message.get("headers", [])}
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+
+        await self.handler(scope, receive, send)
+        return response
+
+    async def item(self, parent: dict, request: dict) -> dict:
+        out = {"id": request.get("id"), "path": request["path"]}
+        try:
+            sub = await self.call(self.scope(parent, request["path"], request.get("etag")))
+        except BatchError as e:
+            return {**out, "status": 400, "body": {"detail": str(e)}}
+        except Exception as e:
+            return {**out, "status": 500, "body": {"detail": str(e)}}
+
+        body = b"".join(sub["body"])
+        out["status"] = sub["status"]
+        if "etag" in sub["headers"]:
+            out["etag"] = sub["headers"]["etag"]
+        if not body:
+            out["body"] = None
+        elif sub["headers"].get("content-type", "").startswith("application/json"):
+            out["body"] = orjson.loads(body)
+        else:
+            out["body"] = body.decode("utf-8", "replace")
+        return out
+
+    async def run(self, parent: dict, requests: list[dict]) -> list[dict]:
+        """Runs every sub-request concurrently; results come back in request order."""
+        with ref.pinned():
+            return await asyncio.gather(*[self.item(parent, r) for r in requests])
@@ -0,0 +1,440 @@
+"""
+Endpoint benchmarks: every route in main.py, driven through ASGI against an
+in-memory Supabase (benchmarks/fake_supabase.py) and a stubbed OpenAI.
+
+    python benchmarks/bench_endpoints.py [--profile small|medium|large] [--requests 20]
+        [--db-latency-ms 0] [--only get-students] [--json report.json]
+        [--baseline report.json] [--tolerance 0.25] [--slack-ms 2]
+
+Profiles seed 1k / 10k / 100k students with several terms of marks. For each
+scenario it reports latency percentiles, Supabase round trips and time spent
+in the stand-in per request, the response size, and the peak Python heap
+growth of one traced request. Read-only scenarios run before the ones that
+write, so the dataset the reads see doesn't drift.
+
+Exits non-zero when a route has no scenario, a scenario answers with an
+unexpected status, or (with --baseline) a scenario's p95 latency exceeds the
+baseline by more than --tolerance (plus --slack-ms) or it makes more round
+trips than before — so a saved report works as a regression gate:
+
+    python benchmarks/bench_endpoints.py --json baseline.json      # on main
+    python benchmarks/bench_endpoints.py --baseline baseline.json  # on the branch
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import re
+import sys
+import time
+import tracemalloc
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# The app reads its settings at import time; keep the benchmark self-contained
+os.environ.setdefault("SUPABASE_URL", "http://supabase.bench")
+os.environ.setdefault("SUPABASE_KEY", "bench")
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")  # login cost is measured by bench_passwords.py
+os.environ.setdefault("AI_CACHE_SIZE", "0")  # every AI call goes through the stub
+os.environ.setdefault("AI_RATE_LIMIT", "0")  # one client sends every request
+
+import httpx  # noqa: E402
+from fastapi.routing import APIRoute  # noqa: E402
+from openai import AsyncOpenAI  # noqa: E402
+
+import main  # noqa: E402
+from auth import pwd_context  # noqa: E402
+from fake_supabase import GRADES, PROFILES, FakeSupabase  # noqa: E402
+
+PASSWORD = "bench-password"
+TERM = "2025-T1"
+
+
+class Scenario:
+    """
+    One kind of request to `route`. `build(ctx, i)` returns the keyword
+    arguments for httpx (url defaults to the route path) and may prepare
+    rows in the stand-in first, untimed — e.g. a fresh row to delete.
+    """
+
+    def __init__(self, method: str, route: str, build=None, name: str | None = None,
+                 expect: int = 200, heavy: bool = False):
+        self.method = method
+        self.route = route
+        self.build = build or (lambda ctx, i: {})
+        self.name = name or f"{method} {route}"
+        self.expect = expect
+        self.heavy = heavy  # full-table reads/writes: fewer repetitions
+
+    @property
+    def writes(self) -> bool:
+        return self.method != "GET"
+
+
+class Context:
+    def __init__(self, fake: FakeSupabase, profile: str):
+        self.fake = fake
+        self.students = PROFILES[profile][0]
+        self.token = None
+        self.etag = None
+        self.job_id = None
+        self.question_job_id = None
+
+    def fresh(self, table: str, row: dict) -> int:
+        return self.fake.insert(table, row)["id"]
+
+
+def results_csv(ctx: Context, i: int, rows: int = 200) -> bytes:
+    lines = ["reg_no,marks"]
+    for n in range(rows):
+        student = (i * rows + n) % ctx.students + 1
+        lines.append(f"BP/{student:06d},{(student * 7 + i) % 101}")
+    return ("\n".join(lines) + "\n").encode()
+
+
+SCENARIOS = [
+    Scenario("GET", "/"),
+    Scenario("GET", "/health"),
+    Scenario("POST", "/add-announcement", lambda c, i: {"json": {"message": f"Bench notice {i}", "posted_by": "bench"}}),
+    Scenario("GET", "/get-announcements"),
+    Scenario("GET", "/get-announcements", lambda c, i: {"params": {"limit": 20}}, name="GET /get-announcements?limit=20"),
+    Scenario("POST", "/login", lambda c, i: {"json": {"email": "admin@school.test", "password": PASSWORD}}),
+    Scenario("GET", "/me", lambda c, i: {"headers": {"Authorization": f"Bearer {c.token}"}}),
+    Scenario("POST", "/add-admin", lambda c, i: {"json": {"name": f"Admin {i}", "email": f"admin{i}@bench.test",
+                                                          "password": PASSWORD}}),
+    Scenario("POST", "/admin/compile-results", lambda c, i: {"params": {"term": TERM}}, name="POST /admin/compile-results"),
+    Scenario("POST", "/admin/compile-results", lambda c, i: {"params": {"term": TERM, "full": "true"}},
+             name="POST /admin/compile-results?full", heavy=True),
+    Scenario("GET", "/admin/compile-results/jobs/{job_id}",
+             lambda c, i: {"url": f"/admin/compile-results/jobs/{c.job_id}"}),
+    Scenario("GET", "/get-admins"),
+    Scenario("PUT", "/update-admin/{admin_id}", lambda c, i: {"url": "/update-admin/1", "json": {"name": "Head Teacher"}}),
+    Scenario("DELETE", "/delete-admin/{admin_id}", lambda c, i: {
+        "url": f"/delete-admin/{c.fresh('users', {'name': 'Temp', 'email': f'temp{i}@bench.test', 'role': 'admin'})}"}),
+    Scenario("POST", "/signup-teacher", lambda c, i: {"json": {
+        "name": f"Signup {i}", "email": f"signup{i}@bench.example.com", "password": PASSWORD,
+        "department": "Sciences", "subjects": ["1", "4"], "grades": ["Grade 7"]}}),
+    Scenario("POST", "/add-teacher", lambda c, i: {"json": {"name": f"Staff {i}", "email": f"staff{i}@bench.test",
+                                                            "password": PASSWORD}}),
+    Scenario("GET", "/events"),  # time to the first event; see stream_first_chunk()
+    Scenario("GET", "/events/stats"),
+    Scenario("POST", "/summarize", lambda c, i: {"json": {"text": f"Term report {i}: marks improved in science."}}),
+    Scenario("POST", "/explain", lambda c, i: {"json": {"concept": f"photosynthesis ({i})"}}),
+    Scenario("POST", "/generate-questions", lambda c, i: {"json": {"text": f"Fractions and decimals, part {i}."}}),
+    Scenario("POST", "/generate-questions/jobs", lambda c, i: {"json": {
+        "passages": [f"Fractions, part {i}.", f"Decimals, part {i}."], "count": 10}}),
+    Scenario("GET", "/generate-questions/jobs/{job_id}",
+             lambda c, i: {"url": f"/generate-questions/jobs/{c.question_job_id}"}),
+    # A finished job: the stream sends the result and ends
+    Scenario("GET", "/generate-questions/jobs/{job_id}/events",
+             lambda c, i: {"url": f"/generate-questions/jobs/{c.question_job_id}/events"}),
+    Scenario("GET", "/cache/stats"),
+    Scenario("GET", "/ai/stats"),
+    Scenario("GET", "/metrics"),
+    Scenario("POST", "/batch", lambda c, i: {"json": {"requests": [
+        {"path": "/get-subjects"}, {"path": "/get-students?limit=100"}, {"path": "/get-teachers"},
+        {"path": "/get-parents?limit=100"}, {"path": f"/admin/results-summary?term={TERM}"},
+        {"path": "/admin/view-results?limit=100"}]}}, name="POST /batch (admin page)"),
+    Scenario("POST", "/add-student", lambda c, i: {"json": {"name": f"New Student {i}", "gender": "Female",
+                                                            "date_of_birth": "2015-04-12", "grade": "Grade 4"}}),
+    Scenario("POST", "/add-parent", lambda c, i: {"json": {"name": f"New Parent {i}", "email": f"newparent{i}@bench.test",
+                                                           "phone": "+254700000000"}}),
+    Scenario("POST", "/parent/signup", lambda c, i: {"json": {
+        "name": f"Signup Parent {i}", "email": f"sp{i}@bench.test", "phone": "+254700000001",
+        "password": PASSWORD, "admission_no": f"BP/{i % c.students + 1:06d}"}}),
+    Scenario("POST", "/add-subject", lambda c, i: {"json": {"name": f"Elective {i}", "description": "Bench"}}),
+    Scenario("POST", "/assign-subject", lambda c, i: {"json": {"teacher_id": 1, "subject_id": i % 12 + 1}}),
+    Scenario("GET", "/get-teachers"),
+    Scenario("GET", "/get-teachers", lambda c, i: {"params": {"limit": 50}}, name="GET /get-teachers?limit=50"),
+    Scenario("GET", "/get-students", heavy=True),
+    Scenario("GET", "/get-students", lambda c, i: {"params": {"limit": 100}}, name="GET /get-students?limit=100"),
+    Scenario("GET", "/get-students", lambda c, i: {"params": {"grade": GRADES[i % len(GRADES)], "limit": 100}},
+             name="GET /get-students?grade&limit=100"),
+    Scenario("GET", "/get-students", lambda c, i: {"params": {"subject_id": i % 12 + 1, "limit": 100}},
+             name="GET /get-students?subject_id&limit=100"),
+    Scenario("POST", "/add-result", lambda c, i: {"json": {
+        "student_id": i % c.students + 1, "subject_id": 12, "teacher_id": 13, "term": "2025-T9",
+        "exam_type": f"Quiz {i}", "marks": 60 + i % 40}}),
+    Scenario("GET", "/parents/{parent_id}/students", lambda c, i: {"url": f"/parents/{i + 1}/students"}),
+    Scenario("GET", "/parents/{parent_id}/dashboard", lambda c, i: {"url": f"/parents/{i + 1}/dashboard"}),
+    Scenario("GET", "/get-parents", heavy=True),
+    Scenario("GET", "/get-parents", lambda c, i: {"params": {"limit": 100}}, name="GET /get-parents?limit=100"),
+    Scenario("GET", "/get-subjects"),
+    Scenario("GET", "/get-subjects", lambda c, i: {"headers": {"If-None-Match": c.etag}},
+             name="GET /get-subjects (If-None-Match)", expect=304),
+    Scenario("GET", "/get-assignments"),
+    Scenario("PUT", "/update-teacher/{teacher_id}", lambda c, i: {"url": "/update-teacher/2", "json": {"name": "Teacher 0"}}),
+    Scenario("PUT", "/update-student/{student_id}", lambda c, i: {"url": "/update-student/1", "json": {
+        "name": "Student 000000", "grade": "Grade 1", "gender": "Male", "date_of_birth": "2019-01-19"}}),
+    Scenario("PUT", "/update-subject/{subject_id}", lambda c, i: {"url": "/update-subject/1",
+                                                                  "json": {"description": "Mathematics syllabus"}}),
+    Scenario("DELETE", "/delete-teacher/{teacher_id}", lambda c, i: {
+        "url": f"/delete-teacher/{c.fresh('users', {'name': 'Temp', 'email': f'tt{i}@bench.test', 'role': 'teacher'})}"}),
+    Scenario("DELETE", "/delete-student/{student_id}", lambda c, i: {
+        "url": f"/delete-student/{c.fresh('students', {'name': f'Temp {i}', 'grade': 'Grade 1'})}"}),
+    Scenario("DELETE", "/delete-subject/{subject_id}", lambda c, i: {
+        "url": f"/delete-subject/{c.fresh('subjects', {'name': f'Temp {i}'})}"}),
+    Scenario("GET", "/students/{student_id}/performance", lambda c, i: {"url": f"/students/{i + 1}/performance"}),
+    Scenario("POST", "/admin/release-results", lambda c, i: {"params": {"term": TERM, "released": "true", "admin_id": 1}}),
+    Scenario("POST", "/admin/report-cards/rebuild", lambda c, i: {"params": {"term": TERM}}, heavy=True),
+    Scenario("DELETE", "/delete-parent/{parent_id}", lambda c, i: {
+        "url": f"/delete-parent/{c.fresh('parents', {'name': f'Temp {i}', 'email': f'tp{i}@bench.test'})}"}),
+    Scenario("POST", "/add-results-bulk", lambda c, i: {"json": {
+        "term": "2025-T8", "exam_type": f"CAT {i}", "teacher_id": 2, "subject_id": 2,
+        "results": [{"student_id": s % c.students + 1, "marks": 40 + s % 60} for s in range(i * 40, i * 40 + 40)]}}),
+    Scenario("POST", "/results/upload", lambda c, i: {
+        "headers": {"Idempotency-Key": f"bench-{i}-{time.time_ns()}"},
+        "files": {"file": ("marks.csv", results_csv(c, i), "text/csv")},
+        "data": {"term": "2025-T7", "exam_type": "Endterm", "subject_id": "3", "teacher_id": "4"}}),
+    Scenario("GET", "/admin/view-results", lambda c, i: {"params": {"term": TERM}}, heavy=True),
+    Scenario("GET", "/admin/view-results", lambda c, i: {"params": {"term": TERM, "limit": 500}},
+             name="GET /admin/view-results?limit=500"),
+    Scenario("GET", "/admin/export-results", lambda c, i: {"params": {"term": TERM}}, heavy=True),
+    Scenario("GET", "/admin/results-summary", lambda c, i: {"params": {"term": TERM}}),
+    Scenario("GET", "/admin/class-results/{grade}", lambda c, i: {"url": f"/admin/class-results/{GRADES[i % 9]}",
+                                                                  "params": {"term": TERM}}),
+    Scenario("POST", "/admin/class-aggregates/rebuild", lambda c, i: {"params": {"term": TERM}}, heavy=True),
+]
+
+
+# ---------------- OpenAI stand-in ----------------
+def openai_handler(request: httpx.Request) -> httpx.Response:
+    body = json.loads(request.content)
+    answer = f"Stub answer for: {body['messages'][-1]['content'][:80]}"
+    base = {"id": "chatcmpl-bench", "created": int(time.time()), "model": body.get("model", "stub")}
+    if body.get("stream"):
+        chunks = [{**base, "object": "chat.completion.chunk",
+                   "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]}
+                  for word in answer.split(" ")]
+        text = "".join(f"data: {json.dumps(c)}\n\n" for c in chunks) + "data: [DONE]\n\n"
+        return httpx.Response(200, text=text, headers={"content-type": "text/event-stream"})
+    return httpx.Response(200, json={**base, "object": "chat.completion", "choices": [{
+        "index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}})
+
+
+# ---------------- driving the app ----------------
+async def stream_first_chunk(app, path: str, query: bytes = b"") -> int:
+    """
+    Opens a never-ending stream (Server-Sent Events), waits for its first
+    body chunk and disconnects. Returns the status code.
+    """
+    started = asyncio.Event()
+    done = asyncio.Event()
+    status = 0
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query, "root_path": "",
+        "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+    }
+
+    async def receive():
+        if not started.is_set():
+            started.set()
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message.get("body"):
+            done.set()
+
+    task = asyncio.create_task(app(scope, receive, send))
+    await asyncio.wait_for(done.wait(), 10)
+    try:
+        await asyncio.wait_for(task, 2)
+    except asyncio.TimeoutError:
+        pass
+    return status
+
+
+class Runner:
+    def __init__(self, client: httpx.AsyncClient, ctx: Context):
+        self.client = client
+        self.ctx = ctx
+
+    async def once(self, scenario: Scenario, i: int) -> dict:
+        kwargs = scenario.build(self.ctx, i)
+        url = kwargs.pop("url", scenario.route)
+        fake = self.ctx.fake
+        trips, busy = fake.requests, fake.busy_ms
+        start = time.perf_counter()
+        if scenario.route == "/events":
+            status, size = await stream_first_chunk(main.app, url, b"topics=results"), 0
+        else:
+            response = await self.client.request(scenario.method, url, **kwargs)
+            status, size = response.status_code, len(response.content)
+        return {
+            "ms": (time.perf_counter() - start) * 1000,
+            "status": status,
+            "round_trips": fake.requests - trips,
+            "db_ms": fake.busy_ms - busy,
+            "bytes": size,
+        }
+
+    async def run(self, scenario: Scenario, repeat: int, warmup: int) -> dict:
+        for i in range(warmup):
+            await self.once(scenario, 10_000 + i)
+        samples = []
+        for i in range(repeat):
+            samples.append(await self.once(scenario, i))
+
+        # One more request with allocation tracing on (slow, so kept out of the timings)
+        gc.collect()
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        await self.once(scenario, 20_000)
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+        tracemalloc.stop()
+        return summarize(scenario, samples, peak)
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def summarize(scenario: Scenario, samples: list[dict], peak: int) -> dict:
+    ms = [s["ms"] for s in samples]
+    statuses = Counter(s["status"] for s in samples)
+    return {
+        "route": f"{scenario.method} {scenario.route}",
+        "requests": len(samples),
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "unexpected": sum(v for k, v in statuses.items() if k != scenario.expect),
+        "p50_ms": round(percentile(ms, 50), 2),
+        "p95_ms": round(percentile(ms, 95), 2),
+        "p99_ms": round(percentile(ms, 99), 2),
+        "max_ms": round(max(ms), 2),
+        "round_trips": round(sum(s["round_trips"] for s in samples) / len(samples), 2),
+        "db_ms": round(sum(s["db_ms"] for s in samples) / len(samples), 2),
+        "bytes": round(sum(s["bytes"] for s in samples) / len(samples)),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def uncovered_routes() -> list[str]:
+    covered = {(s.method, s.route) for s in SCENARIOS}
+    routes = set()
+    for route in main.app.routes:
+        if isinstance(route, APIRoute):
+            routes.update((method, route.path) for method in route.methods if method != "HEAD")
+    return sorted(f"{m} {p}" for m, p in routes - covered)
+
+
+async def setup(client: httpx.AsyncClient, ctx: Context):
+    login = await client.post("/login", json={"email": "admin@school.test", "password": PASSWORD})
+    ctx.token = login.json()["token"]
+    # Admin and teacher write routes need the admin's session token
+    client.headers["Authorization"] = f"Bearer {ctx.token}"
+    # Seeded terms are marked released; the rebuild backfills their report cards
+    await client.post("/admin/report-cards/rebuild")
+    ctx.etag = (await client.get("/get-subjects")).headers["etag"]
+    job = (await client.post("/admin/compile-results", params={"term": TERM, "background": "true"})).json()["job"]
+    ctx.job_id = job["id"]
+    while (await client.get(f"/admin/compile-results/jobs/{ctx.job_id}")).json()["job"]["status"] not in ("done", "failed"):
+        await asyncio.sleep(0.01)
+    job = (await client.post("/generate-questions/jobs", json={"passages": ["Cells.", "Tissues."]})).json()["job"]
+    ctx.question_job_id = job["id"]
+    while (await client.get(f"/generate-questions/jobs/{job['id']}")).json()["job"]["status"] not in ("done", "failed"):
+        await asyncio.sleep(0.01)
+
+
+async def benchmark(args) -> dict:
+    print(f"Seeding '{args.profile}' ({PROFILES[args.profile][0]:,} students)...", flush=True)
+    started = time.perf_counter()
+    fake = FakeSupabase.seeded(args.profile, password_hash=pwd_context.hash(PASSWORD), latency_ms=args.db_latency_ms)
+    print(f"  {sum(len(t.rows) for t in fake.tables.values()):,} rows in {time.perf_counter() - started:.1f}s")
+
+    main.db.client.session = fake.session(main.db.client.session)
+    main.ai._client = AsyncOpenAI(api_key="bench", base_url="http://openai.bench/v1", max_retries=0,
+                                  http_client=httpx.AsyncClient(transport=httpx.MockTransport(openai_handler)))
+    ctx = Context(fake, args.profile)
+    scenarios = [s for s in SCENARIOS if not args.only or re.search(args.only, s.name)]
+    # Reads first, so writes don't change the data they are measured against
+    scenarios.sort(key=lambda s: s.writes)
+
+    report = {"profile": args.profile, "db_latency_ms": args.db_latency_ms, "requests": args.requests,
+              "python": platform.python_version(), "uncovered": uncovered_routes(), "scenarios": {}}
+    print(HEADER)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        await setup(client, ctx)
+        for scenario in scenarios:
+            repeat = max(3, args.requests // 5) if scenario.heavy else args.requests
+            result = await Runner(client, ctx).run(scenario, repeat, warmup=1 if scenario.heavy else 2)
+            report["scenarios"][scenario.name] = result
+            print(row(scenario.name, result), flush=True)
+    await main.db.close()
+    await main.ai.close()
+    return report
+
+
+HEADER = f"{'scenario':<44} {'p50':>8} {'p95':>8} {'p99':>8} {'trips':>6} {'db ms':>7} {'KiB':>8} {'peak KiB':>9}  status"
+
+
+def row(name: str, r: dict) -> str:
+    status = ",".join(f"{k}×{v}" for k, v in r["statuses"].items())
+    return (f"{name[:44]:<44} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['round_trips']:>6.1f} "
+            f"{r['db_ms']:>7.1f} {r['bytes'] / 1024:>8.1f} {r['peak_kib']:>9.0f}  {status}")
+
+
+def regressions(report: dict, baseline: dict, tolerance: float, slack_ms: float) -> list[str]:
+    found = []
+    for name, base in baseline.get("scenarios", {}).items():
+        now = report["scenarios"].get(name)
+        if now is None:
+            continue
+        limit = base["p95_ms"] * (1 + tolerance) + slack_ms
+        if now["p95_ms"] > limit:
+            found.append(f"{name}: p95 {now['p95_ms']:.1f} ms > {limit:.1f} ms (baseline {base['p95_ms']:.1f} ms)")
+        if now["round_trips"] > base["round_trips"] + 0.5:
+            found.append(f"{name}: {now['round_trips']:.1f} round trips (baseline {base['round_trips']:.1f})")
+    return found
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="small")
+    parser.add_argument("--requests", type=int, default=20, help="timed requests per scenario")
+    parser.add_argument("--db-latency-ms", type=float, default=0.0, help="simulated Supabase latency per call")
+    parser.add_argument("--only", help="regex on scenario names")
+    parser.add_argument("--json", help="write the report here")
+    parser.add_argument("--baseline", help="earlier --json report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 slowdown vs. baseline (0.25 = 25%%)")
+    parser.add_argument("--slack-ms", type=float, default=2.0, help="absolute p95 allowance for fast routes")
+    args = parser.parse_args()
+
+    report = asyncio.run(benchmark(args))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failures = [f"route without a scenario: {r}" for r in report["uncovered"]]
+    failures += [f"{name}: unexpected status {r['statuses']}" for name, r in report["scenarios"].items() if r["unexpected"]]
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("profile") != report["profile"]:
+            failures.append(f"baseline is for profile {baseline.get('profile')!r}, not {report['profile']!r}")
+        else:
+            failures += regressions(report, baseline, args.tolerance, args.slack_ms)
+
+    if failures:
+        print("\nFAIL")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,52 @@
+"""
+Login (bcrypt verify) throughput vs. number of hash worker processes.
+
+    python benchmarks/bench_passwords.py [--logins 64] [--rounds 12]
+
+Prints verifies/second for the inline (event-loop) baseline and for the
+process pool at 1, 2, 4 … up to the machine's CPU count.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=12)
+    args = parser.parse_args()
+
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    import auth
+
+    stored = auth.pwd_context.hash("anicetus")
+
+    start = time.perf_counter()
+    for _ in range(args.logins):
+        auth.pwd_context.verify("anicetus", stored)
+    inline = args.logins / (time.perf_counter() - start)
+    print(f"inline (blocks the loop)   {inline:8.1f} logins/s")
+
+    cpus = os.cpu_count() or 1
+    counts = sorted({1, cpus} | {n for n in (2, 4, 8, 16, 32) if n < cpus})
+    for workers in counts:
+        hasher = auth.PasswordHasher(workers=workers, max_queue=args.logins)
+
+        async def run():
+            await hasher.verify("anicetus", stored)  # warm the pool
+            start = time.perf_counter()
+            await asyncio.gather(*[hasher.verify("anicetus", stored) for _ in range(args.logins)])
+            return args.logins / (time.perf_counter() - start)
+
+        rate = asyncio.run(run())
+        hasher.close()
+        print(f"process pool, {workers:2d} worker(s) {rate:8.1f} logins/s  ({rate / inline:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Response serialization and compression: before (FastAPI default) vs. after.
+
+    python benchmarks/bench_serialization.py [--parents 2000] [--results 20000]
+
+Builds synthetic /get-parents and /admin/view-results payloads and reports,
+per payload:
+  - encode time: jsonable_encoder + json.dumps (FastAPI's JSONResponse),
+    jsonable_encoder + orjson (ORJSONResponse default class), and orjson alone
+    (routes that return ORJSONResponse directly)
+  - bytes on the wire: identity, gzip and brotli at the configured levels,
+    with the time each compression takes
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import orjson  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from compression import brotli, compress  # noqa: E402
+
+SUBJECTS = ["Mathematics", "English", "Kiswahili", "Science", "Social Studies", "CRE", "Agriculture",
+            "Home Science", "Art & Craft", "Music", "Physical Education", "Computer Studies"]
+
+
+def parents_payload(n: int, rng: random.Random) -> dict:
+    parents = []
+    for i in range(n):
+        children = [{
+            "reg_no": f"BP/{2020 + rng.randint(0, 5)}/{rng.randint(1000, 9999)}",
+            "name": f"Student {i}-{c}",
+            "gender": rng.choice(["Male", "Female"]),
+            "date_of_birth": f"201{rng.randint(0, 9)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}",
+            "grade": f"Grade {rng.randint(1, 9)}",
+            "subjects": rng.sample(SUBJECTS, 8),
+        } for c in range(rng.randint(1, 3))]
+        parents.append({
+            "name": f"Parent {i}",
+            "email": f"parent{i}@example.com",
+            "phone": f"+2547{rng.randint(10000000, 99999999)}",
+            "children": children,
+        })
+    return {"success": True, "parents": parents}
+
+
+def results_payload(n: int, rng: random.Random) -> dict:
+    return {"success": True, "results": [{
+        "student_name": f"Student {rng.randint(1, 2000)}",
+        "student_reg": f"BP/2024/{rng.randint(1000, 9999)}",
+        "grade": f"Grade {rng.randint(1, 9)}",
+        "subject": rng.choice(SUBJECTS),
+        "teacher": f"Teacher {rng.randint(1, 60)}",
+        "marks": rng.randint(20, 100),
+        "term": "2025-T1",
+        "exam_type": rng.choice(["Opener", "Midterm", "Endterm"]),
+    } for _ in range(n)]}
+
+
+def timed(fn, repeat: int = 5) -> tuple[float, object]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), out
+
+
+def report(name: str, payload: dict):
+    def stdlib():
+        return json.dumps(jsonable_encoder(payload), ensure_ascii=False, allow_nan=False,
+                          separators=(",", ":")).encode("utf-8")
+
+    def orjson_encoded():
+        return orjson.dumps(jsonable_encoder(payload), option=orjson.OPT_NON_STR_KEYS)
+
+    def orjson_direct():
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+
+    before_ms, body = timed(stdlib)
+    mid_ms, _ = timed(orjson_encoded)
+    after_ms, fast_body = timed(orjson_direct)
+    assert json.loads(body) == json.loads(fast_body)
+
+    print(f"\n{name}")
+    print(f"  jsonable_encoder + json.dumps   {before_ms:8.1f} ms   (before)")
+    print(f"  jsonable_encoder + orjson       {mid_ms:8.1f} ms   ({before_ms / mid_ms:.1f}x)")
+    print(f"  orjson direct                   {after_ms:8.1f} ms   ({before_ms / after_ms:.1f}x)")
+    print(f"  identity {len(body):>12,} bytes")
+    for encoding in ("gzip", "br"):
+        if encoding == "br" and brotli is None:
+            print("  br       (brotli not installed)")
+            continue
+        ms, packed = timed(lambda: compress(fast_body, encoding), repeat=3)
+        print(f"  {encoding:<8} {len(packed):>12,} bytes  {100 * len(packed) / len(body):5.1f}%  {ms:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--parents", type=int, default=2000)
+    parser.add_argument("--results", type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    report(f"/get-parents ({args.parents:,} parents)", parents_payload(args.parents, rng))
+    report(f"/admin/view-results ({args.results:,} rows)", results_payload(args.results, rng))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+/admin/results-summary aggregation: NumPy columns vs. the old per-grade loop.
+
+    python benchmarks/bench_summary.py [--results 100000] [--students 2000] [--budget-ms 50]
+
+Times only the in-process aggregation (rows → per-grade uploaded counts) on
+synthetic data, checks both versions agree, and exits non-zero if the
+columnar path exceeds the budget. The old loop is run on a slice of the
+rows because it is O(grades × results × students-per-grade).
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from aggregate import columns, distinct_per_group, grade_codes, grade_lookup  # noqa: E402
+
+GRADES = [f"Grade {i}" for i in range(1, 10)]
+
+
+def make_data(n_results: int, n_students: int, n_subjects: int, seed: int = 7):
+    rng = random.Random(seed)
+    students = [{"id": i, "grade": rng.choice(GRADES + ["Form 1"])} for i in range(1, n_students + 1)]
+    results = [
+        {"student_id": rng.randint(1, n_students + 50), "subject_id": rng.randint(1, n_subjects)}
+        for _ in range(n_results)
+    ]
+    return students, results
+
+
+def legacy(students, results):
+    grade_students = {g: [s["id"] for s in students if s["grade"] == g] for g in GRADES}
+    counts = []
+    for grade in GRADES:
+        student_ids = grade_students.get(grade, [])
+        uploaded_subjects = set()
+        for r in results:
+            if r["student_id"] in student_ids:
+                uploaded_subjects.add(r["subject_id"])
+        counts.append(len(uploaded_subjects))
+    return counts
+
+
+def columnar(students, results):
+    lookup = grade_lookup(students, GRADES)
+    cols = columns(results, "student_id", "subject_id")
+    return distinct_per_group(
+        grade_codes(cols["student_id"], lookup), cols["subject_id"], len(GRADES)
+    ).tolist()
+
+
+def timed(fn, *args, repeat: int) -> tuple[float, list]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--results", type=int, default=100_000)
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--subjects", type=int, default=14)
+    parser.add_argument("--legacy-results", type=int, default=5000)
+    parser.add_argument("--budget-ms", type=float, default=50.0)
+    args = parser.parse_args()
+
+    students, results = make_data(args.results, args.students, args.subjects)
+
+    sample = results[:args.legacy_results]
+    legacy_ms, expected = timed(legacy, students, sample, repeat=1)
+    _, got = timed(columnar, students, sample, repeat=1)
+    assert got == expected, f"mismatch: {got} != {expected}"
+    print(f"old loop   {len(sample):>7,} rows  {legacy_ms:9.1f} ms"
+          f"  (~{legacy_ms * len(results) / len(sample):,.0f} ms at {len(results):,})")
+
+    numpy_ms, _ = timed(columnar, students, results, repeat=7)
+    print(f"numpy      {len(results):>7,} rows  {numpy_ms:9.1f} ms  (median of 7)")
+
+    ok = numpy_ms <= args.budget_ms
+    print(f"{'PASS' if ok else 'FAIL'}: budget {args.budget_ms:.0f} ms")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,673 @@
+"""
+In-memory stand-in for the Supabase REST API (PostgREST), for benchmarks.
+
+    fake = FakeSupabase.seeded("small")
+    db.client.session = fake.session(db.client.session)
+
+It answers at the HTTP layer, so the app's real query builders (select /
+eq / in_ / ilike / or_ / order / range / insert / upsert / update / delete /
+rpc) run unchanged and every call still counts as one Supabase round trip.
+Covered: the filter operators main.py uses, `or=(... and(...))`, ordering,
+limit/offset, column projection, embedded resources by the `<table>_id`
+convention (with `!inner` and filters on the embed), Prefer return /
+resolution headers, unique keys (23505 / on_conflict / 42P10), the
+login_credentials view and the class-aggregate functions and triggers from sql/.
+Equality lookups use lazily built hash indexes, so a 100k-student school is
+queried in milliseconds rather than by full scans. `latency_ms` adds a fixed
+delay per request to model the network hop.
+"""
+import asyncio
+import random
+import re
+import time
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import orjson
+
+# Unique keys per table (first entry is the primary key when it isn't `id`)
+UNIQUE = {
+    "results": [("student_id", "subject_id", "term", "exam_type")],
+    "compiled_results": [("student_id", "term")],
+    "compile_watermarks": [("term",)],
+    "class_aggregates": [("term", "grade", "subject_id")],
+    "result_uploads": [("idempotency_key",)],
+    "result_release": [("term",)],
+    "report_cards": [("student_id", "term")],
+}
+# Tables keyed by something other than a serial id
+NO_SERIAL = {"compiled_results", "compile_watermarks", "class_aggregates", "result_uploads", "report_cards"}
+# Tables with an updated_at column kept current on writes
+UPDATED_AT = {"results", "class_aggregates"}
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+GRADES = [f"Grade {i}" for i in range(1, 10)]
+SUBJECTS = ["Mathematics", "English", "Kiswahili", "Science", "Social Studies", "CRE", "Agriculture",
+            "Home Science", "Art & Craft", "Music", "Physical Education", "Computer Studies"]
+EXAM_TYPES = ["Opener", "Midterm", "Endterm"]
+
+# name → (students, terms, subjects per student)
+PROFILES = {
+    "small": (1_000, 3, 6),
+    "medium": (10_000, 3, 4),
+    "large": (100_000, 2, 2),
+}
+
+
+class PostgrestError(Exception):
+    def __init__(self, status: int, code: str, message: str):
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _key(value) -> str | None:
+    """Index key of a column value, comparable with PostgREST's text operands."""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _operand_key(text: str) -> str:
+    """Index key of a filter operand: booleans are case-insensitive (postgrest-py sends eq.True)."""
+    return text.lower() if text.lower() in ("true", "false") else text
+
+
+def _coerce(text: str, sample):
+    """Casts a filter operand to the type of the column value it is compared with."""
+    if isinstance(sample, bool):
+        return text.lower() == "true"
+    if isinstance(sample, (int, float)):
+        try:
+            return int(text)
+        except ValueError:
+            return float(text)
+    return text
+
+
+def _unquote(text: str) -> str:
+    if len(text) >= 2 and text[0] == '"' and text[-1] == '"':
+        return re.sub(r'\\(.)', r'\1', text[1:-1])
+    return text
+
+
+def _split_top(text: str) -> list[str]:
+    """Splits on commas outside parentheses and double quotes."""
+    parts, depth, quoted, start = [], 0, False, 0
+    for i, ch in enumerate(text):
+        if ch == '"' and (i == 0 or text[i - 1] != "\\"):
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and ch == ",":
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _like(pattern: str, flags: int) -> re.Pattern:
+    out, i = [], 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == "\\" and i + 1 < len(pattern):
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        out.append(".*" if ch in "%*" else "." if ch == "_" else re.escape(ch))
+        i += 1
+    return re.compile("".join(out) + r"\Z", flags | re.S)
+
+
+class Filter:
+    """One `column=op.operand` condition (column may be `embed.column`)."""
+
+    def __init__(self, column: str, expr: str):
+        self.column = column
+        self.negate = expr.startswith("not.")
+        if self.negate:
+            expr = expr[4:]
+        self.op, _, operand = expr.partition(".")
+        if self.op == "in":
+            self.operand = [_unquote(v) for v in _split_top(operand.strip()[1:-1])]
+        else:
+            self.operand = _unquote(operand)
+        if self.op in ("like", "ilike"):
+            self.pattern = _like(self.operand, re.I if self.op == "ilike" else 0)
+        self._typed = {}
+
+    def typed(self, sample):
+        kind = type(sample)
+        if kind not in self._typed:
+            if self.op == "in":
+                self._typed[kind] = {_coerce(v, sample) for v in self.operand}
+            else:
+                self._typed[kind] = _coerce(self.operand, sample)
+        return self._typed[kind]
+
+    def test_value(self, value) -> bool:
+        op = self.op
+        if op == "is":
+            wanted = {"null": None, "true": True, "false": False}[self.operand.lower()]
+            hit = value is wanted if wanted is None else value == wanted
+        elif value is None:
+            hit = False
+        elif op in ("like", "ilike"):
+            hit = self.pattern.match(str(value)) is not None
+        else:
+            operand = self.typed(value)
+            if op == "eq":
+                hit = value == operand
+            elif op == "neq":
+                hit = value != operand
+            elif op == "gt":
+                hit = value > operand
+            elif op == "gte":
+                hit = value >= operand
+            elif op == "lt":
+                hit = value < operand
+            elif op == "lte":
+                hit = value <= operand
+            elif op == "in":
+                hit = value in operand
+            else:
+                raise PostgrestError(400, "PGRST100", f"unsupported operator {op!r}")
+        return hit != self.negate
+
+    def __call__(self, row: dict) -> bool:
+        return self.test_value(row.get(self.column))
+
+
+class Logic:
+    """`or=(...)` / `and=(...)` trees of filters."""
+
+    def __init__(self, kind: str, body: str):
+        self.negate = kind.startswith("not.")
+        self.any = kind.removeprefix("not.") == "or"
+        self.items = []
+        for part in _split_top(body):
+            head, paren, rest = part.partition("(")
+            if paren and head in ("and", "or", "not.and", "not.or"):
+                self.items.append(Logic(head, rest[:-1]))
+            else:
+                column, _, expr = part.partition(".")
+                self.items.append(Filter(column, expr))
+
+    def __call__(self, row: dict) -> bool:
+        hit = any(f(row) for f in self.items) if self.any else all(f(row) for f in self.items)
+        return hit != self.negate
+
+
+def parse_select(text: str) -> list:
+    """`*, rel!inner(a, other(b))` → [("*",), ("embed", "rel", True, [...])]."""
+    items = []
+    for part in _split_top(text or "*"):
+        name, paren, rest = part.partition("(")
+        if paren:
+            rel, _, hint = name.strip().partition("!")
+            items.append(("embed", rel.strip(), hint == "inner", parse_select(rest[:-1])))
+        else:
+            items.append(("*",) if part == "*" else ("col", part.split("::")[0].split(":")[-1].strip()))
+    return items
+
+
+def _singular(table: str) -> str:
+    return table[:-1] if table.endswith("s") else table
+
+
+class Table:
+    def __init__(self, name: str):
+        self.name = name
+        self.rows: list[dict] = []
+        self.next_id = 1
+        self.version = 0
+        self._indexes: dict[str, dict] = {}
+        self._unique: dict[tuple, dict] = {}
+
+    @property
+    def serial(self) -> bool:
+        return self.name not in NO_SERIAL
+
+    def changed(self, columns=None):
+        """Drops indexes on `columns` (all of them when None) after rows were edited in place."""
+        self.version += 1
+        columns = None if columns is None else set(columns)
+        for column in list(self._indexes):
+            if columns is None or column in columns:
+                del self._indexes[column]
+        for key in list(self._unique):
+            if columns is None or columns.intersection(key):
+                del self._unique[key]
+
+    def index(self, column: str) -> dict:
+        if column not in self._indexes:
+            index = {}
+            for row in self.rows:
+                index.setdefault(_key(row.get(column)), []).append(row)
+            self._indexes[column] = index
+        return self._indexes[column]
+
+    def unique(self, columns: tuple) -> dict:
+        if columns not in self._unique:
+            self._unique[columns] = {tuple(_key(r.get(c)) for c in columns): r for r in self.rows}
+        return self._unique[columns]
+
+    def append(self, row: dict):
+        """Adds a row and keeps any built indexes current (ids only grow)."""
+        self.rows.append(row)
+        for column, index in self._indexes.items():
+            index.setdefault(_key(row.get(column)), []).append(row)
+        for columns, keyed in self._unique.items():
+            keyed[tuple(_key(row.get(c)) for c in columns)] = row
+        self.version += 1
+
+
+class FakeSupabase:
+    def __init__(self, latency_ms: float = 0.0):
+        self.tables: dict[str, Table] = {}
+        self.latency = latency_ms / 1000
+        self.requests = 0
+        self.busy_ms = 0.0  # time spent answering, including simulated latency
+        self._view = (None, None)
+
+    # ---------------- data access ----------------
+    def table(self, name: str) -> Table:
+        if name not in self.tables:
+            self.tables[name] = Table(name)
+        return self.tables[name]
+
+    def insert(self, name: str, row: dict) -> dict:
+        """Inserts directly (no HTTP), filling ids and timestamps like the database."""
+        table = self.table(name)
+        row = dict(row)
+        if table.serial:
+            if row.get("id") is None:
+                row["id"] = table.next_id
+            table.next_id = max(table.next_id, row["id"] + 1)
+        now = _now()
+        for column in ("created_at", "updated_at") if name in UPDATED_AT else ("created_at",):
+            if row.get(column) in (None, "now()"):
+                row[column] = now
+        if name == "students" and not row.get("reg_no"):
+            row["reg_no"] = f"BP/{row['id']:06d}"
+        table.append(row)
+        return row
+
+    # ---------------- HTTP entry point ----------------
+    def session(self, template: httpx.AsyncClient) -> httpx.AsyncClient:
+        """A copy of the client's session whose requests are answered in memory."""
+        return httpx.AsyncClient(base_url=template.base_url, headers=template.headers,
+                                 event_hooks=template.event_hooks, transport=httpx.MockTransport(self.handle))
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        started = time.perf_counter()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        path = request.url.path.split("/rest/v1/", 1)[-1]
+        try:
+            if path.startswith("rpc/"):
+                params = orjson.loads(request.content) if request.content else {}
+                return self._json(200, self.rpc(path[4:], params))
+            return self._dispatch(request, path)
+        except PostgrestError as e:
+            return self._json(e.status, {"code": e.code, "message": e.message, "details": None, "hint": None})
+        finally:
+            self.busy_ms += (time.perf_counter() - started) * 1000
+
+    @staticmethod
+    def _json(status: int, body) -> httpx.Response:
+        if body is None:
+            return httpx.Response(204)
+        return httpx.Response(status, content=orjson.dumps(body), headers={"content-type": "application/json"})
+
+    def _dispatch(self, request: httpx.Request, name: str) -> httpx.Response:
+        params = request.url.params
+        prefer = request.headers.get("prefer", "")
+        method = request.method
+        if method == "GET":
+            rows = self.select(name, params)
+            return httpx.Response(200, content=orjson.dumps(rows), headers={
+                "content-type": "application/json", "content-range": f"0-{max(len(rows) - 1, 0)}/*"})
+
+        if method == "POST":
+            body = orjson.loads(request.content)
+            rows = self.write(name, body if isinstance(body, list) else [body], prefer, params.get("on_conflict"))
+            status = 201
+        elif method == "PATCH":
+            rows = self.update(name, params, orjson.loads(request.content))
+            status = 200
+        elif method == "DELETE":
+            rows = self.delete(name, params)
+            status = 200
+        else:
+            raise PostgrestError(405, "PGRST117", f"unsupported method {method}")
+        if "return=minimal" in prefer:
+            return httpx.Response(201 if status == 201 else 204)
+        return self._json(status, rows)
+
+    # ---------------- reads ----------------
+    def _source(self, name: str) -> Table:
+        if name == "login_credentials":
+            return self._credentials()
+        return self.table(name)
+
+    def _credentials(self) -> Table:
+        """The login_credentials view (sql/001), rebuilt when users or parents change."""
+        versions = (self.table("users").version, self.table("parents").version)
+        if self._view[0] != versions:
+            view = Table("login_credentials")
+            for source, role in (("users", None), ("parents", "parent")):
+                for r in self.table(source).rows:
+                    view.rows.append({"id": r["id"], "name": r.get("name"), "email": r.get("email"),
+                                      "role": role or r.get("role"), "password_hash": r.get("password_hash"),
+                                      "source": source})
+            self._view = (versions, view)
+        return self._view[1]
+
+    def _filters(self, params) -> tuple[list, list, dict]:
+        """Splits query params into top-level filters, `embed.column` filters and the rest."""
+        top, nested, rest = [], {}, {}
+        for key, value in params.multi_items():
+            if key in RESERVED_PARAMS:
+                rest[key] = value
+            elif key in ("or", "and", "not.or", "not.and"):
+                top.append(Logic(key, value[1:-1]))
+            elif "." in key:
+                rel, _, column = key.partition(".")
+                nested.setdefault(rel, []).append(Filter(column, value))
+            else:
+                top.append(Filter(key, value))
+        return top, nested, rest
+
+    def _candidates(self, table: Table, filters: list) -> list[dict]:
+        """Narrows by the first equality / IN filter through an index."""
+        for f in filters:
+            if isinstance(f, Filter) and not f.negate and f.op in ("eq", "in"):
+                index = table.index(f.column)
+                if f.op == "eq":
+                    return index.get(_operand_key(f.operand), [])
+                rows = [r for v in dict.fromkeys(f.operand) for r in index.get(_operand_key(v), [])]
+                if table.serial:
+                    rows.sort(key=lambda r: r["id"])
+                return rows
+        return table.rows
+
+    def select(self, name: str, params) -> list[dict]:
+        table = self._source(name)
+        filters, nested, rest = self._filters(params)
+        shape = parse_select(rest.get("select", "*"))
+        order = [(part.split(".")[0], ".desc" in part) for part in rest.get("order", "").split(",") if part]
+        limit = int(rest["limit"]) if "limit" in rest else None
+        offset = int(rest.get("offset", 0))
+
+        rows = self._candidates(table, filters)
+        # Keyset pages (`id > x order by id`) start at the cursor instead of scanning up to it
+        by_id = table.serial and order in ([], [("id", False)])
+        for f in filters:
+            if by_id and isinstance(f, Filter) and f.column == "id" and f.op == "gt" and not f.negate:
+                rows = rows[bisect_right(rows, int(f.operand), key=lambda r: r["id"]):]
+
+        stop = offset + limit if limit is not None and (by_id or not order) else None
+        pairs = []  # (stored row, projected row), so ordering can use unselected columns
+        for row in rows:
+            if not all(f(row) for f in filters):
+                continue
+            projected = self._project(table.name, row, shape, nested)
+            if projected is None:
+                continue
+            pairs.append((row, projected))
+            if stop is not None and len(pairs) >= stop:
+                break
+
+        if not by_id:
+            for column, desc in reversed(order):
+                present = [p for p in pairs if p[0].get(column) is not None]
+                missing = [p for p in pairs if p[0].get(column) is None]
+                present.sort(key=lambda p: p[0][column], reverse=desc)
+                # Postgres: NULLS LAST ascending, NULLS FIRST descending
+                pairs = missing + present if desc else present + missing
+        pairs = pairs[offset:offset + limit if limit is not None else None]
+        return [p[1] for p in pairs]
+
+    def _project(self, name: str, row: dict, shape: list, nested: dict) -> dict | None:
+        out = {}
+        for item in shape:
+            if item[0] == "*":
+                out.update(row)
+            elif item[0] == "col":
+                out[item[1]] = row.get(item[1])
+            else:
+                _, rel, inner, sub = item
+                value = self._embed(name, row, rel, sub, nested.get(rel, []))
+                if inner and not value:
+                    return None
+                out[rel] = value
+        return out
+
+    def _embed(self, name: str, row: dict, rel: str, shape: list, filters: list):
+        related = self.table(rel)
+        parent_fk = f"{_singular(rel)}_id"
+        if parent_fk in row:
+            # many-to-one: this row points at the related one
+            target = [t for t in related.index("id").get(_key(row[parent_fk]), []) if all(f(t) for f in filters)]
+            return self._project(rel, target[0], shape, {}) if target else None
+        children = related.index(f"{_singular(name)}_id").get(_key(row.get("id")), [])
+        return [self._project(rel, c, shape, {}) for c in children if all(f(c) for f in filters)]
+
+    # ---------------- writes ----------------
+    def write(self, name: str, rows: list[dict], prefer: str, on_conflict: str | None) -> list[dict]:
+        table = self.table(name)
+        merge = "resolution=merge-duplicates" in prefer
+        ignore = "resolution=ignore-duplicates" in prefer
+        conflict = tuple(c.strip() for c in on_conflict.split(",")) if on_conflict else None
+        keys = UNIQUE.get(name, [])
+        if (merge or ignore) and conflict is None:
+            conflict = keys[0] if keys else ("id",)
+        if conflict and conflict != ("id",) and conflict not in keys:
+            raise PostgrestError(400, "42P10", "there is no unique or exclusion constraint matching "
+                                               "the ON CONFLICT specification")
+        written, replaced, touched = [], [], set()
+        for row in rows:
+            existing = None
+            for columns in keys + ([("id",)] if "id" in row else []):
+                match = table.unique(columns).get(tuple(_key(row.get(c)) for c in columns))
+                if match is not None:
+                    existing = match
+                    if columns != conflict:
+                        raise PostgrestError(409, "23505", f'duplicate key value violates unique constraint '
+                                                           f'"{name}_{"_".join(columns)}_key"')
+            if existing is None:
+                written.append(self.insert(name, row))
+            elif merge:
+                replaced.append(dict(existing))
+                touched.update(k for k, v in row.items() if existing.get(k) != v)
+                existing.update({k: (_now() if v == "now()" else v) for k, v in row.items()})
+                if "updated_at" in existing and "updated_at" not in row:
+                    existing["updated_at"] = _now()
+                written.append(existing)
+        if touched:
+            table.changed(touched | {"updated_at"})
+        self._after_write(name, replaced, written)
+        return written
+
+    def _matching(self, name: str, params) -> tuple[Table, list[dict]]:
+        table = self.table(name)
+        filters, _, _ = self._filters(params)
+        return table, [r for r in self._candidates(table, filters) if all(f(r) for f in filters)]
+
+    def update(self, name: str, params, values: dict) -> list[dict]:
+        table, rows = self._matching(name, params)
+        before = [dict(row) for row in rows]
+        for row in rows:
+            row.update(values)
+            if "updated_at" in row and "updated_at" not in values:
+                row["updated_at"] = _now()
+        if rows:
+            table.changed(set(values) | {"updated_at"})
+        self._after_write(name, before, rows)
+        return rows
+
+    def delete(self, name: str, params) -> list[dict]:
+        table, rows = self._matching(name, params)
+        if rows:
+            gone = {id(r) for r in rows}
+            table.rows = [r for r in table.rows if id(r) not in gone]
+            table.changed()
+        self._after_write(name, rows, [])
+        return rows
+
+    # ---------------- triggers (sql/007) ----------------
+    def _after_write(self, name: str, old: list[dict], new: list[dict]):
+        """Keeps class_aggregates in step with results and student grades, as sql/007's triggers do."""
+        if name == "results" and (old or new):
+            students = self.table("students").unique(("id",))
+            keys = set()
+            for r in old + new:
+                student = students.get((_key(r.get("student_id")),))
+                if student and student.get("grade"):
+                    keys.add((r["term"], student["grade"], r["subject_id"]))
+            results = self.table("results").index("term")
+            candidates = [r for term in {k[0] for k in keys} for r in results.get(_key(term), [])]
+            self._recompute_aggregates(candidates, lambda key: key in keys)
+        elif name == "students" and old:
+            grades = {r.get("grade") for r in old} if not new else \
+                {g for o, n in zip(old, new) if o.get("grade") != n.get("grade") for g in (o.get("grade"), n.get("grade"))}
+            grades.discard(None)
+            if grades:
+                by_student = self.table("results").index("student_id")
+                candidates = [r for s in self.table("students").rows if s.get("grade") in grades
+                              for r in by_student.get(_key(s["id"]), [])]
+                self._recompute_aggregates(candidates, lambda key: key[1] in grades)
+
+    # ---------------- functions (sql/004) ----------------
+    def rpc(self, name: str, params: dict):
+        if name == "apply_class_aggregates":
+            table = self.table("class_aggregates")
+            keyed = table.unique(("term", "grade", "subject_id"))
+            for d in params.get("deltas") or []:
+                agg = keyed.get((_key(d["term"]), _key(d["grade"]), _key(d["subject_id"])))
+                if agg is None:
+                    self.insert("class_aggregates", {**d, "updated_at": None})
+                    continue
+                agg["result_count"] += d["result_count"]
+                agg["marks_sum"] += d["marks_sum"]
+                agg["marks_min"] = min(v for v in (agg["marks_min"], d["marks_min"]) if v is not None)
+                agg["marks_max"] = max(v for v in (agg["marks_max"], d["marks_max"]) if v is not None)
+                agg["teacher_id"] = d.get("teacher_id") or agg["teacher_id"]
+                agg["updated_at"] = _now()
+            table.changed()
+            return None
+        if name == "rebuild_class_aggregates":
+            return self.rebuild_class_aggregates(params.get("p_term"))
+        raise PostgrestError(404, "PGRST202", f"Could not find the function public.{name}")
+
+    def rebuild_class_aggregates(self, term: str | None = None) -> int:
+        results = self.table("results")
+        return self._recompute_aggregates(results.index("term").get(_key(term), []) if term else results.rows,
+                                          lambda key: term is None or key[0] == term)
+
+    def _recompute_aggregates(self, results: list[dict], wanted) -> int:
+        """Replaces the class_aggregates rows whose (term, grade, subject_id) `wanted` accepts with sums of `results`."""
+        table = self.table("class_aggregates")
+        table.rows = [r for r in table.rows if not wanted((r["term"], r["grade"], r["subject_id"]))]
+        table.changed()
+        students = self.table("students").unique(("id",))
+        groups = {}
+        for r in results:
+            student = students.get((_key(r["student_id"]),))
+            grade = student.get("grade") if student else None
+            if grade is None or r.get("marks") is None:
+                continue
+            key = (r["term"], grade, r["subject_id"])
+            if not wanted(key):
+                continue
+            agg = groups.get(key)
+            if agg is None:
+                groups[key] = agg = {"term": key[0], "grade": grade, "subject_id": key[2], "result_count": 0,
+                                     "marks_sum": 0, "marks_min": r["marks"], "marks_max": r["marks"],
+                                     "teacher_id": None, "_id": 0}
+            agg["result_count"] += 1
+            agg["marks_sum"] += r["marks"]
+            agg["marks_min"] = min(agg["marks_min"], r["marks"])
+            agg["marks_max"] = max(agg["marks_max"], r["marks"])
+            if r["id"] > agg["_id"]:
+                agg["_id"], agg["teacher_id"] = r["id"], r.get("teacher_id")
+        for agg in groups.values():
+            del agg["_id"]
+            self.insert("class_aggregates", agg)
+        return len(groups)
+
+    # ---------------- synthetic school ----------------
+    @classmethod
+    def seeded(cls, profile: str = "small", *, password_hash: str = "", latency_ms: float = 0.0,
+               seed: int = 7) -> "FakeSupabase":
+        """
+        A school of the given PROFILES size: subjects, staff, teachers with
+        subject links, students with subjects, parents with children, one
+        mark per student/subject/term, releases and class aggregates.
+        """
+        n_students, n_terms, per_student = PROFILES[profile]
+        rng = random.Random(seed)
+        fake = cls(latency_ms=latency_ms)
+        start = datetime(2025, 1, 6, tzinfo=timezone.utc)
+
+        def stamp(i: int) -> str:
+            return (start + timedelta(minutes=i)).isoformat()
+
+        for i, subject in enumerate(SUBJECTS):
+            fake.insert("subjects", {"name": subject, "description": f"{subject} syllabus", "created_at": stamp(i)})
+        fake.insert("users", {"name": "Head Teacher", "email": "admin@school.test", "role": "admin",
+                              "password_hash": password_hash})
+        n_teachers = max(len(SUBJECTS), n_students // 40)
+        for i in range(n_teachers):
+            fake.insert("users", {"name": f"Teacher {i}", "email": f"teacher{i}@school.test", "role": "teacher",
+                                  "password_hash": password_hash})
+            fake.insert("teachers", {"name": f"Teacher {i}", "email": f"teacher{i}@school.test",
+                                     "password": password_hash, "department": SUBJECTS[i % len(SUBJECTS)]})
+            for s in {i % len(SUBJECTS) + 1, rng.randint(1, len(SUBJECTS))}:
+                fake.insert("teacher_subjects", {"teacher_id": i + 1, "subject_id": s})
+
+        terms = [f"2025-T{t}" for t in range(1, n_terms + 1)]
+        student_subjects = {}
+        for i in range(n_students):
+            student = fake.insert("students", {
+                "name": f"Student {i:06d}", "gender": rng.choice(["Male", "Female"]),
+                "date_of_birth": f"201{rng.randint(0, 9)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}",
+                "grade": GRADES[i % len(GRADES)], "created_at": stamp(i),
+            })
+            subjects = rng.sample(range(1, len(SUBJECTS) + 1), per_student)
+            student_subjects[student["id"]] = subjects
+            for s in subjects:
+                fake.insert("student_subjects", {"student_id": student["id"], "subject_id": s})
+
+        for i in range(n_students * 7 // 10):
+            parent = fake.insert("parents", {"name": f"Parent {i:06d}", "email": f"parent{i}@school.test",
+                                             "phone": f"+2547{rng.randint(10000000, 99999999)}",
+                                             "password_hash": password_hash})
+            for child in {i + 1, rng.randint(1, n_students)}:
+                fake.insert("parent_child", {"parent_id": parent["id"], "student_id": child})
+
+        for term in terms:
+            for student_id, subjects in student_subjects.items():
+                for s in subjects:
+                    fake.insert("results", {"student_id": student_id, "subject_id": s, "teacher_id": s + 1,
+                                            "term": term, "exam_type": "Endterm", "marks": rng.randint(20, 100)})
+            fake.insert("result_release", {"term": term, "released": True, "released_by": 1})
+
+        for i in range(50):
+            fake.insert("announcements", {"message": f"Notice {i}", "posted_by": "Head Teacher",
+                                          "created_at": stamp(i)})
+        fake.rebuild_class_aggregates()
+        return fake
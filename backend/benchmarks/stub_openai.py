@@ -0,0 +1,71 @@
+"""
+Local stand-in for the OpenAI chat completions API.
+
+    python benchmarks/stub_openai.py            # listens on 127.0.0.1:8001
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 uvicorn main:app
+
+STUB_DELAY sets the simulated completion time in seconds (default 2).
+Requests with "stream": true get OpenAI-style SSE chunks, the first after
+STUB_FIRST_TOKEN seconds (default 0.2) and the rest spread over STUB_DELAY.
+"""
+import asyncio
+import json
+import os
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+DELAY = float(os.getenv("STUB_DELAY", "2"))
+FIRST_TOKEN = float(os.getenv("STUB_FIRST_TOKEN", "0.2"))
+
+app = FastAPI(title="OpenAI stub")
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    prompt = body["messages"][-1]["content"]
+    if body.get("stream"):
+        return StreamingResponse(stream_chunks(body, f"Stub answer for: {prompt[:80]}"),
+                                 media_type="text/event-stream")
+
+    await asyncio.sleep(DELAY)
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": f"Stub answer for: {prompt[:80]}"},
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+async def stream_chunks(body: dict, answer: str):
+    words = answer.split(" ")
+    await asyncio.sleep(FIRST_TOKEN)
+    for i, word in enumerate(words):
+        if i:
+            await asyncio.sleep(max(DELAY - FIRST_TOKEN, 0) / len(words))
+        chunk = {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "delta": {"content": word if i == 0 else " " + word},
+                "finish_reason": None,
+            }],
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="127.0.0.1", port=int(os.getenv("STUB_PORT", "8001")))
@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+# ==================================
+# RESPONSE CACHE (LRU + TTL, optional on-disk backend)
+# ==================================
+# With a disk store, async callers use aget() so SQLite reads run on a
+# thread, and set() inside the event loop writes to disk in the background
+# (write-behind); the in-memory entry is available at once either way.
+
+def normalize_text(text: str) -> str:
+    """Collapses whitespace and case so trivially different prompts share a key."""
+    return " ".join(str(text).split()).casefold()
+
+
+def make_key(*parts) -> str:
+    """Stable sha256 over any JSON-serialisable parts."""
+    raw = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class DiskStore:
+    """SQLite-backed key/value store so cached answers survive restarts."""
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, used_at REAL NOT NULL)"
+        )
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE cache SET used_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value, expires_at: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, used_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, time.time()),
+            )
+            # Keep the file bounded: drop expired rows, then least recently used
+            self._conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                " SELECT key FROM cache ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 1024, ttl: float = 86400.0,
+                 path: str | None = None, disk_max_entries: int | None = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        self.disk = DiskStore(path, disk_max_entries or max_entries * 10) if path else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._writes: set[asyncio.Task] = set()  # disk writes still in flight
+
+    def _memory_get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        return None
+
+    def _disk_hit(self, key: str, stored):
+        if stored is None:
+            self.misses += 1
+            return None
+        value, expires_at = stored
+        self._remember(key, value, expires_at)
+        self.hits += 1
+        self.disk_hits += 1
+        return value
+
+    def get(self, key: str):
+        value = self._memory_get(key)
+        if value is not None:
+            return value
+        return self._disk_hit(key, self.disk.get(key) if self.disk is not None else None)
+
+    async def aget(self, key: str):
+        """get() for the event loop: a disk lookup runs on a worker thread."""
+        value = self._memory_get(key)
+        if value is not None:
+            return value
+        return self._disk_hit(key, await asyncio.to_thread(self.disk.get, key) if self.disk is not None else None)
+
+    def peek(self, key: str) -> bool:
+        """Whether `key` is cached in memory; touches no counters, LRU order or disk."""
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] > time.time()
+
+    def set(self, key: str, value):
+        expires_at = time.time() + self.ttl
+        self._remember(key, value, expires_at)
+        if self.disk is None:
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self.disk.set(key, value, expires_at)
+            return
+        task = asyncio.create_task(asyncio.to_thread(self.disk.set, key, value, expires_at))
+        self._writes.add(task)
+        task.add_done_callback(self._wrote)
+
+    def _wrote(self, task: asyncio.Task):
+        self._writes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print("⚠️ cache entry not written to disk:", task.exception())
+
+    async def flush(self):
+        """Waits for background disk writes to finish."""
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+    def _remember(self, key: str, value, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: str):
+        self._entries.pop(key, None)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def clear(self):
+        self._entries.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "disk_entries": len(self.disk) if self.disk is not None else None,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,159 @@
+import gzip
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional: without it responses are gzip-only
+    brotli = None
+
+
+# ==================================
+# RESPONSE COMPRESSION (br / gzip)
+# ==================================
+# Bodies of at least COMPRESS_MIN_SIZE bytes (default 1024) are compressed
+# with the best encoding the client accepts: brotli when the `brotli`
+# package is installed, otherwise gzip. Streamed responses (CSV/NDJSON
+# exports) are compressed chunk by chunk and flushed, so they still stream;
+# Server-Sent Events and already-encoded bodies pass through untouched.
+#   COMPRESS_MIN_SIZE        smallest body worth compressing (default 1024)
+#   COMPRESS_BROTLI_QUALITY  0–11, default 4 (fast enough for dynamic bodies)
+#   COMPRESS_GZIP_LEVEL      1–9, default 6
+
+MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "4"))
+GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+
+
+def negotiate(accept_encoding: str | None) -> str | None:
+    """Picks "br" or "gzip" from an Accept-Encoding header, or None."""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip()] = q
+    star = accepted.get("*", 0.0)
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted.get(encoding, star) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class _StreamCompressor:
+    """Incremental compressor whose chunks are flushed as they are written."""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._c = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._c = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31 = gzip container
+
+    def chunk(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._c.process(data) + self._c.flush()
+        return self._c.compress(data) + self._c.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._c.finish()
+        return self._c.flush()
+
+
+class CompressionMiddleware:
+    def __init__(self, app, min_size: int = MIN_SIZE):
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            return await self.app(scope, receive, send)
+        headers = dict((k.lower(), v) for k, v in scope["headers"])
+        encoding = negotiate(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        length = None  # declared Content-Length, if any
+        buffered = []
+        compressor = None
+        passthrough = False
+
+        async def wrapped_send(message):
+            nonlocal start, length, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                response_headers = {k.lower(): v for k, v in message.get("headers", [])}
+                content_type = response_headers.get(b"content-type", b"")
+                if b"content-length" in response_headers:
+                    length = int(response_headers[b"content-length"])
+                passthrough = (
+                    b"content-encoding" in response_headers
+                    or content_type.startswith(b"text/event-stream")
+                    or message["status"] in (204, 304)
+                    or message["status"] < 200
+                    or (length is not None and length < self.min_size)
+                )
+                if passthrough:
+                    await send(start)
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+
+            if length is not None:
+                # Known size (possibly relayed in chunks by an inner
+                # middleware): compress it whole and keep a Content-Length
+                buffered.append(body)
+                if more:
+                    return
+                body = compress(b"".join(buffered), encoding)
+                await send(self._encoded_start(start, encoding, len(body)))
+                await send({"type": "http.response.body", "body": body})
+                return
+
+            if compressor is None:
+                if not more and len(body) < self.min_size:
+                    await send(start)
+                    await send(message)
+                    return
+                # Open-ended stream (exports): compress and flush chunk by chunk
+                compressor = _StreamCompressor(encoding)
+                await send(self._encoded_start(start, encoding, None))
+
+            out = compressor.chunk(body) if body else b""
+            if not more:
+                out += compressor.finish()
+            await send({"type": "http.response.body", "body": out, "more_body": more})
+
+        await self.app(scope, receive, wrapped_send)
+
+    @staticmethod
+    def _encoded_start(start: dict, encoding: str, length: int | None) -> dict:
+        headers = [(k, v) for k, v in start.get("headers", []) if k.lower() not in (b"content-length", b"vary")]
+        vary = [v for k, v in start.get("headers", []) if k.lower() == b"vary"]
+        vary_value = b", ".join(vary + [b"Accept-Encoding"]) if vary else b"Accept-Encoding"
+        headers += [(b"content-encoding", encoding.encode()), (b"vary", vary_value)]
+        if length is not None:
+            headers.append((b"content-length", str(length).encode()))
+        return {**start, "headers": headers}
@@ -0,0 +1,145 @@
+import asyncio
+import os
+import time
+
+import httpx
+from fastapi import HTTPException
+from postgrest import AsyncPostgrestClient
+
+import metrics
+
+
+# ==================================
+# ASYNC SUPABASE DATA LAYER
+# ==================================
+# Every route talks to PostgREST through `db` so queries never block the
+# event loop. Pool size and timeouts are tunable from the environment:
+#   SUPABASE_POOL_SIZE      max open HTTP/2 connections (default 20)
+#   SUPABASE_TIMEOUT        default per-call timeout in seconds (default 10)
+#   SUPABASE_CONNECT_TIMEOUT  connect timeout in seconds (default 5)
+
+
+class PooledPostgrestClient(AsyncPostgrestClient):
+    """AsyncPostgrestClient with a bounded, keep-alive HTTP/2 connection pool."""
+
+    def __init__(self, base_url: str, *, pool_size: int, **kwargs):
+        self.pool_size = pool_size
+        super().__init__(base_url, **kwargs)
+
+    def create_session(self, base_url, headers, timeout, verify=True):
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            verify=verify,
+            follow_redirects=True,
+            http2=True,
+            event_hooks={"response": [metrics.record_response_size]},
+            limits=httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.pool_size,
+                keepalive_expiry=30,
+            ),
+        )
+
+
+class Database:
+    def __init__(self, url: str | None, key: str | None, pool_size: int = 20,
+                 timeout: float = 10.0, connect_timeout: float = 5.0):
+        self.url = url
+        self.key = key
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self._client: AsyncPostgrestClient | None = None
+
+    @classmethod
+    def from_env(cls) -> "Database":
+        return cls(
+            url=os.getenv("SUPABASE_URL"),
+            key=os.getenv("SUPABASE_KEY"),
+            pool_size=int(os.getenv("SUPABASE_POOL_SIZE", "20")),
+            timeout=float(os.getenv("SUPABASE_TIMEOUT", "10")),
+            connect_timeout=float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "5")),
+        )
+
+    @property
+    def client(self) -> AsyncPostgrestClient:
+        # Built on first use so importing main.py never opens sockets
+        if self._client is None:
+            if not self.url or not self.key:
+                raise RuntimeError("SUPABASE_URL and SUPABASE_KEY must be set")
+            self._client = PooledPostgrestClient(
+                f"{self.url.rstrip('/')}/rest/v1",
+                pool_size=self.pool_size,
+                headers={
+                    "apiKey": self.key,
+                    "Authorization": f"Bearer {self.key}",
+                },
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+            )
+        return self._client
+
+    def table(self, name: str):
+        return self.client.table(name)
+
+    def rpc(self, name: str, params: dict | None = None):
+        """Call of a Postgres function (see backend/sql/), run through `run()` like a query."""
+        return self.client.rpc(name, params or {})
+
+    async def run(self, query, timeout: float | None = None):
+        """
+        Executes a built PostgREST query, bounded by `timeout` seconds
+        (defaults to SUPABASE_TIMEOUT).
+        """
+        table, operation = metrics.query_labels(query.http_method, query.path, query.headers.get("prefer", ""))
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            response = await asyncio.wait_for(query.execute(), timeout or self.timeout)
+            outcome = "ok"
+            return response
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            raise HTTPException(status_code=504, detail=f"Database query on {query.path} timed out")
+        finally:
+            # Per table/operation latency for /metrics and the request's Server-Timing
+            metrics.record_query(table, operation, time.perf_counter() - started, outcome)
+
+    async def fetch_all(self, build, page_size: int = 1000, timeout: float | None = None) -> list:
+        """
+        Reads every row of a query page by page, so results aren't truncated
+        at PostgREST's max-rows. `build` returns a fresh, stably ordered
+        select query on each call.
+        """
+        rows = []
+        start = 0
+        while True:
+            page = (await self.run(build().range(start, start + page_size - 1), timeout)).data
+            rows.extend(page)
+            if len(page) < page_size:
+                return rows
+            start += page_size
+
+    async def fetch_in(self, build, column: str, ids, chunk: int = 200) -> list:
+        """
+        Runs `build().in_(column, ids)` in chunks of ids (keeping URLs short),
+        concurrently, and returns all rows. Each chunk is read page by page
+        like fetch_all(), since a chunk can match more than max-rows rows;
+        `build` must return a stably ordered select query.
+        """
+        ids = list(ids)
+        if not ids:
+            return []
+        pages = await asyncio.gather(*[
+            self.fetch_all(lambda part=ids[i:i + chunk]: build().in_(column, part)) for i in range(0, len(ids), chunk)
+        ])
+        return [row for page in pages for row in page]
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+db = Database.from_env()
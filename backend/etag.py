@@ -0,0 +1,71 @@
+import hashlib
+import os
+
+import orjson
+from fastapi import Request, Response
+
+from cache import ResponseCache, make_key
+from compression import MIN_SIZE, compress, negotiate
+from refdata import ref
+
+
+# ==================================
+# CONDITIONAL GET (ETag / If-None-Match)
+# ==================================
+# Read routes keep their last serialized body per URL, tagged with the
+# versions of the data it was built from (refdata versions, bumped by the
+# write routes). While those versions hold, a request is answered from the
+# stored bytes, or with a bare 304 when If-None-Match matches; nothing is
+# queried or re-serialized. ETAG_TTL (seconds, default 60) bounds how long
+# a body is trusted against writes made outside this process; after it the
+# body is rebuilt and, if unchanged, keeps the same ETag. Compressed
+# variants are kept alongside the body, so hot payloads are compressed once.
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so a W/ prefix is ignored
+    return etag in (t.strip().removeprefix("W/") for t in if_none_match.split(","))
+
+
+class ConditionalResponses:
+    def __init__(self, max_entries: int = 512, ttl: float = 60.0):
+        self.cache = ResponseCache(max_entries=max_entries, ttl=ttl)
+        self.not_modified = 0
+
+    async def respond(self, request: Request, depends: tuple[str, ...], build, cache_control: str) -> Response:
+        """
+        Serves `await build()` as JSON with a strong ETag. `depends` names the
+        refdata versions the payload is derived from.
+        """
+        key = make_key(request.url.path, sorted(request.query_params.multi_items()))
+        version = tuple(ref.version(name) for name in depends)
+        entry = self.cache.get(key)
+        if entry is None or entry[0] != version:
+            body = orjson.dumps(await build(), option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+            entry = (version, hashlib.sha256(body).hexdigest()[:32], {None: body})
+            self.cache.set(key, entry)
+
+        _, digest, variants = entry
+        # Each encoding is its own representation, so it gets its own strong tag
+        encoding = negotiate(request.headers.get("accept-encoding")) if len(variants[None]) >= MIN_SIZE else None
+        etag = f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+        headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+
+        if encoding not in variants:
+            variants[encoding] = compress(variants[None], encoding)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(variants[encoding], media_type="application/json", headers=headers)
+
+    def stats(self) -> dict:
+        return {**self.cache.stats(), "not_modified": self.not_modified}
+
+
+conditional = ConditionalResponses(ttl=float(os.getenv("ETAG_TTL", "60")))
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+
+
+# ==================================
+# LIVE EVENTS (server push)
+# ==================================
+# Write routes publish small change events. Dashboards keep one SSE
+# connection to GET /events open instead of polling. Each worker fans events
+# out to its own subscribers in memory; the broker decides which workers
+# hear a publish:
+#   EVENTS_BROKER_URL     unset → in-process only (single worker)
+#                         redis://… → Redis pub/sub across workers (needs `redis`)
+#   EVENTS_QUEUE_SIZE     events buffered per slow subscriber (default 100)
+
+
+def event(topic: str, data=None) -> dict:
+    """One event message, as delivered to subscribers."""
+    return {"id": uuid.uuid4().hex, "topic": topic, "data": data, "at": time.time()}
+
+
+class LocalBroker:
+    """Single-worker broker: a publish is delivered straight to this process."""
+
+    name = "local"
+
+    def __init__(self):
+        self._deliver = None
+
+    async def start(self, deliver):
+        self._deliver = deliver
+
+    async def publish(self, message: dict):
+        self._deliver(message)
+
+    async def close(self):
+        pass
+
+
+class RedisBroker:
+    """Redis pub/sub broker so every worker sees every event."""
+
+    name = "redis"
+
+    def __init__(self, url: str, channel: str = "brightpath-events"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("EVENTS_BROKER_URL needs the redis package (pip install redis)")
+        self.channel = channel
+        self._redis = redis.from_url(url)
+        self._task: asyncio.Task | None = None
+
+    async def start(self, deliver):
+        self._task = asyncio.create_task(self._listen(deliver))
+
+    async def _listen(self, deliver):
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                async for msg in pubsub.listen():
+                    if msg["type"] == "message":
+                        deliver(json.loads(msg["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Connection lost: tell clients to reload, then resubscribe
+                print("⚠️ event broker disconnected:", e)
+                deliver(event("resync"))
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    async def publish(self, message: dict):
+        await self._redis.publish(self.channel, json.dumps(message, default=str))
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self._redis.aclose()
+
+
+class Subscriber:
+    def __init__(self, topics: set[str], queue_size: int):
+        self.topics = topics
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+
+class EventHub:
+    def __init__(self, broker, queue_size: int = 100):
+        self.broker = broker
+        self.queue_size = queue_size
+        self._subscribers: set[Subscriber] = set()
+        self._started = False
+        self._start_lock = asyncio.Lock()
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    @classmethod
+    def from_env(cls) -> "EventHub":
+        url = os.getenv("EVENTS_BROKER_URL")
+        broker = RedisBroker(url) if url else LocalBroker()
+        return cls(broker, queue_size=int(os.getenv("EVENTS_QUEUE_SIZE", "100")))
+
+    async def _ensure_started(self):
+        if self._started:
+            return
+        async with self._start_lock:
+            if not self._started:
+                await self.broker.start(self._fan_out)
+                self._started = True
+
+    async def publish(self, topic: str, data=None):
+        """
+        Sends an event to every subscriber of `topic` on every worker. Never
+        raises: a lost event only means a dashboard refreshes late.
+        """
+        message = event(topic, data)
+        try:
+            await self._ensure_started()
+            await self.broker.publish(message)
+            self.published += 1
+        except Exception as e:
+            print("⚠️ event not published:", e)
+
+    def _fan_out(self, message: dict):
+        for sub in list(self._subscribers):
+            if message["topic"] != "resync" and sub.topics and message["topic"] not in sub.topics:
+                continue
+            try:
+                sub.queue.put_nowait(message)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                # Too far behind to catch up event by event: drop the backlog
+                # and have the client reload instead
+                self.dropped += sub.queue.qsize()
+                while not sub.queue.empty():
+                    sub.queue.get_nowait()
+                sub.queue.put_nowait(event("resync"))
+
+    @asynccontextmanager
+    async def subscribe(self, topics: set[str] | None = None):
+        """
+        Yields a queue of events for `topics` (all topics when empty) until
+        the block exits.
+        """
+        await self._ensure_started()
+        sub = Subscriber(set(topics or ()), self.queue_size)
+        self._subscribers.add(sub)
+        try:
+            yield sub.queue
+        finally:
+            self._subscribers.discard(sub)
+
+    def stats(self) -> dict:
+        return {
+            "broker": self.broker.name,
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
+
+    async def close(self):
+        if self._started:
+            await self.broker.close()
+            self._started = False
+
+
+events = EventHub.from_env()
@@ -0,0 +1,206 @@
+import codecs
+import csv
+import hashlib
+
+
+# ==================================
+# RESULT SHEET INGESTION (CSV / XLSX)
+# ==================================
+# Parses and validates an uploaded marks sheet row by row, so a 5,000-row
+# file is checked in one pass and every bad row is reported with its sheet
+# row number instead of being skipped silently. Upserting is left to the
+# route (see /results/upload in main.py).
+#
+# Columns (header names are case-insensitive; spaces become underscores):
+#   student_id or reg_no   which student (reg_no is looked up)
+#   marks                  0–100
+#   subject_id, term, exam_type, teacher_id
+#                          optional per row; default to the upload's form fields
+
+RESULT_KEY = ("student_id", "subject_id", "term", "exam_type")
+
+
+class SheetError(ValueError):
+    """The file as a whole can't be read (bad format, missing columns, too many rows)."""
+
+
+def file_digest(file) -> str:
+    """sha256 of a seekable upload, read in blocks; leaves the file rewound."""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for block in iter(lambda: file.read(1 << 16), b""):
+        digest.update(block)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def _normalize(name) -> str:
+    return "_".join(str(name or "").strip().lower().split())
+
+
+def read_rows(file, filename: str):
+    """
+    Yields (row_number, {column: value}) from a CSV or XLSX upload without
+    loading it all into memory. Row numbers match the sheet (header is row 1).
+    """
+    name = (filename or "").lower()
+    if name.endswith((".xlsx", ".xlsm")):
+        yield from _read_xlsx(file)
+    elif name.endswith((".csv", ".txt")) or not name:
+        yield from _read_csv(file)
+    else:
+        raise SheetError("Upload a .csv or .xlsx file.")
+
+
+def _read_csv(file):
+    file.seek(0)
+    text = codecs.iterdecode(file, "utf-8-sig")
+    reader = csv.reader(text)
+    try:
+        header = [_normalize(h) for h in next(reader)]
+    except StopIteration:
+        raise SheetError("The file is empty.")
+    except UnicodeDecodeError:
+        raise SheetError("CSV files must be UTF-8 encoded.")
+    try:
+        for values in reader:
+            if any(v.strip() for v in values):
+                yield reader.line_num, dict(zip(header, values))
+    except UnicodeDecodeError:
+        raise SheetError("CSV files must be UTF-8 encoded.")
+
+
+def _read_xlsx(file):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise SheetError("XLSX uploads need the openpyxl package; upload a CSV instead.")
+    file.seek(0)
+    try:
+        workbook = load_workbook(file, read_only=True, data_only=True)
+    except Exception:
+        raise SheetError("The file is not a readable .xlsx workbook.")
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        try:
+            header = [_normalize(h) for h in next(rows)]
+        except StopIteration:
+            raise SheetError("The file is empty.")
+        for number, values in enumerate(rows, start=2):
+            if any(v not in (None, "") for v in values):
+                yield number, dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def _text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # spreadsheet numbers: 12.0 → "12"
+    return str(value).strip()
+
+
+def _int(value, column: str) -> int:
+    text = _text(value)
+    if not text:
+        raise ValueError(f"{column} is required")
+    try:
+        return int(text)
+    except ValueError:
+        raise ValueError(f"{column} must be a whole number, got {text!r}")
+
+
+class ResultValidator:
+    """
+    Checks sheet rows against the student directory and subject list and
+    turns them into `results` rows, collecting one error per bad row.
+    """
+
+    def __init__(self, students: dict, subjects: dict, defaults: dict, max_rows: int):
+        self.students = students
+        self.subjects = subjects
+        self.defaults = defaults
+        self.max_rows = max_rows
+        self.by_reg_no = {str(s["reg_no"]).strip().lower(): s["id"] for s in students.values() if s.get("reg_no")}
+        self.rows: list[dict] = []
+        self.errors: list[dict] = []
+        self.seen: dict[tuple, int] = {}
+        self.total = 0
+        self._checked_header = False
+
+    def add(self, number: int, raw: dict):
+        if not self._checked_header:
+            self._check_header(raw)
+        self.total += 1
+        if self.total > self.max_rows:
+            raise SheetError(f"Sheets are limited to {self.max_rows} rows.")
+        try:
+            row = self._validate(raw)
+        except ValueError as e:
+            self.errors.append({"row": number, "error": str(e)})
+            return
+        key = tuple(row[k] for k in RESULT_KEY)
+        if key in self.seen:
+            self.errors.append({"row": number, "error": f"duplicate of row {self.seen[key]} (same student, subject, term and exam)"})
+            return
+        self.seen[key] = number
+        row["_row"] = number
+        self.rows.append(row)
+
+    def _check_header(self, raw: dict):
+        self._checked_header = True
+        columns = set(raw)
+        missing = []
+        if not columns & {"student_id", "reg_no"}:
+            missing.append("student_id or reg_no")
+        if "marks" not in columns:
+            missing.append("marks")
+        for column in ("subject_id", "term", "exam_type", "teacher_id"):
+            if column not in columns and self.defaults.get(column) in (None, ""):
+                missing.append(column)
+        if missing:
+            raise SheetError(f"Missing columns (or form fields): {', '.join(missing)}.")
+
+    def _validate(self, raw: dict) -> dict:
+        def pick(column):
+            value = raw.get(column)
+            return value if _text(value) else self.defaults.get(column)
+
+        if _text(raw.get("student_id")):
+            student_id = _int(raw["student_id"], "student_id")
+            if student_id not in self.students:
+                raise ValueError(f"unknown student_id {student_id}")
+        else:
+            reg_no = _text(raw.get("reg_no"))
+            if not reg_no:
+                raise ValueError("student_id or reg_no is required")
+            student_id = self.by_reg_no.get(reg_no.lower())
+            if student_id is None:
+                raise ValueError(f"unknown reg_no {reg_no!r}")
+
+        subject_id = _int(pick("subject_id"), "subject_id")
+        if subject_id not in self.subjects:
+            raise ValueError(f"unknown subject_id {subject_id}")
+
+        term = _text(pick("term"))
+        exam_type = _text(pick("exam_type"))
+        if not term or not exam_type:
+            raise ValueError("term and exam_type are required")
+
+        marks_text = _text(raw.get("marks"))
+        try:
+            marks = float(marks_text)
+        except ValueError:
+            raise ValueError(f"marks must be a number, got {marks_text!r}" if marks_text else "marks is required")
+        if not 0 <= marks <= 100:
+            raise ValueError(f"marks must be between 0 and 100, got {marks_text}")
+
+        return {
+            "student_id": student_id,
+            "subject_id": subject_id,
+            "teacher_id": _int(pick("teacher_id"), "teacher_id"),
+            "term": term,
+            "exam_type": exam_type,
+            "marks": int(marks) if marks.is_integer() else marks,
+        }
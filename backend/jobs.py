@@ -0,0 +1,190 @@
+import asyncio
+import time
+import uuid
+
+
+# ==================================
+# BACKGROUND JOBS (in-process)
+# ==================================
+# Long admin tasks run as asyncio tasks so the HTTP request returns at once
+# and Render's proxy never times out; clients poll the job for progress, or
+# wait on job.changed() to be told as soon as it moves.
+#
+# JobStore.start() runs a job straight away. A JobQueue instead hands jobs
+# to a fixed number of worker tasks, oldest first, and refuses new ones once
+# `max_queued` are waiting, so a burst of submissions can't start more
+# upstream work than the pool allows.
+
+
+class QueueFull(Exception):
+    """A JobQueue already has `max_queued` jobs waiting."""
+
+
+class Job:
+    def __init__(self, kind: str, params: dict | None = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params or {}
+        self.status = "queued"  # queued → running → done | failed
+        self.done = 0
+        self.total = 0
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.updates = 0  # bumped on every change, so a waiter can tell whether it missed one
+        self._changed = asyncio.Event()
+
+    def progress(self, done: int, total: int | None = None, message: str | None = None):
+        self.done = done
+        if total is not None:
+            self.total = total
+        if message is not None:
+            self.message = message
+        self.touch()
+
+    def touch(self):
+        """Wakes everything waiting in changed()."""
+        self.updates += 1
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def changed(self, timeout: float) -> bool:
+        """Waits for the next status or progress update; False if none came within `timeout`."""
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "done": self.done,
+            "total": self.total,
+            "percent": round(100 * self.done / self.total, 1) if self.total else None,
+            "message": self.message,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobStore:
+    def __init__(self, keep_seconds: float = 3600):
+        self.keep_seconds = keep_seconds
+        self._jobs: dict[str, Job] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    def create(self, kind: str, params: dict | None = None) -> Job:
+        self._prune()
+        job = Job(kind, params)
+        self._jobs[job.id] = job
+        return job
+
+    async def run(self, job: Job, work):
+        """Runs `await work(job)` now and records its outcome on the job."""
+        job.status = "running"
+        job.touch()
+        try:
+            job.result = await work(job)
+            job.status = "done"
+        except Exception as e:
+            job.error = getattr(e, "detail", None) or str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            job.touch()
+
+    def start(self, kind: str, work, params: dict | None = None) -> Job:
+        """
+        Runs `await work(job)` in the background and records its outcome.
+        `work` reports progress through `job.progress(...)`.
+        """
+        job = self.create(kind, params)
+        task = asyncio.create_task(self.run(job, work))
+        # Keep a reference so the task isn't garbage-collected mid-run
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        return self._jobs.get(job_id)
+
+    def _prune(self):
+        cutoff = time.time() - self.keep_seconds
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at and job.finished_at < cutoff:
+                del self._jobs[job_id]
+
+
+
+class JobQueue:
+    """
+    Runs jobs from `store` on `workers` worker tasks, in submission order.
+    At most `max_queued` jobs may wait for a worker; submit() raises
+    QueueFull beyond that.
+    """
+
+    def __init__(self, store: JobStore, workers: int = 2, max_queued: int = 100):
+        self.store = store
+        self.workers = workers
+        self.max_queued = max_queued
+        self._queue: asyncio.Queue | None = None  # created on first submit, inside the event loop
+        self._workers: list[asyncio.Task] = []
+        self.busy = 0
+        self.submitted = 0
+        self.rejected = 0
+
+    def submit(self, kind: str, work, params: dict | None = None) -> Job:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if self._queue.qsize() >= self.max_queued:
+            self.rejected += 1
+            raise QueueFull(f"{self.max_queued} jobs are already waiting")
+        job = self.store.create(kind, params)
+        job.message = f"Waiting for a worker ({self._queue.qsize()} ahead)."
+        self._queue.put_nowait((job, work))
+        self.submitted += 1
+        return job
+
+    async def _worker(self):
+        while True:
+            job, work = await self._queue.get()
+            self.busy += 1
+            try:
+                job.message = ""
+                await self.store.run(job, work)
+            finally:
+                self.busy -= 1
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "busy": self.busy,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_queued": self.max_queued,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+        }
+
+    async def close(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+
+jobs = JobStore()
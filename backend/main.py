@@ -1,18 +1,20 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Request
+from fastapi import FastAPI, APIRouter, Depends, File, Form, Header, HTTPException, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, EmailStr
-from supabase import create_client, Client
 from dotenv import load_dotenv
+from postgrest.types import ReturnMethod
+from postgrest.exceptions import APIError
+import asyncio
+import csv
+import io
 import os
 import datetime
-from passlib.hash import bcrypt
-from passlib.context import CryptContext
-
-# Create a password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-import requests
-from openai import OpenAI
+import importlib
+import json
+import time
+from contextlib import asynccontextmanager
 
 
 
@@ -21,12 +23,66 @@ router = APIRouter()
 # SETUP
 # ==================================
 load_dotenv()
-url = os.getenv("SUPABASE_URL")
-key = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(url, key)
-
-app = FastAPI(title="BrightPath API", version="1.0")
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from db import db  # async Supabase data layer (reads env, so import after load_dotenv)
+from ai import ai  # async OpenAI gateway with bounded concurrency
+from auth import passwords  # bcrypt hashing in a bounded process pool
+from auth import SESSION_TTL, admin_only, current_user, issue_token, read_token, staff_only, unknown_emails
+from jobs import JobQueue, QueueFull, jobs  # in-process background jobs with progress
+from refdata import SNAPSHOT_MAX_AGE, SNAPSHOT_PATH
+from refdata import ref, student_directory, subject_names, subject_rows, teacher_names
+from paging import after_id, newest_first, prefix_pattern, split_page
+from events import events  # change events pushed to dashboards over SSE
+from etag import conditional  # ETag / 304 responses for hot read routes
+from compression import CompressionMiddleware  # negotiated br / gzip
+from cache import ResponseCache
+from metrics import MetricsMiddleware, ai_rate_limited, registry, startup  # Prometheus /metrics + Server-Timing
+from ratelimit import TokenBuckets  # per-caller limits on the AI routes
+from ingest import ResultValidator, SheetError, file_digest, read_rows
+from batch import BatchDispatcher  # POST /batch: several GETs in one request
+
+
+async def warm_up(restored: list[str]):
+    """
+    Runs after startup, off the request path: refreshes reference data
+    restored from the snapshot, starts the bcrypt workers and loads the
+    lazily imported libraries (openai, numpy).
+    """
+    steps = [passwords.warm(), asyncio.to_thread(lambda: ai.client),
+             asyncio.to_thread(importlib.import_module, "aggregate")]
+    if restored:
+        steps.append(ref.refresh(*restored))
+    for outcome in await asyncio.gather(*steps, return_exceptions=True):
+        if isinstance(outcome, Exception):
+            print("⚠️ warm-up step failed:", outcome)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 1️⃣ Warm start: reference data from the last shutdown's snapshot
+    restored = ref.load_snapshot(SNAPSHOT_PATH, SNAPSHOT_MAX_AGE) if SNAPSHOT_PATH else []
+    warming = asyncio.create_task(warm_up(restored))
+    ready = startup.mark("ready")
+    print(f"🚀 Ready {ready:.2f}s after process start"
+          + (f" (restored {', '.join(restored)} from snapshot)" if restored else ""))
+    yield
+
+    # 2️⃣ Shutdown: snapshot the cache for the next cold start, close clients
+    warming.cancel()
+    if SNAPSHOT_PATH:
+        try:
+            ref.save_snapshot(SNAPSHOT_PATH)
+        except OSError as e:
+            print("⚠️ reference data snapshot not saved:", e)
+    await db.close()
+    await question_jobs.close()
+    await ai.close()
+    await events.close()
+    passwords.close()
+
+
+# orjson serializes every route's response; see benchmarks/bench_serialization.py
+app = FastAPI(title="BrightPath API", version="1.0", default_response_class=ORJSONResponse, lifespan=lifespan)
+startup.mark("imported")
 
 # Include router (for future modular routes)
 app.include_router(router)
@@ -42,9 +98,20 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-DB-Round-Trips", "ETag"],
 )
 
 
+# Per-route latency, in-flight and status metrics; Server-Timing shows each
+# request's Supabase calls (per table/operation) and OpenAI time, so N+1
+# query regressions are visible in the browser's network timing panel
+app.add_middleware(MetricsMiddleware)
+
+
+# Outermost, so the timing headers above are sent with compressed bodies too
+app.add_middleware(CompressionMiddleware)
+
+
 # ==================================
 # MODELS
 # ==================================
@@ -96,7 +163,51 @@ class Announcement(BaseModel):
 def home():
     return {"success": True, "message": "BrightPath backend running fine 🎉"}
 
-from passlib.hash import bcrypt
+
+@app.get("/health")
+def health():
+    """
+    Liveness check (no database call) with seconds from process start to
+    each startup phase, for tracking cold starts.
+    """
+    return {"success": True, "uptime_seconds": startup.uptime(), "startup": startup.phases}
+
+# ===============================
+# BATCHED READS
+# ===============================
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "20"))
+batches = BatchDispatcher(app)
+
+
+class BatchItem(BaseModel):
+    path: str                 # e.g. "/get-students?limit=50"
+    id: str | None = None     # echoed back, to tell items apart
+    etag: str | None = None   # sent as If-None-Match; an unchanged item comes back as 304
+
+
+class BatchRequest(BaseModel):
+    requests: list[BatchItem]
+
+
+@app.post("/batch")
+async def batch(request: Request, data: BatchRequest):
+    """
+    Runs up to BATCH_MAX_REQUESTS GET requests against this API concurrently
+    and returns every response together, in request order:
+
+    {"requests": [{"id": "subjects", "path": "/get-subjects"},
+                  {"id": "students", "path": "/get-students?limit=50"}]}
+
+    Each item reports its own status, so one failing read doesn't fail the rest.
+    """
+    if not data.requests:
+        raise HTTPException(status_code=400, detail="requests must not be empty.")
+    if len(data.requests) > BATCH_MAX_REQUESTS:
+        raise HTTPException(status_code=400, detail=f"A batch holds at most {BATCH_MAX_REQUESTS} requests.")
+
+    responses = await batches.run(request.scope, [item.model_dump() for item in data.requests])
+    # Item bodies are already plain JSON values: skip FastAPI's re-encoding pass
+    return ORJSONResponse({"success": all(r["status"] < 400 for r in responses), "responses": responses})
 
 class LoginRequest(BaseModel):
     email: str
@@ -112,169 +223,323 @@ class LoginRequest(BaseModel):
 #     response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
 #     response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
 #     return response
-@app.post("/add-announcement")
+@app.post("/add-announcement", dependencies=[Depends(admin_only)])
 async def add_announcement(data: Announcement):
     try:
-        res = supabase.table("announcements").insert({
+        res = await db.run(db.table("announcements").insert({
             "message": data.message,
             "posted_by": data.posted_by or "Admin"
-        }).execute()
+        }))
+        ref.invalidate("announcements")
+        await events.publish("announcements", res.data[0] if res.data else None)
         return {"success": True, "message": "Announcement posted successfully!"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/get-announcements")
-async def get_announcements():
-    res = supabase.table("announcements").select("*").order("created_at", desc=True).execute()
-    return {"success": True, "announcements": res.data}
-@app.post("/login")
-def login_user(credentials: LoginRequest):
-    try:
-        email = credentials.email
-        password = credentials.password
+async def get_announcements(request: Request, limit: int | None = None, after: str | None = None):
+    """
+    Newest first. Pass `limit` (and `after` = previous `next_cursor`) to page.
+    """
+    async def build():
+        query = db.table("announcements").select("*")
+        if limit is None:
+            res = await db.run(query.order("created_at", desc=True))
+            return {"success": True, "announcements": res.data}
 
-        # 1️⃣ Check users table first (for admin / teacher)
-        result = supabase.table("users").select("*").eq("email", email).execute()
+        rows = (await db.run(newest_first(query, after, limit))).data
+        announcements, next_cursor = split_page(rows, limit, ("created_at", "id"))
+        return {"success": True, "announcements": announcements, "next_cursor": next_cursor}
 
-        if result.data:
-            user = result.data[0]
-            if not bcrypt.verify(password, user["password_hash"]):
-                raise HTTPException(status_code=401, detail="Invalid email or password")
+    return await conditional.respond(request, ("announcements",), build, "public, no-cache")
+# ===============================
+# LOGIN (single credential lookup + signed session token)
+# ===============================
+CREDENTIAL_COLUMNS = "id, name, email, role, password_hash, source"
+_use_credentials_view = True  # flips off if sql/001_login_credentials.sql isn't applied
 
-            return {
-                "id": user["id"],
-                "name": user["name"],
-                "email": user["email"],
-                "role": user["role"]
-            }
 
-        # 2️⃣ If not found, check parents table
-        parent_result = supabase.table("parents").select("*").eq("email", email).execute()
+async def find_credentials(email: str) -> dict | None:
+    """
+    Looks an email up in users and parents in one round trip, fetching only
+    what login needs. Staff (users) rows win over parent rows.
+    """
+    global _use_credentials_view
+    rows = None
+    if _use_credentials_view:
+        try:
+            rows = (await db.run(db.table("login_credentials").select(CREDENTIAL_COLUMNS).eq("email", email))).data
+        except APIError as e:
+            if e.code not in ("42P01", "PGRST205"):  # anything but "view missing"
+                raise
+            _use_credentials_view = False
+    if rows is None:
+        # Fallback without the view: both projected lookups concurrently
+        users, parents = await asyncio.gather(
+            db.run(db.table("users").select("id, name, email, role, password_hash").eq("email", email)),
+            db.run(db.table("parents").select("id, name, email, password_hash").eq("email", email)),
+        )
+        rows = [dict(u, source="users") for u in users.data] + \
+               [dict(p, role="parent", source="parents") for p in parents.data]
+    rows.sort(key=lambda r: r["source"] != "users")
+    return rows[0] if rows else None
+
+
+@app.post("/login")
+async def login_user(credentials: LoginRequest):
+    try:
+        email = credentials.email
+        password = credentials.password
 
-        if not parent_result.data:
+        # 1️⃣ Recently unknown emails skip the database entirely
+        if unknown_emails.get(email):
             raise HTTPException(status_code=401, detail="Invalid email or password")
 
-        parent = parent_result.data[0]
-        if not bcrypt.verify(password, parent["password_hash"]):
+        # 2️⃣ One lookup across users (admin / teacher) and parents
+        account = await find_credentials(email)
+        if account is None:
+            unknown_emails.set(email, True)
             raise HTTPException(status_code=401, detail="Invalid email or password")
 
-        # 3️⃣ Return parent info
-        return {
-            "id": parent["id"],
-            "name": parent["name"],
-            "email": parent["email"],
-            "role": "parent"
+        valid, new_hash = await passwords.verify(password, account["password_hash"])
+        if not valid:
+            raise HTTPException(status_code=401, detail="Invalid email or password")
+        if new_hash:
+            # Cost factor changed since this hash was made — upgrade it
+            await db.run(db.table(account["source"]).update({"password_hash": new_hash}).eq("id", account["id"]))
+
+        # 3️⃣ Return user info plus a signed session token
+        user = {
+            "id": account["id"],
+            "name": account["name"],
+            "email": account["email"],
+            "role": account["role"]
         }
+        return {**user, "token": issue_token(user), "expires_in": SESSION_TTL}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/me")
+def who_am_i(user: dict = Depends(current_user)):
+    """
+    Returns the session behind the bearer token — no database hit.
+    """
+    return {"success": True, "user": user}
+
+
 # ------------------ ADD ------------------
-from passlib.hash import bcrypt  # make sure this import is at the top
-@app.post("/add-admin")
-def add_admin(admin: Admin):
+@app.post("/add-admin", dependencies=[Depends(admin_only)])
+async def add_admin(admin: Admin):
     try:
-        hashed_password = bcrypt.hash(admin.password)
-        response = supabase.table("users").insert({
+        hashed_password = await passwords.hash(admin.password)
+        response = await db.run(db.table("users").insert({
             "name": admin.name,
             "email": admin.email,
             "password_hash": hashed_password,
             "role": "admin"
-        }).execute()
+        }))
+        unknown_emails.delete(admin.email)
         return {"success": True, "message": "Admin added successfully!", "data": response.data}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 # ------------------ ADMIN ROUTES ------------------
 # ===============================
 # ADMIN: COMPILE RESULTS
 # ===============================
-@app.post("/admin/compile-results")
-def compile_results(term: str):
+COMPILE_CHUNK = int(os.getenv("COMPILE_CHUNK", "500"))  # rows per bulk upsert
+ID_CHUNK = 200  # ids per in_() filter, keeps URLs short
+# Incremental compiles re-read this many seconds before the watermark, for
+# marks whose transaction committed after a later-stamped one was read.
+# Deleted marks leave no updated_at behind, so only a full compile drops the
+# compiled row of a student with no marks left in the term.
+COMPILE_OVERLAP_SECONDS = int(os.getenv("COMPILE_OVERLAP_SECONDS", "300"))
+
+
+async def get_compile_watermark(term: str) -> str | None:
+    try:
+        rows = (await db.run(db.table("compile_watermarks").select("compiled_at").eq("term", term))).data
+    except APIError:
+        return None  # sql/002_incremental_compile.sql not applied: always compile fully
+    return rows[0]["compiled_at"] if rows else None
+
+
+async def latest_result_update(term: str) -> str | None:
+    """The newest results.updated_at for the term — database clock, not ours. None without sql/002."""
+    try:
+        rows = (await db.run(db.table("results").select("updated_at").eq("term", term)
+                             .order("updated_at", desc=True).limit(1))).data
+    except APIError:
+        return None
+    return rows[0]["updated_at"] if rows else None
+
+
+async def compile_term(term: str, full: bool = False, job=None) -> dict:
     """
-    Aggregates results for a given term and saves per-student totals & averages.
+    Recomputes per-student totals & averages for a term and bulk-upserts them.
+    Unless `full`, only students whose results changed since the last compile
+    (the term's watermark, less COMPILE_OVERLAP_SECONDS) are recomputed.
     """
-    try:
-        # 1️⃣ Pull all results for the term
-        results_query = supabase.table("results").select("*").eq("term", term).execute()
-        results = results_query.data
+    watermark = None if full else await get_compile_watermark(term)
+    # Taken before reading marks, so anything newer is picked up next time
+    high_water = await latest_result_update(term)
+
+    # 1️⃣ Pull the marks to (re)compile
+    if watermark:
+        since = (datetime.datetime.fromisoformat(watermark)
+                 - datetime.timedelta(seconds=COMPILE_OVERLAP_SECONDS)).isoformat()
+        changed = await db.fetch_all(lambda: db.table("results").select("student_id")
+                                     .eq("term", term).gt("updated_at", since).order("id"))
+        student_ids = sorted({r["student_id"] for r in changed})
+        results = await db.fetch_in(lambda: db.table("results").select("student_id, marks")
+                                    .eq("term", term).order("id"), "student_id", student_ids, chunk=ID_CHUNK)
+    else:
+        results = await db.fetch_all(lambda: db.table("results").select("student_id, marks")
+                                     .eq("term", term).order("id"))
         if not results:
             raise HTTPException(status_code=404, detail="No marks found for this term.")
 
-        # 2️⃣ Group by student_id
-        from collections import defaultdict
-        student_totals = defaultdict(list)
-        for r in results:
-            student_totals[r["student_id"]].append(r["marks"])
-
-        compiled = []
-        for student_id, marks_list in student_totals.items():
-            total = sum(marks_list)
-            avg = round(total / len(marks_list), 2)
-            compiled.append({
-                "student_id": student_id,
-                "term": term,
-                "total_marks": total,
-                "average": avg,
-            })
+    # 2️⃣ Group by student_id
+    from collections import defaultdict
+    student_totals = defaultdict(list)
+    for r in results:
+        student_totals[r["student_id"]].append(r["marks"])
+
+    compiled = []
+    for student_id, marks_list in student_totals.items():
+        total = sum(marks_list)
+        avg = round(total / len(marks_list), 2)
+        compiled.append({
+            "student_id": student_id,
+            "term": term,
+            "total_marks": total,
+            "average": avg,
+        })
+
+    # 3️⃣ Bulk-upsert in fixed-size chunks (one round trip per chunk)
+    if job:
+        job.progress(0, len(compiled), f"Compiling {len(compiled)} students")
+    for i in range(0, len(compiled), COMPILE_CHUNK):
+        chunk = compiled[i:i + COMPILE_CHUNK]
+        await db.run(db.table("compiled_results").upsert(chunk, on_conflict="student_id,term",
+                                                         returning=ReturnMethod.minimal))
+        if job:
+            job.progress(i + len(chunk))
+
+    # 4️⃣ A full compile also drops rows for students with no marks left in the term
+    if not watermark:
+        kept = {row["student_id"] for row in compiled}
+        existing = await db.fetch_all(lambda: db.table("compiled_results").select("student_id")
+                                      .eq("term", term).order("student_id"))
+        stale = sorted({r["student_id"] for r in existing} - kept)
+        for i in range(0, len(stale), ID_CHUNK):
+            await db.run(db.table("compiled_results").delete(returning=ReturnMethod.minimal).eq("term", term)
+                         .in_("student_id", stale[i:i + ID_CHUNK]))
+
+    # 5️⃣ Move the watermark to the newest change this compile saw
+    if high_water:
+        try:
+            await db.run(db.table("compile_watermarks").upsert({"term": term, "compiled_at": high_water},
+                                                               returning=ReturnMethod.minimal))
+        except APIError:
+            pass
+
+    return {
+        "term": term,
+        "mode": "incremental" if watermark else "full",
+        "compiled": len(compiled),
+        "data": compiled,
+    }
+
+
+@app.post("/admin/compile-results", dependencies=[Depends(admin_only)])
+async def compile_results(term: str, full: bool = False, background: bool = False):
+    """
+    Aggregates results for a given term and saves per-student totals & averages.
+    ?full=true recomputes every student; ?background=true returns a job id at
+    once — poll GET /admin/compile-results/jobs/{job_id} for progress.
+    """
+    try:
+        if background:
+            async def work(job):
+                outcome = await compile_term(term, full, job)
+                outcome.pop("data")  # keep the job record small; rows are in compiled_results
+                return outcome
 
-        # 3️⃣ Upsert compiled results (avoid duplicates)
-        for c in compiled:
-            supabase.table("compiled_results").upsert(c).execute()
+            job = jobs.start("compile-results", work, {"term": term, "full": full})
+            return {"success": True, "message": f"Compiling {term} in the background.", "job": job.to_dict()}
 
+        outcome = await compile_term(term, full)
         return {
             "success": True,
-            "message": f"Results compiled for {len(compiled)} students for {term}.",
-            "data": compiled
+            "message": f"Results compiled for {outcome['compiled']} students for {term} ({outcome['mode']}).",
+            "data": outcome["data"]
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@app.get("/admin/compile-results/jobs/{job_id}")
+def compile_results_progress(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return {"success": True, "job": job.to_dict()}
+
 @app.get("/get-admins")
-def get_admins():
+async def get_admins():
     try:
-        data = supabase.table("users").select("*").eq("role", "admin").execute()
+        data = await db.run(db.table("users").select("*").eq("role", "admin"))
         return {"success": True, "admins": data.data}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.put("/update-admin/{admin_id}")
-def update_admin(admin_id: int, updated_data: dict):
+@app.put("/update-admin/{admin_id}", dependencies=[Depends(admin_only)])
+async def update_admin(admin_id: int, updated_data: dict):
     try:
-        response = supabase.table("users").update(updated_data).eq("id", admin_id).execute()
+        response = await db.run(db.table("users").update(updated_data).eq("id", admin_id))
+        ref.invalidate("teachers")
         return {"success": True, "message": f"Admin with ID {admin_id} updated!", "data": response.data}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.delete("/delete-admin/{admin_id}")
-def delete_admin(admin_id: int):
+@app.delete("/delete-admin/{admin_id}", dependencies=[Depends(admin_only)])
+async def delete_admin(admin_id: int):
     try:
-        response = supabase.table("users").delete().eq("id", admin_id).execute()
+        response = await db.run(db.table("users").delete().eq("id", admin_id))
+        ref.invalidate("teachers")
         return {"success": True, "message": f"Admin with ID {admin_id} deleted.", "data": response.data}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 @app.post("/signup-teacher")
 async def signup_teacher(data: TeacherSignup):
     # 1️⃣ Check if email already exists in teachers table
-    existing = supabase.table("teachers").select("id").eq("email", data.email).execute()
+    existing = await db.run(db.table("teachers").select("id").eq("email", data.email))
     if existing.data:
         raise HTTPException(status_code=400, detail="Email already registered")
 
     # 2️⃣ Hash the password
-    hashed_pw = pwd_context.hash(data.password)
+    hashed_pw = await passwords.hash(data.password)
 
     # 3️⃣ Create teacher record
-    teacher_res = supabase.table("teachers").insert({
+    teacher_res = await db.run(db.table("teachers").insert({
         "name": data.name,
         "email": data.email,
         "password": hashed_pw,
         "department": data.department,
         "created_at": "now()"
-    }).execute()
+    }))
 
     if not teacher_res.data:
         raise HTTPException(status_code=500, detail="Failed to create teacher")
@@ -290,7 +555,8 @@ async def signup_teacher(data: TeacherSignup):
         })
 
     if inserts:
-        supabase.table("teacher_subjects").insert(inserts).execute()
+        await db.run(db.table("teacher_subjects").insert(inserts))
+    ref.invalidate("teacher_list")
 
     # 5️⃣ Optionally store grades in a separate table or JSON column
     # (if you have one)
@@ -302,19 +568,21 @@ async def signup_teacher(data: TeacherSignup):
         "teacher_id": teacher_id,
         "subjects_assigned": data.subjects
     }
-@app.post("/add-teacher")
-def add_teacher(teacher: Teacher):
+@app.post("/add-teacher", dependencies=[Depends(admin_only)])
+async def add_teacher(teacher: Teacher):
     try:
         # ✅ Hash the plain password before storing it
-        hashed_password = bcrypt.hash(teacher.password)
+        hashed_password = await passwords.hash(teacher.password)
 
         # ✅ Insert the teacher into users table with hashed password
-        response = supabase.table("users").insert({
+        response = await db.run(db.table("users").insert({
             "name": teacher.name,
             "email": teacher.email,
             "password_hash": hashed_password,
             "role": "teacher"
-        }).execute()
+        }))
+        unknown_emails.delete(teacher.email)
+        ref.invalidate("teachers")
 
         return {
             "success": True,
@@ -322,68 +590,338 @@ def add_teacher(teacher: Teacher):
             "data": response.data
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ===============================
+# LIVE EVENTS (SSE push to dashboards)
+# ===============================
+EVENTS_KEEPALIVE = float(os.getenv("EVENTS_KEEPALIVE", "25"))  # seconds between keep-alive comments
+
+
+@app.get("/events", response_class=StreamingResponse)
+async def stream_events(topics: str | None = None):
+    """
+    Server-Sent Events feed of changes: ?topics=announcements,results,release
+    (all topics when omitted). Each event carries a small JSON payload; a
+    `resync` event means events were missed and the client should reload.
+    """
+    wanted = {t.strip() for t in topics.split(",") if t.strip()} if topics else set()
+
+    async def stream():
+        async with events.subscribe(wanted) as queue:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"id: {message['id']}\nevent: {message['topic']}\ndata: {json.dumps(message['data'], default=str)}\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+
+@app.get("/events/stats")
+def events_stats():
+    return {"success": True, **events.stats()}
+
+
+# ===============================
+# AI TOOLS (opt-in SSE streaming)
+# ===============================
+def wants_stream(request: Request, data: dict) -> bool:
+    """
+    Old clients get the JSON response; new ones opt in with {"stream": true}
+    or an `Accept: text/event-stream` header.
+    """
+    return bool(data.get("stream")) or "text/event-stream" in request.headers.get("accept", "")
+
+
+AI_RATE_LIMIT = float(os.getenv("AI_RATE_LIMIT", "20"))  # AI requests per minute per caller; 0 disables
+AI_RATE_BURST = float(os.getenv("AI_RATE_BURST", "5"))
+ai_limits = TokenBuckets(rate=AI_RATE_LIMIT / 60, burst=AI_RATE_BURST)
+
+
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "1"))  # proxies in front that append to X-Forwarded-For
+
+
+def caller_key(request: Request) -> str:
+    """
+    Who a rate limit applies to: the signed-in user, else the client IP.
+    Only X-Forwarded-For entries appended by our own proxies are trusted:
+    the TRUSTED_PROXY_HOPS-th from the right is the address the outermost
+    proxy saw. Anything left of it was sent by the client and is ignored.
+    """
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            user = read_token(token)
+            return f"user:{user['role']}:{user['id']}"
+        except HTTPException:
+            pass
+    hops = [h.strip() for h in request.headers.get("x-forwarded-for", "").split(",") if h.strip()]
+    if TRUSTED_PROXY_HOPS > 0 and len(hops) >= TRUSTED_PROXY_HOPS:
+        return "ip:" + hops[-TRUSTED_PROXY_HOPS]
+    return "ip:" + (request.client.host if request.client else "unknown")
+
+
+def charge_ai(request: Request, endpoint: str, cost: float = 1):
+    """Takes `cost` tokens from the caller's bucket (429 + Retry-After when empty)."""
+    if AI_RATE_LIMIT <= 0 or cost <= 0:
+        return
+    try:
+        ai_limits.check(caller_key(request), cost)
+    except HTTPException:
+        ai_rate_limited.inc(route=endpoint)
+        raise
+
+
+def limit_ai(request: Request, endpoint: str, messages: list[dict], **params):
+    """
+    Charges the caller one token for an AI request. Prompts already cached
+    or being answered are free: they cost no upstream call.
+    """
+    if AI_RATE_LIMIT > 0 and not ai.shared(endpoint, messages, **params):
+        charge_ai(request, endpoint)
+
+
+def sse_response(tokens, field: str) -> StreamingResponse:
+    """
+    Wraps an async token generator as Server-Sent Events:
+      data: {"token": "..."}          one per delta
+      event: done / data: {field: full text}
+      event: error / data: {"detail": "..."}
+    """
+    async def events():
+        parts = []
+        try:
+            async for token in tokens:
+                parts.append(token)
+                yield f"data: {json.dumps({'token': token})}\n\n"
+            yield f"event: done\ndata: {json.dumps({field: ''.join(parts)})}\n\n"
+        except HTTPException as e:
+            yield f"event: error\ndata: {json.dumps({'detail': e.detail})}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # stop proxies from buffering the stream
+    })
+
+
 @app.post("/summarize")
 async def summarize(request: Request):
     data = await request.json()
     text = data["text"]
+    messages = [
+        {"role": "system", "content": "You summarize academic text in simple English for students."},
+        {"role": "user", "content": text}
+    ]
+    limit_ai(request, "summarize", messages)
 
-    completion = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": "You summarize academic text in simple English for students."},
-            {"role": "user", "content": text}
-        ]
-    )
+    if wants_stream(request, data):
+        return sse_response(ai.stream(messages, cache_as="summarize"), "summary")
 
-    summary = completion.choices[0].message.content
+    summary = await ai.complete(messages, cache_as="summarize")
     return {"summary": summary}
 @app.post("/explain")
 async def explain(request: Request):
     data = await request.json()
     concept = data["concept"]
+    messages = [
+        {"role": "system", "content": "You are a friendly tutor who explains academic concepts in simple English with examples that make them easy to understand."},
+        {"role": "user", "content": f"Explain this concept clearly: {concept}"}
+    ]
+    limit_ai(request, "explain", messages)
 
-    completion = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": "You are a friendly tutor who explains academic concepts in simple English with examples that make them easy to understand."},
-            {"role": "user", "content": f"Explain this concept clearly: {concept}"}
-        ]
-    )
+    if wants_stream(request, data):
+        return sse_response(ai.stream(messages, cache_as="explain"), "explanation")
 
-    explanation = completion.choices[0].message.content
+    explanation = await ai.complete(messages, cache_as="explain")
     return {"explanation": explanation}
+# ===============================
+# AI: QUESTION GENERATION (direct or as queued jobs)
+# ===============================
+QUESTION_TOKENS = int(os.getenv("QUESTION_TOKENS", "150"))  # completion budget per requested question
+QUESTION_MAX_COUNT = int(os.getenv("QUESTION_MAX_COUNT", "20"))
+QUESTION_MAX_PASSAGES = int(os.getenv("QUESTION_MAX_PASSAGES", "10"))
+question_jobs = JobQueue(jobs, workers=int(os.getenv("QUESTION_WORKERS", "2")),
+                         max_queued=int(os.getenv("QUESTION_MAX_QUEUE", "100")))
+
+
+def question_request(text: str, count: int) -> tuple[list[dict], dict]:
+    """Messages and completion parameters asking for `count` questions on `text`."""
+    messages = [
+        {"role": "system", "content": f"You are a creative exam setter. Generate {count} diverse questions from the given text. Include a mix of multiple-choice, short answer, and true/false questions, and provide their answers."},
+        {"role": "user", "content": f"Generate questions from: {text}"}
+    ]
+    return messages, {"max_tokens": QUESTION_TOKENS * count + 100, "temperature": 0.6}
+
+
+def question_count(data: dict) -> int:
+    try:
+        count = int(data.get("count", 5))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="count must be a whole number.")
+    if not 1 <= count <= QUESTION_MAX_COUNT:
+        raise HTTPException(status_code=400, detail=f"count must be between 1 and {QUESTION_MAX_COUNT}.")
+    return count
+
+
+async def generate(text: str, count: int) -> str:
+    messages, params = question_request(text, count)
+    try:
+        questions = await ai.complete(messages, cache_as="generate-questions", **params)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print("❌ ERROR:", e)
+        raise HTTPException(status_code=502, detail=f"Question generation failed: {e}")
+    return (questions or "").strip()
+
+
 @app.post("/generate-questions")
 async def generate_questions(request: Request):
+    """
+    {"text": "...", "count": 5} → {"questions": "..."} once the completion
+    finishes. For long passages, several passages or large counts, submit a
+    job to /generate-questions/jobs instead.
+    """
     data = await request.json()
     text = data.get("text", "").strip()
 
     if not text:
-        return {"questions": "Please enter a passage or topic to generate questions from."}
+        raise HTTPException(status_code=400, detail="Please enter a passage or topic to generate questions from.")
+
+    count = question_count(data)
+    messages, params = question_request(text, count)
+    limit_ai(request, "generate-questions", messages, **params)
+
+    return {"questions": await generate(text, count)}
+
+
+@app.post("/generate-questions/jobs")
+async def submit_question_job(request: Request):
+    """
+    Queues question generation and returns at once with a job:
+
+    {"text": "...", "count": 10}  or  {"passages": ["...", "..."], "count": 5}
+
+    A worker pool (QUESTION_WORKERS) answers the passages in order. Follow the
+    job with GET /generate-questions/jobs/{job_id} or its /events stream; the
+    result lists questions (or an error) per passage.
+    """
+    data = await request.json()
+    passages = data.get("passages")
+    if passages is None:
+        passages = [data.get("text", "")]
+    if not isinstance(passages, list):
+        raise HTTPException(status_code=400, detail="passages must be a list of texts.")
+    passages = [str(p).strip() for p in passages]
+    if not passages or not all(passages):
+        raise HTTPException(status_code=400, detail="Please enter a passage or topic to generate questions from.")
+    if len(passages) > QUESTION_MAX_PASSAGES:
+        raise HTTPException(status_code=400, detail=f"A job holds at most {QUESTION_MAX_PASSAGES} passages.")
+
+    count = question_count(data)
+    # One token per passage that needs a new completion, never more than a full bucket
+    fresh = 0
+    for text in passages:
+        messages, params = question_request(text, count)
+        fresh += not ai.shared("generate-questions", messages, **params)
+    charge_ai(request, "generate-questions", min(fresh, AI_RATE_BURST))
+
+    async def work(job):
+        results = []
+        for i, text in enumerate(passages):
+            job.progress(i, len(passages), f"Passage {i + 1} of {len(passages)}")
+            try:
+                results.append({"passage": i, "questions": await generate(text, count), "error": None})
+            except HTTPException as e:
+                results.append({"passage": i, "questions": None, "error": e.detail})
+        job.progress(len(passages), len(passages), "")
+        if all(r["error"] for r in results):
+            raise HTTPException(status_code=502, detail=results[0]["error"])
+        return {"count": count, "passages": results}
 
     try:
-        completion = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a creative exam setter. Generate 5 diverse questions from the given text. Include a mix of multiple-choice, short answer, and true/false questions, and provide their answers."},
-                {"role": "user", "content": f"Generate questions from: {text}"}
-            ],
-            max_tokens=250,
-            temperature=0.6
-        )
+        job = question_jobs.submit("generate-questions", work, {"passages": len(passages), "count": count})
+    except QueueFull:
+        raise HTTPException(status_code=503, detail="Question generation is busy, please try again shortly.",
+                            headers={"Retry-After": "30"})
+    return {"success": True, "job": job.to_dict()}
 
-        questions = completion.choices[0].message.content.strip()
-        return {"questions": questions}
 
-    except Exception as e:
-        print("❌ ERROR:", e)
-        return {"questions": f"Error: {e}"}
+def question_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None or job.kind != "generate-questions":
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+
+@app.get("/generate-questions/jobs/{job_id}")
+def question_job_status(job_id: str):
+    return {"success": True, "job": question_job(job_id).to_dict()}
 
-@app.post("/add-student")
-def add_student(student: Student):
+
+@app.get("/generate-questions/jobs/{job_id}/events", response_class=StreamingResponse)
+async def question_job_events(job_id: str):
+    """
+    Server-Sent Events for one job: a `progress` event on every change, then
+    `done` (or `failed`) with the finished job, after which the stream ends.
+    """
+    job = question_job(job_id)
+
+    async def stream():
+        yield "retry: 3000\n\n"
+        while True:
+            seen = job.updates
+            if job.finished:
+                yield f"event: {job.status}\ndata: {json.dumps(job.to_dict())}\n\n"
+                return
+            yield f"event: progress\ndata: {json.dumps(job.to_dict())}\n\n"
+            # Don't wait if the job moved while the event was being sent
+            while job.updates == seen and not await job.changed(EVENTS_KEEPALIVE):
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+@app.get("/cache/stats")
+def cache_stats():
+    """
+    Reference-data cache versions and hit rates, plus ETag response reuse.
+    """
+    return {"success": True, "refdata": ref.stats(), "etag": conditional.stats()}
+
+@app.get("/ai/stats")
+def ai_stats():
+    """
+    Concurrency limiter state for the AI endpoints (in flight, queue depth,
+    timeouts, coalesced requests) and per-caller rate-limit counts.
+    """
+    return {"success": True, "stats": ai.stats(), "rate_limit": ai_limits.stats(), "question_jobs": question_jobs.stats()}
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """
+    Request, Supabase and OpenAI metrics in the Prometheus text format.
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/add-student", dependencies=[Depends(admin_only)])
+async def add_student(student: Student):
     try:
         # Data to insert — reg_no will be auto-generated in Supabase trigger
         data = {
@@ -393,7 +931,8 @@ def add_student(student: Student):
             "grade": student.grade
         }
 
-        result = supabase.table("students").insert(data).execute()
+        result = await db.run(db.table("students").insert(data))
+        ref.invalidate("students")
 
         return {
             "success": True,
@@ -404,22 +943,20 @@ def add_student(student: Student):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-from passlib.hash import bcrypt  # ensure this is imported at the top if not already
-
-@app.post("/add-parent")
-def add_parent(parent: Parent):
+@app.post("/add-parent", dependencies=[Depends(admin_only)])
+async def add_parent(parent: Parent):
     try:
         # ✅ Step 1: Hash a default password (you can change this to accept one from frontend later)
         default_password = "12345"  # temporary or frontend-provided password
-        hashed_password = bcrypt.hash(default_password)
+        hashed_password = await passwords.hash(default_password)
 
         # ✅ Step 2: Create user in 'users' table
-        user_response = supabase.table("users").insert({
+        user_response = await db.run(db.table("users").insert({
             "name": parent.name,
             "email": parent.email,
             "password_hash": hashed_password,
             "role": "parent"
-        }).execute()
+        }))
 
         if not user_response.data:
             raise HTTPException(status_code=500, detail="Failed to create user record.")
@@ -427,12 +964,13 @@ def add_parent(parent: Parent):
         user_id = user_response.data[0]["id"]
 
         # ✅ Step 3: Add parent info linked to that user_id
-        parent_response = supabase.table("parents").insert({
+        parent_response = await db.run(db.table("parents").insert({
             "user_id": user_id,
             "name": parent.name,
             "email": parent.email,
             "phone": parent.phone
-        }).execute()
+        }))
+        unknown_emails.delete(parent.email)
 
         return {
             "success": True,
@@ -443,6 +981,8 @@ def add_parent(parent: Parent):
             }
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -458,25 +998,25 @@ class ParentSignup(BaseModel):
     admission_no: str
 
 @app.post("/parent/signup")
-def parent_signup(data: ParentSignup):
+async def parent_signup(data: ParentSignup):
     try:
         # 1️⃣ Check if student with that reg_no exists
-        student_query = supabase.table("students").select("id").eq("reg_no", data.admission_no).execute()
+        student_query = await db.run(db.table("students").select("id").eq("reg_no", data.admission_no))
         if not student_query.data:
             raise HTTPException(status_code=400, detail="Invalid admission number")
 
         student_id = student_query.data[0]["id"]
 
         # 2️⃣ Hash the password
-        hashed_password = bcrypt.hash(data.password)
+        hashed_password = await passwords.hash(data.password)
 
         # 3️⃣ Add record to 'parents' table
-        parent_insert = supabase.table("parents").insert({
+        parent_insert = await db.run(db.table("parents").insert({
             "name": data.name,
             "email": data.email,
             "phone": data.phone,
             "password_hash": hashed_password
-        }).execute()
+        }))
 
         if not parent_insert.data:
             raise HTTPException(status_code=500, detail="Failed to create parent record.")
@@ -484,10 +1024,12 @@ def parent_signup(data: ParentSignup):
         parent_id = parent_insert.data[0]["id"]
 
         # 4️⃣ Link parent to child in parent_child table
-        supabase.table("parent_child").insert({
+        await db.run(db.table("parent_child").insert({
             "parent_id": parent_id,
             "student_id": student_id
-        }).execute()
+        }))
+
+        unknown_emails.delete(data.email)
 
         # 5️⃣ Return success
         return {
@@ -499,28 +1041,32 @@ def parent_signup(data: ParentSignup):
             }
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/add-subject")
-def add_subject(subject: Subject):
+@app.post("/add-subject", dependencies=[Depends(admin_only)])
+async def add_subject(subject: Subject):
     try:
-        response = supabase.table("subjects").insert({
+        response = await db.run(db.table("subjects").insert({
             "name": subject.name,
             "description": subject.description
-        }).execute()
+        }))
+        ref.invalidate("subjects")
         return {"success": True, "message": "Subject added!", "data": response.data}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/assign-subject")
-def assign_subject(link: TeacherSubject):
+@app.post("/assign-subject", dependencies=[Depends(admin_only)])
+async def assign_subject(link: TeacherSubject):
     try:
-        response = supabase.table("teacher_subjects").insert({
+        response = await db.run(db.table("teacher_subjects").insert({
             "teacher_id": link.teacher_id,
             "subject_id": link.subject_id
-        }).execute()
+        }))
+        ref.invalidate("teacher_list")
         return {"success": True, "message": "Subject assigned to teacher!", "data": response.data}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -528,32 +1074,64 @@ def assign_subject(link: TeacherSubject):
 
 # ------------------ VIEW ------------------
 @app.get("/get-teachers")
-async def get_teachers():
-    result = supabase.table("teachers").select(
-        "id, name, email, department, created_at, teacher_subjects(subject_id, subjects(name))"
-    ).execute()
+async def get_teachers(request: Request, limit: int | None = None, after: str | None = None,
+                       name_prefix: str | None = None):
+    async def build():
+        query = db.table("teachers").select(
+            "id, name, email, department, created_at, teacher_subjects(subject_id, subjects(name))"
+        )
+        if name_prefix:
+            query = query.ilike("name", prefix_pattern(name_prefix))
 
-    return {"success": True, "teachers": result.data}
+        if limit is None:
+            result = await db.run(query)
+            return {"success": True, "teachers": result.data}
+
+        teachers, next_cursor = split_page((await db.run(after_id(query, after, limit))).data, limit)
+        return {"success": True, "teachers": teachers, "next_cursor": next_cursor}
+
+    return await conditional.respond(request, ("teacher_list", "subjects"), build, "private, no-cache")
 
 
 
 @app.get("/get-students")
-def get_students():
+async def get_students(limit: int | None = None, after: str | None = None, grade: str | None = None,
+                       subject_id: int | None = None, name_prefix: str | None = None):
+    """
+    All students with their subject names. Filters (grade, subject_id,
+    name_prefix) run in the database; pass `limit`/`after` to page by id.
+    """
     try:
-        # 1️⃣ Fetch all students at once
-        students_result = supabase.table("students").select("*").execute()
-        students = students_result.data
+        # 1️⃣ Fetch students, filtered server-side
+        query = db.table("students").select("*, student_subjects!inner(subject_id)" if subject_id else "*")
+        if grade:
+            query = query.eq("grade", grade)
+        if subject_id:
+            query = query.eq("student_subjects.subject_id", subject_id)
+        if name_prefix:
+            query = query.ilike("name", prefix_pattern(name_prefix))
+
+        page = {}
+        if limit is None:
+            students = (await db.run(query)).data
+        else:
+            students, next_cursor = split_page((await db.run(after_id(query, after, limit))).data, limit)
+            page = {"next_cursor": next_cursor}
 
         if not students:
-            return {"success": True, "students": []}
+            return {"success": True, "students": [], **page}
 
-        # 2️⃣ Get all student-subject links at once
-        links_result = supabase.table("student_subjects").select("student_id, subject_id").execute()
-        links = links_result.data
+        # 2️⃣ Student-subject links: whole table for the full list, else just these students
+        if limit is None and not (grade or subject_id or name_prefix):
+            links_result = await db.run(db.table("student_subjects").select("student_id, subject_id"))
+            links = links_result.data
+        else:
+            links = await db.fetch_in(lambda: db.table("student_subjects").select("student_id, subject_id")
+                                      .order("student_id").order("subject_id"),
+                                      "student_id", [s["id"] for s in students])
 
-        # 3️⃣ Get all subjects at once
-        subjects_result = supabase.table("subjects").select("id, name").execute()
-        subjects = {s["id"]: s["name"] for s in subjects_result.data}  # dict for quick lookup
+        # 3️⃣ Subject names (reference-data cache)
+        subjects = await subject_names()
 
         # 4️⃣ Build a mapping: student_id → [subject names]
         from collections import defaultdict
@@ -565,19 +1143,77 @@ def get_students():
 
         # 5️⃣ Attach subjects to each student
         for student in students:
+            student.pop("student_subjects", None)  # the !inner filter join
             student["subjects"] = student_subjects_map.get(student["id"], [])
 
-        return {"success": True, "students": students}
+        return {"success": True, "students": students, **page}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+# ===============================
+# CLASS AGGREGATES (per term, grade, subject)
+# ===============================
+# class_aggregates (sql/004_class_aggregates.sql) keeps count / sum / min /
+# max of marks per (term, grade, subject). Triggers from
+# sql/007_class_aggregate_triggers.sql fold every results write in and out
+# inside the database, and refresh a grade when students join or leave it;
+# POST /admin/class-aggregates/rebuild backfills and repairs.
+
+def class_aggregate_deltas(rows: list[dict], students: dict) -> list[dict]:
+    """Sums results into one class_aggregates-shaped row per (term, grade, subject)."""
+    deltas = {}
+    for r in rows:
+        student = students.get(r["student_id"])
+        if not student or not student.get("grade"):
+            continue
+        key = (r["term"], student["grade"], r["subject_id"])
+        d = deltas.get(key)
+        if d is None:
+            d = deltas[key] = {
+                "term": key[0], "grade": key[1], "subject_id": key[2],
+                "result_count": 0, "marks_sum": 0, "marks_min": None, "marks_max": None, "teacher_id": None,
+            }
+        d["result_count"] += 1
+        marks = r.get("marks")
+        if isinstance(marks, (int, float)):
+            d["marks_sum"] += marks
+            d["marks_min"] = marks if d["marks_min"] is None else min(d["marks_min"], marks)
+            d["marks_max"] = marks if d["marks_max"] is None else max(d["marks_max"], marks)
+        d["teacher_id"] = r.get("teacher_id") or d["teacher_id"]
+    return list(deltas.values())
+
+
 # ===============================
 # ADD STUDENT RESULT (by teacher)
 # ===============================
 from fastapi import Body
 
-@app.post("/add-result")
-def add_result(data: dict = Body(...)):
+RESULT_CONFLICT = "student_id,subject_id,term,exam_type"  # sql/005_result_ingestion.sql
+
+
+async def save_results(rows: list[dict]) -> list[dict]:
+    """
+    Upserts results for one (subject, term, exam type) on RESULT_CONFLICT,
+    so re-entering a mark replaces it instead of failing on the unique key.
+    The class aggregates follow in the same transaction (sql/007 triggers).
+    """
+    first = rows[0]
+    try:
+        result = await db.run(db.table("results").upsert(rows, on_conflict=RESULT_CONFLICT))
+    except APIError as e:
+        if e.code == "42P10":  # no unique key to upsert on
+            raise HTTPException(status_code=500, detail="Apply backend/sql/005_result_ingestion.sql before adding results.")
+        raise
+
+    ref.invalidate("results")
+    await events.publish("results", {"term": first["term"], "subject_id": first["subject_id"], "count": len(result.data)})
+    return result.data
+
+
+@app.post("/add-result", dependencies=[Depends(staff_only)])
+async def add_result(data: dict = Body(...)):
     """
     Expected JSON:
     {
@@ -595,64 +1231,119 @@ def add_result(data: dict = Body(...)):
         if not all(k in data for k in required):
             raise HTTPException(status_code=400, detail="Missing required fields")
 
-        # Insert into results table
-        result = supabase.table("results").insert(data).execute()
+        # Upsert into results (a repeated mark replaces the earlier one)
+        saved = await save_results([data])
 
-        return {"success": True, "message": "Result added successfully", "data": result.data}
+        return {"success": True, "message": "Result added successfully", "data": saved}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # ===============================
 # GET LINKED STUDENTS FOR PARENT
 # ===============================
+async def parent_children(parent_id: int) -> list[dict]:
+    """The parent's children from the student directory: one parent_child lookup."""
+    links, students = await asyncio.gather(
+        db.run(db.table("parent_child").select("student_id").eq("parent_id", parent_id).order("student_id")),
+        student_directory(),
+    )
+    return [students[link["student_id"]] for link in links.data if link["student_id"] in students]
+
+
 @app.get("/parents/{parent_id}/students")
-def get_students_for_parent(parent_id: int):
-    # Step 1: get all student_ids linked to this parent
-    link_response = supabase.table("parent_child") \
-        .select("student_id") \
-        .eq("parent_id", parent_id) \
-        .execute()
-
-    if not link_response.data:
+async def get_students_for_parent(parent_id: int):
+    # Links in one query; student details come from the reference-data cache
+    children = await parent_children(parent_id)
+    if not children:
         raise HTTPException(status_code=404, detail="No students linked to this parent.")
 
-    # Step 2: extract all student IDs
-    student_ids = [link["student_id"] for link in link_response.data]
+    return {"parent_id": parent_id, "students": children}
 
-    # Step 3: fetch full student info for those IDs
-    students_response = supabase.table("students") \
-        .select("reg_no, name, gender, date_of_birth, grade, created_at") \
-        .in_("id", student_ids) \
-        .execute()
 
-    return {"parent_id": parent_id, "students": students_response.data}
+# ===============================
+# PARENT DASHBOARD (children + released performance + announcements)
+# ===============================
+@app.get("/parents/{parent_id}/dashboard")
+async def get_parent_dashboard(parent_id: int, announcements: int = 5):
+    """
+    Everything the parent dashboard shows, in one response: each child with
+    their released performance, and the newest `announcements` notices
+    (page on with /get-announcements?after=next_cursor).
+    """
+    try:
+        # 1️⃣ Children and announcements concurrently
+        children, notices = await asyncio.gather(
+            parent_children(parent_id),
+            db.run(newest_first(db.table("announcements").select("*"), None, announcements)),
+        )
+        if not children:
+            raise HTTPException(status_code=404, detail="No students linked to this parent.")
+        notices, next_cursor = split_page(notices.data, announcements, ("created_at", "id"))
+
+        # 2️⃣ Every child's report cards in one lookup
+        cards = await released_report_cards([child["id"] for child in children])
+
+        return {
+            "success": True,
+            "parent_id": parent_id,
+            "children": [{**child, **performance_view(cards.get(child["id"], []))} for child in children],
+            "announcements": notices,
+            "next_cursor": next_cursor,
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/get-parents")
-def get_parents():
+async def get_parents(limit: int | None = None, after: str | None = None, name_prefix: str | None = None):
+    """
+    Parents with their children. Pass `limit`/`after` to page by id; a page
+    only loads the links, children and subjects of the parents on it.
+    """
     try:
-        # 1️⃣ Fetch all parents
-        parents_result = supabase.table("parents").select("*").execute()
-        parents = parents_result.data
+        # 1️⃣ Fetch parents (only the columns we return)
+        query = db.table("parents").select("id, name, email, phone")
+        if name_prefix:
+            query = query.ilike("name", prefix_pattern(name_prefix))
+
+        page = {}
+        if limit is None:
+            parents = (await db.run(query)).data
+        else:
+            parents, next_cursor = split_page((await db.run(after_id(query, after, limit))).data, limit)
+            page = {"next_cursor": next_cursor}
 
         if not parents:
-            return {"success": True, "parents": []}
-
-        # 2️⃣ Fetch all parent-child links
-        pc_result = supabase.table("parent_child").select("parent_id, student_id").execute()
-        parent_links = pc_result.data
-
-        # 3️⃣ Fetch all students
-        students_result = supabase.table("students").select("*").execute()
-        students = {s["id"]: s for s in students_result.data}
+            return {"success": True, "parents": [], **page}
+
+        # 2️⃣ + 4️⃣ Parent-child and student-subject links: whole tables for
+        # the full list, otherwise only rows for the parents on this page
+        if limit is None and not name_prefix:
+            pc_result, ss_result = await asyncio.gather(
+                db.run(db.table("parent_child").select("parent_id, student_id")),
+                db.run(db.table("student_subjects").select("student_id, subject_id")),
+            )
+            parent_links = pc_result.data
+            student_subject_links = ss_result.data
+        else:
+            parent_links = await db.fetch_in(lambda: db.table("parent_child").select("parent_id, student_id")
+                                             .order("parent_id").order("student_id"),
+                                             "parent_id", [p["id"] for p in parents])
+            student_subject_links = await db.fetch_in(
+                lambda: db.table("student_subjects").select("student_id, subject_id")
+                .order("student_id").order("subject_id"),
+                "student_id", sorted({link["student_id"] for link in parent_links}))
 
-        # 4️⃣ Fetch all student-subject links
-        ss_result = supabase.table("student_subjects").select("student_id, subject_id").execute()
-        student_subject_links = ss_result.data
+        # 3️⃣ Student directory (reference-data cache)
+        students = await student_directory()
 
-        # 5️⃣ Fetch all subjects
-        subjects_result = supabase.table("subjects").select("id, name").execute()
-        subjects = {s["id"]: s["name"] for s in subjects_result.data}
+        # 5️⃣ Subject names (reference-data cache)
+        subjects = await subject_names()
 
         # 6️⃣ Build mapping: student_id → [subject names]
         from collections import defaultdict
@@ -687,53 +1378,70 @@ def get_parents():
                 "children": parent_children_map.get(parent["id"], [])
             })
 
-        return {"success": True, "parents": clean_parents}
+        # Large payload of plain JSON values: skip FastAPI's jsonable_encoder pass
+        return ORJSONResponse({"success": True, "parents": clean_parents, **page})
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/get-subjects")
-def get_subjects():
-    data = supabase.table("subjects").select("*").execute()
-    return {"success": True, "subjects": data.data}
+async def get_subjects(request: Request):
+    async def build():
+        return {"success": True, "subjects": await subject_rows()}
+
+    return await conditional.respond(request, ("subjects",), build, "public, no-cache")
 
 @app.get("/get-assignments")
-def get_assignments():
-    links = supabase.table("teacher_subjects").select("*").execute().data
+async def get_assignments():
+    # 1️⃣ All teacher ↔ subject links
+    links = (await db.run(db.table("teacher_subjects").select("teacher_id, subject_id"))).data
+    if not links:
+        return {"success": True, "assignments": []}
+
+    # 2️⃣ Every referenced teacher and subject in two bulk lookups, run together
+    teacher_ids = sorted({link["teacher_id"] for link in links if link.get("teacher_id") is not None})
+    subject_ids = sorted({link["subject_id"] for link in links if link.get("subject_id") is not None})
+    teachers_res, subjects_res = await asyncio.gather(
+        db.run(db.table("users").select("id, name").in_("id", teacher_ids)),
+        db.run(db.table("subjects").select("id, name").in_("id", subject_ids)),
+    )
+    teachers = {t["id"]: t["name"] for t in teachers_res.data}
+    subjects = {s["id"]: s["name"] for s in subjects_res.data}
+
     assignments = []
     for link in links:
-        teacher_id = link.get("teacher_id")
-        subject_id = link.get("subject_id")
-
-        teacher = supabase.table("users").select("name").eq("id", teacher_id).execute().data
-        subject = supabase.table("subjects").select("name").eq("id", subject_id).execute().data
-
+        teacher = teachers.get(link.get("teacher_id"))
+        subject = subjects.get(link.get("subject_id"))
         if teacher and subject:
             assignments.append({
-                "teacher": teacher[0]["name"],
-                "subject": subject[0]["name"]
+                "teacher": teacher,
+                "subject": subject
             })
 
     return {"success": True, "assignments": assignments}
 
 # ------------------ UPDATE ------------------
-@app.put("/update-teacher/{teacher_id}")
-def update_teacher(teacher_id: int, updated_data: dict):
-    response = supabase.table("users").update(updated_data).eq("id", teacher_id).execute()
+@app.put("/update-teacher/{teacher_id}", dependencies=[Depends(admin_only)])
+async def update_teacher(teacher_id: int, updated_data: dict):
+    response = await db.run(db.table("users").update(updated_data).eq("id", teacher_id))
+    ref.invalidate("teachers")
     return {"success": True, "message": f"Teacher with ID {teacher_id} updated!", "data": response.data}
 
 from fastapi import Request
 
-@app.put("/update-student/{student_id}")
+@app.put("/update-student/{student_id}", dependencies=[Depends(admin_only)])
 async def update_student(student_id: int, request: Request):
     payload = await request.json()
-    response = supabase.table("students").update({
+    response = await db.run(db.table("students").update({
         "name": payload["name"],
         "grade": payload["grade"],
         "gender": payload["gender"],
         "date_of_birth": payload["date_of_birth"]
-    }).eq("id", student_id).execute()
+    }).eq("id", student_id))
+    ref.invalidate("students")
 
     return {
         "success": True,
@@ -743,142 +1451,259 @@ async def update_student(student_id: int, request: Request):
 
 
 
-@app.put("/update-subject/{subject_id}")
-def update_subject(subject_id: int, updated_data: dict):
-    response = supabase.table("subjects").update(updated_data).eq("id", subject_id).execute()
+@app.put("/update-subject/{subject_id}", dependencies=[Depends(admin_only)])
+async def update_subject(subject_id: int, updated_data: dict):
+    response = await db.run(db.table("subjects").update(updated_data).eq("id", subject_id))
+    ref.invalidate("subjects")
     return {"success": True, "message": f"Subject with ID {subject_id} updated!", "data": response.data}
 
 # ------------------ DELETE ------------------
-@app.delete("/delete-teacher/{teacher_id}")
-def delete_teacher(teacher_id: int):
-    response = supabase.table("users").delete().eq("id", teacher_id).execute()
+@app.delete("/delete-teacher/{teacher_id}", dependencies=[Depends(admin_only)])
+async def delete_teacher(teacher_id: int):
+    response = await db.run(db.table("users").delete().eq("id", teacher_id))
+    ref.invalidate("teachers")
     return {"success": True, "message": f"Teacher with ID {teacher_id} deleted.", "data": response.data}
 
-@app.delete("/delete-student/{student_id}")
-def delete_student(student_id: int):
-    response = supabase.table("students").delete().eq("id", student_id).execute()
+@app.delete("/delete-student/{student_id}", dependencies=[Depends(admin_only)])
+async def delete_student(student_id: int):
+    response = await db.run(db.table("students").delete().eq("id", student_id))
+    ref.invalidate("students")
     return {"success": True, "message": f"Student with ID {student_id} deleted.", "data": response.data}
 
-@app.delete("/delete-subject/{subject_id}")
-def delete_subject(subject_id: int):
-    response = supabase.table("subjects").delete().eq("id", subject_id).execute()
+@app.delete("/delete-subject/{subject_id}", dependencies=[Depends(admin_only)])
+async def delete_subject(subject_id: int):
+    response = await db.run(db.table("subjects").delete().eq("id", subject_id))
+    ref.invalidate("subjects")
     return {"success": True, "message": f"Subject with ID {subject_id} deleted.", "data": response.data}
 # ===============================
-# GET STUDENT PERFORMANCE (REAL DATA)
+# ADMIN: RELEASE / UNRELEASE RESULTS (+ REPORT-CARD SNAPSHOTS)
 # ===============================
-@app.get("/students/{student_id}/performance")
-def get_student_performance(student_id: int):
-    try:
-        # 1️⃣ Fetch all results for this student
-        results_query = supabase.table("results").select("*").eq("student_id", student_id).execute()
-        results = results_query.data
+REPORT_CARD_CHUNK = int(os.getenv("REPORT_CARD_CHUNK", "500"))  # cards per bulk upsert
+_use_report_cards = True  # flips off if sql/006_report_cards.sql isn't applied
 
-        if not results:
-            return {"success": True, "performance": [], "message": "No performance records found yet."}
-
-        # 2️⃣ Get subject names for mapping
-        subjects_query = supabase.table("subjects").select("id, name").execute()
-        subjects = {s["id"]: s["name"] for s in subjects_query.data}
-
-        # 3️⃣ Combine subject names with marks
-        performance = []
-        for r in results:
-            subject_name = subjects.get(r["subject_id"], "Unknown Subject")
-            performance.append({
-                "subject": subject_name,
-                "marks": r["marks"],
-                "term": r["term"],
-                "exam_type": r["exam_type"]
-            })
 
-        return {"success": True, "performance": performance}
+def build_report_cards(results: list, term: str, subjects: dict) -> dict:
+    """
+    One report card per student from a term's results: subject names
+    resolved, plus total and average marks. Returns {student_id: card}.
+    """
+    generated_at = datetime.datetime.now().isoformat()
+    cards = {}
+    for r in results:
+        card = cards.get(r["student_id"])
+        if card is None:
+            card = cards[r["student_id"]] = {"student_id": r["student_id"], "term": term, "subjects": [],
+                                             "total_marks": 0, "average": 0, "generated_at": generated_at}
+        card["subjects"].append({
+            "subject_id": r["subject_id"],
+            "subject": subjects.get(r["subject_id"], "Unknown Subject"),
+            "exam_type": r["exam_type"],
+            "marks": r["marks"],
+        })
+        card["total_marks"] += r["marks"] or 0
+    for card in cards.values():
+        card["average"] = round(card["total_marks"] / len(card["subjects"]), 2)
+    return cards
+
+
+async def generate_report_cards(term: str) -> int | None:
+    """
+    Writes (or rewrites) the report cards for a term. Returns how many were
+    written, or None when the report_cards table is missing.
+    """
+    global _use_report_cards
+    if not _use_report_cards:
+        return None
+    results = await db.fetch_all(lambda: db.table("results").select("student_id, subject_id, exam_type, marks")
+                                 .eq("term", term).order("id"))
+    cards = build_report_cards(results, term, await subject_names())
+    rows = [{"student_id": sid, "term": term, "card": card, "generated_at": card["generated_at"]}
+            for sid, card in cards.items()]
+    try:
+        for i in range(0, len(rows), REPORT_CARD_CHUNK):
+            await db.run(db.table("report_cards").upsert(rows[i:i + REPORT_CARD_CHUNK], on_conflict="student_id,term",
+                                                         returning=ReturnMethod.minimal), timeout=60)
+        # Cards left from an earlier release of this term belong to students who no longer have results
+        if rows:
+            await db.run(db.table("report_cards").delete().eq("term", term).lt("generated_at", rows[0]["generated_at"]))
+        else:
+            await db.run(db.table("report_cards").delete().eq("term", term))
+    except APIError as e:
+        if e.code not in ("42P01", "PGRST205"):  # anything but "table missing"
+            raise
+        print("⚠️ report_cards table missing (apply sql/006_report_cards.sql); parents read live results")
+        _use_report_cards = False
+        return None
+    return len(rows)
+
+
+async def withdraw_report_cards(term: str):
+    global _use_report_cards
+    if not _use_report_cards:
+        return
+    try:
+        await db.run(db.table("report_cards").delete().eq("term", term))
+    except APIError as e:
+        if e.code not in ("42P01", "PGRST205"):
+            raise
+        _use_report_cards = False
+
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-# ===============================
-# ADMIN: RELEASE / UNRELEASE RESULTS
-# ===============================
 @app.post("/admin/release-results")
-def release_results(term: str, released: bool, admin_id: int | None = None):
+async def release_results(term: str, released: bool, admin: dict = Depends(admin_only)):
     """
     Example body:
     {
       "term": "2025-T1",
-      "released": true,
-      "admin_id": 1
+      "released": true
     }
+
+    The change is recorded against the signed-in admin (from the token).
+
+    Releasing snapshots every student's report card for the term into
+    report_cards (re-release to pick up later mark changes); withholding
+    deletes them. Parents only ever read those snapshots, and only for
+    terms whose release flag is set.
     """
     try:
-        # Check if term exists already
-        existing = supabase.table("result_release").select("*").eq("term", term).execute()
+        # 1️⃣ Check if term exists already
+        existing = await db.run(db.table("result_release").select("*").eq("term", term))
 
         if existing.data:
             # Update existing release record
-            result = supabase.table("result_release").update({
+            result = await db.run(db.table("result_release").update({
                 "released": released,
                 "released_at": datetime.datetime.now().isoformat(),
-                "updated_by": admin_id
-            }).eq("term", term).execute()
+                "updated_by": admin["id"]
+            }).eq("term", term))
         else:
             # Insert a new release record
-            result = supabase.table("result_release").insert({
+            result = await db.run(db.table("result_release").insert({
                 "term": term,
                 "released": released,
                 "released_at": datetime.datetime.now().isoformat(),
-                "updated_by": admin_id
-            }).execute()
+                "updated_by": admin["id"]
+            }))
+
+        # 2️⃣ Snapshot (or withdraw) report cards once the release flag is stored
+        if released:
+            report_cards = await generate_report_cards(term)
+        else:
+            await withdraw_report_cards(term)
+            report_cards = 0
+
+        await events.publish("release", {"term": term, "released": released})
 
         status = "released" if released else "withheld"
-        return {"success": True, "message": f"Results for {term} have been {status}.", "data": result.data}
+        return {"success": True, "message": f"Results for {term} have been {status}.",
+                "report_cards": report_cards, "data": result.data}
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-@app.get("/students/{student_id}/performance")
-def get_student_performance(student_id: int):
+
+
+@app.post("/admin/report-cards/rebuild", dependencies=[Depends(admin_only)])
+async def rebuild_report_cards(term: str | None = None):
+    """
+    Rewrites report_cards for one released term, or every released term when
+    no term is given. Use it to backfill terms released before
+    sql/006_report_cards.sql was applied.
+    """
     try:
-        # 1️⃣ Fetch all results for this student
-        results_query = supabase.table("results").select("*").eq("student_id", student_id).execute()
-        results = results_query.data
+        releases = await db.run(db.table("result_release").select("term").eq("released", True).order("term"))
+        terms = [r["term"] for r in releases.data]
+        if term is not None:
+            if term not in terms:
+                raise HTTPException(status_code=400, detail=f"Results for {term} are not released.")
+            terms = [term]
+
+        rebuilt = 0
+        for t in terms:
+            written = await generate_report_cards(t)
+            if written is None:
+                raise HTTPException(status_code=503, detail="report_cards table missing (apply sql/006_report_cards.sql).")
+            rebuilt += written
+
+        scope = term or "all released terms"
+        return {"success": True, "message": f"Rebuilt {rebuilt} report cards for {scope}.", "rebuilt": rebuilt}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        if not results:
-            return {"success": True, "performance": [], "message": "No performance records found yet."}
-
-        # 2️⃣ Fetch release info for terms
-        release_query = supabase.table("result_release").select("*").execute()
-        release_status = {r["term"]: r["released"] for r in release_query.data}
-
-        # 3️⃣ Get subject names
-        subjects_query = supabase.table("subjects").select("id, name").execute()
-        subjects = {s["id"]: s["name"] for s in subjects_query.data}
-
-        # 4️⃣ Include only released term results
-        performance = []
-        for r in results:
-            term_released = release_status.get(r["term"], False)
-            if not term_released:
-                continue  # skip if not released
-
-            subject_name = subjects.get(r["subject_id"], "Unknown Subject")
-            performance.append({
-                "subject": subject_name,
-                "marks": r["marks"],
-                "term": r["term"],
-                "exam_type": r["exam_type"]
-            })
 
-        if not performance:
-            return {"success": True, "performance": [], "message": "Results not yet released."}
+async def released_report_cards(student_ids: list[int]) -> dict:
+    """
+    Report cards for released terms, {student_id: [card, ...]} oldest term
+    first: one lookup on report_cards keyed by student. Without that table
+    they are built from live results, skipping unreleased terms.
+    """
+    if not student_ids:
+        return {}
+    if _use_report_cards:
+        try:
+            rows, releases = await asyncio.gather(
+                db.run(db.table("report_cards").select("student_id, term, card")
+                       .in_("student_id", student_ids).order("term")),
+                db.run(db.table("result_release").select("term").eq("released", True)),
+            )
+            released_terms = {r["term"] for r in releases.data}
+            cards = {}
+            for r in rows.data:
+                if r["term"] in released_terms:
+                    cards.setdefault(r["student_id"], []).append(r["card"])
+            return cards
+        except APIError as e:
+            if e.code not in ("42P01", "PGRST205"):
+                raise
+
+    results, releases, subjects = await asyncio.gather(
+        db.run(db.table("results").select("student_id, subject_id, term, exam_type, marks")
+               .in_("student_id", student_ids).order("id")),
+        db.run(db.table("result_release").select("term").eq("released", True)),
+        subject_names(),
+    )
+    released_terms = {r["term"] for r in releases.data}
+    by_term = {}
+    for r in results.data:
+        if r["term"] in released_terms:
+            by_term.setdefault(r["term"], []).append(r)
+    cards = {}
+    for term, rows in sorted(by_term.items()):
+        for student_id, card in build_report_cards(rows, term, subjects).items():
+            cards.setdefault(student_id, []).append(card)
+    return cards
+
+
+def performance_view(cards: list) -> dict:
+    """The performance payload for one student's report cards."""
+    if not cards:
+        return {"performance": [], "report_cards": [], "message": "Results not yet released."}
+    return {
+        "performance": [{"subject": s["subject"], "marks": s["marks"], "term": card["term"], "exam_type": s["exam_type"]}
+                        for card in cards for s in card["subjects"]],
+        "report_cards": [{k: card[k] for k in ("term", "total_marks", "average", "generated_at")} for card in cards],
+    }
 
-        return {"success": True, "performance": performance}
+
+# ===============================
+# GET STUDENT PERFORMANCE (RELEASED TERMS ONLY)
+# ===============================
+@app.get("/students/{student_id}/performance")
+async def get_student_performance(student_id: int):
+    try:
+        cards = await released_report_cards([student_id])
+        return {"success": True, **performance_view(cards.get(student_id, []))}
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 # DELETE PARENT
-@app.delete("/delete-parent/{parent_id}")
+@app.delete("/delete-parent/{parent_id}", dependencies=[Depends(admin_only)])
 async def delete_parent(parent_id: int):
     try:
         # Assuming you are using Supabase or a similar DB connector
-        res = supabase.table("parents").delete().eq("id", parent_id).execute()
+        res = await db.run(db.table("parents").delete().eq("id", parent_id))
         if len(res.data) == 0:
             raise HTTPException(status_code=404, detail="Parent not found")
         return {"message": "Parent deleted successfully"}
@@ -888,8 +1713,8 @@ async def delete_parent(parent_id: int):
 # ===============================
 # TEACHER: BULK ADD RESULTS
 # ===============================
-@app.post("/add-results-bulk")
-def add_results_bulk(data: dict = Body(...)):
+@app.post("/add-results-bulk", dependencies=[Depends(staff_only)])
+async def add_results_bulk(data: dict = Body(...)):
     """
     Expected JSON:
     {
@@ -917,11 +1742,17 @@ def add_results_bulk(data: dict = Body(...)):
         if not isinstance(results_list, list) or not results_list:
             raise HTTPException(status_code=400, detail="Results list must contain at least one entry.")
 
-        inserts = []
-        for entry in results_list:
-            if "student_id" not in entry or "marks" not in entry:
+        # 1️⃣ Check every entry; a bad one is reported by its position (1-based) in `results`
+        rows, errors, seen = [], [], {}
+        for number, entry in enumerate(results_list, start=1):
+            if not isinstance(entry, dict) or "student_id" not in entry or "marks" not in entry:
+                errors.append({"row": number, "error": "each entry needs student_id and marks"})
+                continue
+            if entry["student_id"] in seen:
+                errors.append({"row": number, "error": f"duplicate of row {seen[entry['student_id']]} (same student)"})
                 continue
-            inserts.append({
+            seen[entry["student_id"]] = number
+            rows.append({
                 "student_id": entry["student_id"],
                 "subject_id": subject_id,
                 "teacher_id": teacher_id,
@@ -930,167 +1761,431 @@ def add_results_bulk(data: dict = Body(...)):
                 "marks": entry["marks"]
             })
 
-        # Insert all at once
-        result = supabase.table("results").insert(inserts).execute()
+        # 2️⃣ Upsert the valid entries in one request
+        saved = await save_results(rows) if rows else []
 
         return {
             "success": True,
-            "message": f"{len(inserts)} results added for subject {subject_id} ({term}).",
-            "data": result.data
+            "message": f"{len(rows)} results saved for subject {subject_id} ({term}), {len(errors)} rejected.",
+            "data": saved,
+            "rejected": len(errors),
+            "errors": errors,
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+# ===============================
+# TEACHER: UPLOAD A RESULTS SHEET (CSV / XLSX)
+# ===============================
+INGEST_CHUNK = int(os.getenv("INGEST_CHUNK", "500"))  # rows per upsert
+INGEST_MAX_ROWS = int(os.getenv("INGEST_MAX_ROWS", "20000"))
+# Per-process record of idempotency keys, used when result_uploads is missing
+upload_records = ResponseCache(max_entries=1000, ttl=86400)
+
+
+async def claim_upload(key: str, digest: str) -> dict | None:
+    """
+    Reserves an Idempotency-Key for this file. Returns the earlier upload's
+    record instead when the key was already used (on any worker).
+    """
+    record = upload_records.get(key)
+    if record is None:
+        upload_records.set(key, {"file_sha256": digest, "status": "processing"})
+        try:
+            await db.run(db.table("result_uploads").insert({"idempotency_key": key, "file_sha256": digest},
+                                                           returning=ReturnMethod.minimal))
+        except APIError as e:
+            if e.code == "23505":  # claimed by another worker
+                upload_records.delete(key)
+                rows = (await db.run(db.table("result_uploads").select("*").eq("idempotency_key", key))).data
+                return rows[0] if rows else None
+            if e.code not in ("42P01", "PGRST205"):  # table missing: this process's record suffices
+                upload_records.delete(key)
+                raise
+        return None
+    return record
+
+
+async def settle_upload(key: str, digest: str, report: dict | None):
+    """Stores the finished report under the key, or releases the key (report None) so the upload can be retried."""
+    try:
+        if report is None:
+            upload_records.delete(key)
+            await db.run(db.table("result_uploads").delete().eq("idempotency_key", key))
+        else:
+            upload_records.set(key, {"file_sha256": digest, "status": "done", "report": report})
+            await db.run(db.table("result_uploads").update({"status": "done", "report": report})
+                         .eq("idempotency_key", key))
+    except APIError:
+        pass
+
+
+def validate_sheet(file, filename: str, students: dict, subjects: dict, defaults: dict) -> ResultValidator:
+    validator = ResultValidator(students, subjects, defaults, INGEST_MAX_ROWS)
+    for number, raw in read_rows(file, filename):
+        validator.add(number, raw)
+    return validator
+
+
+@app.post("/results/upload", dependencies=[Depends(staff_only)])
+async def upload_results(
+    file: UploadFile = File(...),
+    term: str | None = Form(None),
+    exam_type: str | None = Form(None),
+    subject_id: int | None = Form(None),
+    teacher_id: int | None = Form(None),
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key"),
+):
+    """
+    Multipart upload of a marks sheet (.csv or .xlsx) with columns
+    student_id or reg_no, marks and optionally subject_id / term /
+    exam_type / teacher_id (otherwise taken from the form fields).
+
+    Valid rows are upserted INGEST_CHUNK at a time on (student_id,
+    subject_id, term, exam_type), so re-uploading a corrected sheet updates
+    marks instead of duplicating them. Every rejected row is listed in
+    `errors` with its sheet row number. Send an Idempotency-Key header to
+    make retries safe: a repeated key returns the first upload's report.
+    """
+    started = time.perf_counter()
+    digest = None
+    try:
+        # 1️⃣ Idempotency: a key that was already used replays its report
+        if idempotency_key:
+            digest = await run_in_threadpool(file_digest, file.file)
+            record = await claim_upload(idempotency_key, digest)
+            if record is not None:
+                if record["file_sha256"] != digest:
+                    raise HTTPException(status_code=422, detail="This Idempotency-Key was already used for a different file.")
+                if record["status"] != "done":
+                    raise HTTPException(status_code=409, detail="An upload with this Idempotency-Key is still being processed.")
+                return {**record["report"], "replayed": True}
+
+        # 2️⃣ Parse and validate every row (off the event loop; XLSX parsing is CPU-bound)
+        students = await student_directory()
+        subjects = await subject_names()
+        defaults = {"term": term, "exam_type": exam_type, "subject_id": subject_id, "teacher_id": teacher_id}
+        try:
+            sheet = await run_in_threadpool(validate_sheet, file.file, file.filename, students, subjects, defaults)
+        except SheetError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        errors = sheet.errors
+
+        # 3️⃣ Upsert valid rows in fixed-size chunks; a rejected chunk is reported per row
+        upserted = 0
+        for i in range(0, len(sheet.rows), INGEST_CHUNK):
+            chunk = sheet.rows[i:i + INGEST_CHUNK]
+            try:
+                await db.run(db.table("results").upsert([{k: v for k, v in r.items() if k != "_row"} for r in chunk],
+                                                        on_conflict=RESULT_CONFLICT, returning=ReturnMethod.minimal))
+                upserted += len(chunk)
+            except APIError as e:
+                if e.code == "42P10":  # no unique key to upsert on
+                    raise HTTPException(status_code=500, detail="Apply backend/sql/005_result_ingestion.sql before uploading sheets.")
+                errors += [{"row": r["_row"], "error": f"rejected by the database: {e.message}"} for r in chunk]
+        errors.sort(key=lambda err: err["row"])
+
+        # 4️⃣ Refresh what depends on results
+        terms = sorted({r["term"] for r in sheet.rows})
+        if upserted:
+            ref.invalidate("results")  # class aggregates follow in the database (sql/007 triggers)
+            await events.publish("results", {"terms": terms, "count": upserted})
+
+        report = {
+            "success": True,
+            "message": f"{upserted} of {sheet.total} rows saved, {len(errors)} rejected.",
+            "file": file.filename,
+            "rows": sheet.total,
+            "upserted": upserted,
+            "rejected": len(errors),
+            "errors": errors,
+            "terms": terms,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+            "replayed": False,
+        }
+        if idempotency_key:
+            await settle_upload(idempotency_key, digest, report)
+            digest = None
+        return report
+
+    except HTTPException as e:
+        if idempotency_key and digest and e.status_code not in (409, 422):
+            await settle_upload(idempotency_key, digest, None)
+        raise
+    except Exception as e:
+        if idempotency_key and digest:
+            await settle_upload(idempotency_key, digest, None)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # ===============================
 # ADMIN: VIEW ALL RESULTS (RAW DATA)
 # ===============================
+RESULT_FIELDS = ["student_name", "student_reg", "grade", "subject", "teacher", "marks", "term", "exam_type"]
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "1000"))
+
+
+def filter_results(columns: str, students: dict, term=None, grade=None, subject_id=None, exam_type=None):
+    """
+    Builds the results query with its filters applied in the database. The
+    grade filter goes through an inner join on students, so the URL stays
+    short however many students the grade has. Returns None when the grade
+    has no students (nothing can match).
+    """
+    if grade and not any(s["grade"] == grade for s in students.values()):
+        return None
+    if grade:
+        columns += ", students!inner(grade)"
+    query = db.table("results").select(columns)
+    if term:
+        query = query.eq("term", term)
+    if subject_id:
+        query = query.eq("subject_id", subject_id)
+    if exam_type:
+        query = query.eq("exam_type", exam_type)
+    if grade:
+        query = query.eq("students.grade", grade)
+    return query
+
+
+def format_result(r: dict, students: dict, subjects: dict, teachers: dict) -> dict:
+    student = students.get(r["student_id"], {})
+    return {
+        "student_name": student.get("name", "Unknown"),
+        "student_reg": student.get("reg_no", "N/A"),
+        "grade": student.get("grade", "N/A"),
+        "subject": subjects.get(r["subject_id"], "Unknown"),
+        "teacher": teachers.get(r["teacher_id"], "Unknown"),
+        "marks": r["marks"],
+        "term": r["term"],
+        "exam_type": r["exam_type"],
+    }
+
+
 @app.get("/admin/view-results")
-def admin_view_results(term: str | None = None):
+async def admin_view_results(term: str | None = None, grade: str | None = None, subject_id: int | None = None,
+                             exam_type: str | None = None, limit: int | None = None, after: str | None = None):
     """
-    Returns all recorded marks (optionally filtered by term).
+    Returns recorded marks, filtered in the database by term, grade, subject
+    and exam type. Pass `limit`/`after` to page by result id.
     """
     try:
-        query = supabase.table("results").select("*")
-        if term:
-            query = query.eq("term", term)
-        results_query = query.execute()
-        results = results_query.data
+        # Supporting data (reference-data cache)
+        students = await student_directory()
+        subjects = await subject_names()
+        teachers = await teacher_names()
 
-        if not results:
+        query = filter_results("*", students, term, grade, subject_id, exam_type)
+        if query is None:
             return {"success": True, "results": [], "message": "No results found."}
 
-        # Fetch supporting data
-        students = {s["id"]: s for s in supabase.table("students").select("id, name, reg_no, grade").execute().data}
-        subjects = {s["id"]: s["name"] for s in supabase.table("subjects").select("id, name").execute().data}
-        teachers = {t["id"]: t["name"] for t in supabase.table("users").select("id, name").eq("role", "teacher").execute().data}
+        page = {}
+        if limit is None:
+            results = (await db.run(query)).data
+        else:
+            results, next_cursor = split_page((await db.run(after_id(query, after, limit))).data, limit)
+            page = {"next_cursor": next_cursor}
+
+        if not results:
+            return {"success": True, "results": [], "message": "No results found.", **page}
 
         # Combine all info neatly
-        formatted = []
-        for r in results:
-            formatted.append({
-                "student_name": students.get(r["student_id"], {}).get("name", "Unknown"),
-                "student_reg": students.get(r["student_id"], {}).get("reg_no", "N/A"),
-                "grade": students.get(r["student_id"], {}).get("grade", "N/A"),
-                "subject": subjects.get(r["subject_id"], "Unknown"),
-                "teacher": teachers.get(r["teacher_id"], "Unknown"),
-                "marks": r["marks"],
-                "term": r["term"],
-                "exam_type": r["exam_type"],
-            })
+        formatted = [format_result(r, students, subjects, teachers) for r in results]
 
-        return {"success": True, "results": formatted}
+        # Large payload of plain JSON values: skip FastAPI's jsonable_encoder pass
+        return ORJSONResponse({"success": True, "results": formatted, **page})
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+# ===============================
+# ADMIN: EXPORT RESULTS (streaming CSV / NDJSON)
+# ===============================
+@app.get("/admin/export-results", response_class=StreamingResponse)
+async def export_results(term: str | None = None, format: str = "csv", grade: str | None = None,
+                         subject_id: int | None = None, exam_type: str | None = None):
+    """
+    Streams every matching result as CSV or NDJSON. Rows are read from
+    Supabase EXPORT_PAGE_SIZE at a time (keyset on id) and written out as
+    each page arrives, so memory stays flat however large the term is.
+    """
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'csv' or 'ndjson'.")
+
+    students = await student_directory()
+    subjects = await subject_names()
+    teachers = await teacher_names()
+
+    def build():
+        columns = "id, student_id, subject_id, teacher_id, marks, term, exam_type"
+        return filter_results(columns, students, term, grade, subject_id, exam_type)
+
+    async def pages():
+        if build() is None:
+            return
+        last_id = None
+        while True:
+            query = build().order("id").limit(EXPORT_PAGE_SIZE)
+            if last_id is not None:
+                query = query.gt("id", last_id)
+            rows = (await db.run(query)).data
+            if rows:
+                yield [format_result(r, students, subjects, teachers) for r in rows]
+            if len(rows) < EXPORT_PAGE_SIZE:
+                return
+            last_id = rows[-1]["id"]
+
+    async def csv_body():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        yield buffer.getvalue()
+        async for page in pages():
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(page)
+            yield buffer.getvalue()
+
+    async def ndjson_body():
+        async for page in pages():
+            yield "".join(json.dumps(row) + "\n" for row in page)
+
+    filename = f"results-{term or 'all'}.{format}"
+    return StreamingResponse(
+        csv_body() if format == "csv" else ndjson_body(),
+        media_type="text/csv" if format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 # ===============================
 # ADMIN: RESULTS CONTROL PANEL
 # ===============================
-@app.get("/admin/results-summary")
-def results_summary(term: str):
+async def build_results_summary(term: str) -> dict:
     """
-    Returns upload stats for Grades 1–9 (always shown), with dynamic counts.
+    Upload stats for Grades 1–9 (always shown), with dynamic counts.
     """
-    try:
-        # All possible grade names (adjust as needed)
-        grade_list = [f"Grade {i}" for i in range(1, 10)]
+    # All possible grade names (adjust as needed)
+    grade_list = [f"Grade {i}" for i in range(1, 10)]
 
-        # Get all subjects
-        subjects = supabase.table("subjects").select("id").execute().data
-        total_subjects = len(subjects)
+    # Get all subjects
+    subjects = await subject_rows()
+    total_subjects = len(subjects)
 
-        # Get all students (for grade grouping)
-        students = supabase.table("students").select("id, grade").execute().data
-        grade_students = {g: [s["id"] for s in students if s["grade"] == g] for g in grade_list}
+    # NumPy is imported on first use (warm_up() preloads it) to keep cold starts short
+    from aggregate import columns, distinct_per_group, grade_codes, grade_lookup
 
-        # Get all results for that term
-        results = supabase.table("results").select("student_id, subject_id").eq("term", term).execute().data
+    # Student→grade map as arrays (reference-data cache)
+    students = (await student_directory()).values()
+    lookup = grade_lookup(students, grade_list)
 
-        # Build per-grade metrics
-        summary = []
-        for grade in grade_list:
-            student_ids = grade_students.get(grade, [])
-            uploaded_subjects = set()
-            for r in results:
-                if r["student_id"] in student_ids:
-                    uploaded_subjects.add(r["subject_id"])
-            uploaded = len(uploaded_subjects)
-            pending = max(0, total_subjects - uploaded)
-            status = "✅ Complete" if uploaded == total_subjects and total_subjects > 0 else "⏳ In Progress"
+    # All results for that term, paged past PostgREST's max-rows
+    results = await db.fetch_all(
+        lambda: db.table("results").select("id, student_id, subject_id").eq("term", term).order("id")
+    )
+
+    # Distinct uploaded subjects per grade, counted column-wise
+    cols = columns(results, "student_id", "subject_id")
+    uploaded_counts = distinct_per_group(
+        grade_codes(cols["student_id"], lookup), cols["subject_id"], len(grade_list)
+    )
+
+    # Build per-grade metrics
+    summary = []
+    for grade, uploaded in zip(grade_list, uploaded_counts.tolist()):
+        pending = max(0, total_subjects - uploaded)
+        status = "✅ Complete" if uploaded == total_subjects and total_subjects > 0 else "⏳ In Progress"
+
+        summary.append({
+            "class": grade,
+            "total_subjects": total_subjects,
+            "uploaded": uploaded,
+            "pending": pending,
+            "status": status
+        })
+
+    return {"success": True, "summary": summary}
 
-            summary.append({
-                "class": grade,
-                "total_subjects": total_subjects,
-                "uploaded": uploaded,
-                "pending": pending,
-                "status": status
-            })
 
-        return {"success": True, "summary": summary}
+@app.get("/admin/results-summary")
+async def results_summary(request: Request, term: str):
+    """
+    Returns upload stats for Grades 1–9. Polls while nothing changed get a 304.
+    """
+    try:
+        return await conditional.respond(request, ("results", "students", "subjects"),
+                                         lambda: build_results_summary(term), "private, no-cache")
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/admin/class-results/{grade}")
-def get_class_results(grade: str):
+async def read_class_aggregates(grade: str, term: str | None = None) -> list[dict]:
+    """
+    The class's rows from class_aggregates — one indexed read. Without the
+    table (sql/004 not applied) they are computed from that grade's results.
+    """
+    query = db.table("class_aggregates").select("*").eq("grade", grade)
+    if term:
+        query = query.eq("term", term)
     try:
-        # Fetch all results joined with student info
-        results = (
-            supabase.table("results")
-            .select("subject_id, teacher_id, marks, student_id")
-            .execute()
-        )
+        return (await db.run(query.order("updated_at"))).data
+    except APIError as e:
+        if e.code not in ("42P01", "PGRST205"):  # anything but "table missing"
+            raise
 
-        if not results.data:
-            return {"success": True, "class": grade, "subjects": []}
+    students = await student_directory()
+    grade_ids = [s["id"] for s in students.values() if s["grade"] == grade]
 
-        # Load mapping data
-        students = {
-            s["id"]: s
-            for s in supabase.table("students")
-            .select("id, grade")
-            .execute()
-            .data
-        }
-        subjects = {
-            s["id"]: s["name"]
-            for s in supabase.table("subjects").select("id, name").execute().data
-        }
-        teachers = {
-            t["id"]: t["name"]
-            for t in supabase.table("users")
-            .select("id, name")
-            .eq("role", "teacher")
-            .execute()
-            .data
-        }
+    def build():
+        q = db.table("results").select("student_id, subject_id, teacher_id, marks, term").order("id")
+        return q.eq("term", term) if term else q
 
-        # Group results per subject for this grade
-        from collections import defaultdict
-        subject_summary = defaultdict(lambda: {"uploaded": 0, "total_marks": 0, "count": 0, "teacher": None})
+    results = await db.fetch_in(build, "student_id", grade_ids, chunk=ID_CHUNK)
+    return class_aggregate_deltas(results, students)
 
-        for r in results.data:
-            student = students.get(r["student_id"])
-            if not student or student["grade"] != grade:
-                continue
 
-            subj = subjects.get(r["subject_id"], "Unknown")
-            teacher = teachers.get(r["teacher_id"], "Unknown")
+@app.get("/admin/class-results/{grade}")
+async def get_class_results(grade: str, term: str | None = None):
+    """
+    Per-subject uploads and marks for a class, across all terms or for ?term=.
+    """
+    try:
+        rows = await read_class_aggregates(grade, term)
+        if not rows:
+            return {"success": True, "class": grade, "subjects": []}
 
-            subject_summary[subj]["uploaded"] += 1
-            subject_summary[subj]["total_marks"] += r.get("marks", 0)
-            subject_summary[subj]["count"] += 1
-            subject_summary[subj]["teacher"] = teacher
+        # Load mapping data (reference-data cache)
+        subjects = await subject_names()
+        teachers = await teacher_names()
+
+        # Combine terms per subject; rows come oldest update first, so the
+        # teacher left is the one who uploaded last
+        per_subject = {}
+        for a in rows:
+            info = per_subject.setdefault(a["subject_id"], {"count": 0, "total": 0, "min": None, "max": None, "teacher_id": None})
+            info["count"] += a["result_count"]
+            info["total"] += a["marks_sum"] or 0
+            if a["marks_min"] is not None:
+                info["min"] = a["marks_min"] if info["min"] is None else min(info["min"], a["marks_min"])
+            if a["marks_max"] is not None:
+                info["max"] = a["marks_max"] if info["max"] is None else max(info["max"], a["marks_max"])
+            info["teacher_id"] = a["teacher_id"] or info["teacher_id"]
 
         # Format output
         summary = []
-        for subject, info in subject_summary.items():
-            avg = round(info["total_marks"] / info["count"], 1) if info["count"] else None
+        for subject_id, info in per_subject.items():
+            avg = round(info["total"] / info["count"], 1) if info["count"] else None
             summary.append({
-                "subject": subject,
-                "teacher": info["teacher"],
-                "uploaded": info["uploaded"],
+                "subject": subjects.get(subject_id, "Unknown"),
+                "teacher": teachers.get(info["teacher_id"], "Unknown"),
+                "uploaded": info["count"],
                 "pending": 0,
-                "average_marks": avg
+                "average_marks": avg,
+                "min_marks": info["min"],
+                "max_marks": info["max"]
             })
 
         return {"success": True, "class": grade, "subjects": summary}
@@ -1099,3 +2194,19 @@ def get_class_results(grade: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/admin/class-aggregates/rebuild", dependencies=[Depends(admin_only)])
+async def rebuild_class_aggregates(term: str | None = None):
+    """
+    Recomputes class_aggregates from results — for one term, or all of them
+    when no term is given. Use it to backfill, or to repair aggregates after
+    writes made before sql/007's triggers were applied.
+    """
+    try:
+        rebuilt = (await db.run(db.rpc("rebuild_class_aggregates", {"p_term": term}), timeout=120)).data
+        scope = term or "all terms"
+        return {"success": True, "message": f"Rebuilt {rebuilt} class aggregates for {scope}.", "rebuilt": rebuilt}
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
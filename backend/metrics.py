@@ -0,0 +1,324 @@
+import os
+import time
+from contextvars import ContextVar
+
+from starlette.routing import Match
+
+
+# ==================================
+# METRICS (Prometheus text format) + PER-REQUEST TIMINGS
+# ==================================
+# A small in-process registry rendered at GET /metrics in the Prometheus
+# text exposition format, so no client library is needed. Recorded:
+#   http_*       per-route latency histogram, in-flight gauge, status counts
+#   supabase_*   per-table/operation call latency, outcomes, bytes returned,
+#                and round trips per HTTP request
+#   openai_*     completion latency, outcomes, tokens and coalesced requests
+#   ai_*         AI requests refused by the per-caller rate limit
+# The same numbers for the current request go out in its Server-Timing
+# header (see MetricsMiddleware). Each worker process keeps its own
+# registry, so scrape every worker (or run one) for complete counts.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+AI_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+ROUND_TRIP_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labels
+        self.values: dict[tuple, object] = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        self.values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self.values.get(key)
+        if series is None:
+            # per-bucket (not cumulative) counts, then sum and count
+            series = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list[Metric] = []
+
+    def add(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for m in self.metrics for line in m.render()) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.add(Counter(
+    "http_requests_total", "HTTP requests by route template and status code.", ("method", "route", "status")))
+http_latency = registry.add(Histogram(
+    "http_request_duration_seconds", "Time from request to the end of the response body.", ("method", "route")))
+http_in_flight = registry.add(Gauge(
+    "http_requests_in_flight", "Requests currently being handled.", ("method", "route")))
+request_round_trips = registry.add(Histogram(
+    "http_request_supabase_round_trips", "Supabase calls made while handling one request.", ("method", "route"),
+    buckets=ROUND_TRIP_BUCKETS))
+
+supabase_latency = registry.add(Histogram(
+    "supabase_request_duration_seconds", "Supabase (PostgREST) call latency.", ("table", "operation")))
+supabase_requests = registry.add(Counter(
+    "supabase_requests_total", "Supabase calls by outcome (ok, error, timeout).", ("table", "operation", "outcome")))
+supabase_bytes = registry.add(Counter(
+    "supabase_response_bytes_total", "Response body bytes returned by Supabase.", ("table", "operation")))
+
+openai_latency = registry.add(Histogram(
+    "openai_request_duration_seconds", "OpenAI completion latency (whole stream for streamed answers).",
+    ("operation",), buckets=AI_BUCKETS))
+openai_requests = registry.add(Counter(
+    "openai_requests_total", "OpenAI completions by outcome (ok, error, timeout).", ("operation", "outcome")))
+openai_tokens = registry.add(Counter(
+    "openai_tokens_total", "Tokens reported by OpenAI usage.", ("kind",)))
+openai_coalesced = registry.add(Counter(
+    "openai_coalesced_requests_total", "AI requests that joined an identical in-flight completion.", ("operation",)))
+ai_rate_limited = registry.add(Counter(
+    "ai_rate_limited_total", "AI requests refused with 429 by the per-caller token bucket.", ("route",)))
+
+startup_seconds = registry.add(Gauge(
+    "app_startup_seconds", "Seconds from process start to each startup phase.", ("phase",)))
+
+
+# ---------------- startup ----------------
+def _process_age() -> float | None:
+    """Seconds since this process started (Linux), so interpreter and server boot count too."""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(uptime - start_ticks / os.sysconf("SC_CLK_TCK"), 0.0)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class Startup:
+    """
+    Time to each startup phase: "imported" (app object built), "ready"
+    (lifespan startup finished) and "first_response" (first request served).
+    Measured from process start where the OS tells us, else from this import.
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter() - (_process_age() or 0.0)
+        self.phases: dict[str, float] = {}
+
+    def mark(self, phase: str) -> float:
+        if phase not in self.phases:
+            self.phases[phase] = round(time.perf_counter() - self.origin, 3)
+            startup_seconds.set(self.phases[phase], phase=phase)
+        return self.phases[phase]
+
+    def uptime(self) -> float:
+        return round(time.perf_counter() - self.origin, 1)
+
+
+startup = Startup()
+
+
+# ---------------- per-request timings ----------------
+class RequestTimings:
+    """Supabase and OpenAI time spent on behalf of one HTTP request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.round_trips = 0
+        self.db_ms = 0.0
+        self.db_bytes = 0
+        self.ai_calls = 0
+        self.ai_ms = 0.0
+        self.calls: dict[str, list] = {}  # "table.operation" → [count, ms]
+
+    def server_timing(self) -> str:
+        parts = [f'db;dur={self.db_ms:.1f};desc="{self.round_trips} round trips, {self.db_bytes} bytes"']
+        for name, (count, ms) in sorted(self.calls.items(), key=lambda item: -item[1][1]):
+            parts.append(f'db.{name};dur={ms:.1f};desc="{count}x"')
+        if self.ai_calls:
+            parts.append(f'ai;dur={self.ai_ms:.1f};desc="{self.ai_calls} completions"')
+        parts.append(f"app;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_timings: ContextVar[RequestTimings | None] = ContextVar("request_timings", default=None)
+
+
+def query_labels(method: str, path: str, prefer: str = "") -> tuple[str, str]:
+    """(table, operation) of a PostgREST call, e.g. ("students", "select")."""
+    path = path.rsplit("/rest/v1", 1)[-1].strip("/")
+    if path.startswith("rpc/"):
+        return path[4:], "rpc"
+    if method == "POST":
+        return path, "upsert" if "resolution=" in prefer else "insert"
+    return path, {"GET": "select", "HEAD": "select", "PATCH": "update", "DELETE": "delete"}.get(method, method.lower())
+
+
+def record_query(table: str, operation: str, seconds: float, outcome: str):
+    supabase_latency.observe(seconds, table=table, operation=operation)
+    supabase_requests.inc(table=table, operation=operation, outcome=outcome)
+    timings = _timings.get()
+    if timings is not None:
+        timings.round_trips += 1
+        timings.db_ms += seconds * 1000
+        call = timings.calls.setdefault(f"{table}.{operation}", [0, 0.0])
+        call[0] += 1
+        call[1] += seconds * 1000
+
+
+async def record_response_size(response):
+    """httpx response hook on the Supabase session: counts body bytes per table/operation."""
+    await response.aread()
+    request = response.request
+    table, operation = query_labels(request.method, request.url.path, request.headers.get("prefer", ""))
+    supabase_bytes.inc(len(response.content), table=table, operation=operation)
+    timings = _timings.get()
+    if timings is not None:
+        timings.db_bytes += len(response.content)
+
+
+def record_ai(operation: str, seconds: float, outcome: str, usage=None):
+    openai_latency.observe(seconds, operation=operation)
+    openai_requests.inc(operation=operation, outcome=outcome)
+    if usage is not None:
+        openai_tokens.inc(usage.prompt_tokens or 0, kind="prompt")
+        openai_tokens.inc(usage.completion_tokens or 0, kind="completion")
+    timings = _timings.get()
+    if timings is not None:
+        timings.ai_calls += 1
+        timings.ai_ms += seconds * 1000
+
+
+def route_template(scope) -> str:
+    """The path template of the route that will handle this request, or "unmatched"."""
+    app = scope.get("app")
+    for route in getattr(app, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "unmatched")
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    Times every HTTP request to the end of its body and labels it with the
+    matched route template (so /students/7 and /students/8 share a series).
+    Adds Server-Timing and X-DB-Round-Trips headers with the Supabase and
+    OpenAI time spent before the response started.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timings = RequestTimings()
+        token = _timings.set(timings)
+        method = scope["method"]
+        route = route_template(scope)
+        http_in_flight.inc(method=method, route=route)
+        status = 500
+
+        async def timed_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = [(k, v) for k, v in message.get("headers", [])
+                           if k.lower() not in (b"server-timing", b"x-db-round-trips")]
+                headers.append((b"server-timing", timings.server_timing().encode("latin-1")))
+                headers.append((b"x-db-round-trips", str(timings.round_trips).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            http_in_flight.dec(method=method, route=route)
+            http_requests.inc(method=method, route=route, status=str(status))
+            http_latency.observe(time.perf_counter() - timings.started, method=method, route=route)
+            request_round_trips.observe(timings.round_trips, method=method, route=route)
+            startup.mark("first_response")
+            _timings.reset(token)
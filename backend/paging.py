@@ -0,0 +1,80 @@
+import base64
+import json
+
+from fastapi import HTTPException
+
+
+# ==================================
+# KEYSET PAGINATION
+# ==================================
+# List endpoints accept `limit` and `after`. `after` is the opaque `next_cursor`
+# from the previous page; it encodes the sort key of that page's last row, so
+# each page is a single indexed range read however deep the client goes.
+
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(row: dict, keys: tuple[str, ...]) -> str:
+    raw = json.dumps([row[k] for k in keys], separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, keys: tuple[str, ...]) -> dict:
+    """
+    The sort key encoded by encode_cursor. `id` must be an integer and any
+    other key a string, since both end up inside a PostgREST filter.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError
+        key = dict(zip(keys, values))
+        for name, value in key.items():
+            if name == "id":
+                if not isinstance(value, int) or isinstance(value, bool):
+                    raise ValueError
+            elif not isinstance(value, str) or '"' in value or "\\" in value:
+                raise ValueError
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor.")
+    return key
+
+
+def check_limit(limit: int) -> int:
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_PAGE_SIZE}.")
+    return limit
+
+
+def after_id(query, after: str | None, limit: int):
+    """Ascending keyset on `id`; fetches one extra row to detect a next page."""
+    query = query.order("id").limit(check_limit(limit) + 1)
+    if after:
+        query = query.gt("id", decode_cursor(after, ("id",))["id"])
+    return query
+
+
+def newest_first(query, after: str | None, limit: int, column: str = "created_at"):
+    """Descending keyset on (`column`, id) for feeds such as announcements."""
+    query = query.order(column, desc=True).order("id", desc=True).limit(check_limit(limit) + 1)
+    if after:
+        key = decode_cursor(after, (column, "id"))
+        query = query.or_(
+            f'{column}.lt."{key[column]}",and({column}.eq."{key[column]}",id.lt.{key["id"]})'
+        )
+    return query
+
+
+def prefix_pattern(prefix: str) -> str:
+    """ILIKE pattern for "starts with", with LIKE wildcards in the input escaped."""
+    escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{escaped}%"
+
+
+def split_page(rows: list, limit: int, keys: tuple[str, ...] = ("id",)) -> tuple[list, str | None]:
+    """Trims the look-ahead row and returns (page_rows, next_cursor)."""
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(page[-1], keys)
@@ -0,0 +1,61 @@
+import math
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException
+
+
+# ==================================
+# TOKEN-BUCKET RATE LIMITS
+# ==================================
+# One bucket per caller (signed-in user, else client IP). A bucket holds up
+# to `burst` tokens and refills at `rate` tokens per second; each charged
+# request takes one, and an empty bucket answers 429 with Retry-After set
+# to when the next token arrives. Buckets are per worker process and the
+# least recently used are dropped beyond `max_keys`, so memory stays flat.
+
+
+class TokenBuckets:
+    def __init__(self, rate: float, burst: float, max_keys: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, list] = OrderedDict()  # key → [tokens, updated_at]
+        self.allowed = 0
+        self.limited = 0
+
+    def take(self, key: str, cost: float = 1.0) -> float:
+        """Charges `cost` tokens to `key`; returns 0 if allowed, else seconds until it would be."""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.burst, now]
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] >= cost:
+            bucket[0] -= cost
+            self.allowed += 1
+            return 0.0
+        self.limited += 1
+        return (cost - bucket[0]) / self.rate if self.rate > 0 else float("inf")
+
+    def check(self, key: str, cost: float = 1.0):
+        """take(), raising 429 + Retry-After when the bucket is empty."""
+        wait = self.take(key, cost)
+        if wait:
+            retry_after = str(math.ceil(wait)) if math.isfinite(wait) else "3600"
+            raise HTTPException(status_code=429, detail="Too many requests, please slow down.",
+                                headers={"Retry-After": retry_after})
+
+    def stats(self) -> dict:
+        return {
+            "rate_per_minute": round(self.rate * 60, 2),
+            "burst": self.burst,
+            "callers": len(self._buckets),
+            "allowed": self.allowed,
+            "limited": self.limited,
+        }
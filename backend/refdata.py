@@ -0,0 +1,222 @@
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import orjson
+
+from db import db
+
+
+# ==================================
+# REFERENCE DATA CACHE (subjects, teacher names, student directory)
+# ==================================
+# Small, read-mostly tables that nearly every admin/parent view joins against.
+# Each dataset carries a version that write routes bump through invalidate();
+# REFDATA_TTL (seconds, default 300) is a safety net for writes made outside
+# this process (other workers, the Supabase dashboard).
+#
+# Warm start: with REFDATA_SNAPSHOT set to a local file, the cache is saved
+# there at shutdown and read back at boot, so the first requests after a
+# cold start are served from it while it is refreshed from Supabase in the
+# background. Snapshots older than REFDATA_SNAPSHOT_MAX_AGE (seconds,
+# default 86400) are ignored.
+#
+# Pinning: inside `with ref.pinned():` every dataset is read at most once
+# and the same value is returned for the rest of the block, including in
+# tasks started from it. /batch uses this so its sub-requests share one
+# consistent view of the reference data.
+
+SNAPSHOT_PATH = os.getenv("REFDATA_SNAPSHOT") or None
+SNAPSHOT_MAX_AGE = float(os.getenv("REFDATA_SNAPSHOT_MAX_AGE", "86400"))
+
+STUDENT_COLUMNS = "id, name, reg_no, grade, gender, date_of_birth, created_at"
+
+
+_pinned: ContextVar[dict | None] = ContextVar("refdata_pinned", default=None)
+
+
+class Dataset:
+    def __init__(self, name: str, loader):
+        self.name = name
+        self.loader = loader
+        self.value = None
+        self.loaded_at = 0.0
+        self.version = 0
+        self.loaded_version = -1
+        self.lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.source = None  # "supabase" or "snapshot"
+
+
+class RefDataCache:
+    def __init__(self, ttl: float = 300.0):
+        self.ttl = ttl
+        self._datasets: dict[str, Dataset] = {}
+
+    def register(self, name: str, loader):
+        self._datasets[name] = Dataset(name, loader)
+
+    def track(self, name: str):
+        """A version counter with no cached value, for data only versioned (see etag.py)."""
+        self._datasets[name] = Dataset(name, None)
+
+    def _fresh(self, ds: Dataset) -> bool:
+        return ds.loaded_version == ds.version and time.monotonic() - ds.loaded_at < self.ttl
+
+    @contextmanager
+    def pinned(self):
+        token = _pinned.set({})
+        try:
+            yield
+        finally:
+            _pinned.reset(token)
+
+    async def get(self, name: str):
+        pinned = _pinned.get()
+        if pinned is None:
+            return await self._get(name)
+        if name not in pinned:
+            # Concurrent readers in the block share the first lookup
+            pinned[name] = asyncio.ensure_future(self._get(name))
+        return await asyncio.shield(pinned[name])
+
+    async def _get(self, name: str):
+        ds = self._datasets[name]
+        if self._fresh(ds):
+            ds.hits += 1
+            return ds.value
+        async with ds.lock:
+            # Another request may have reloaded it while we waited
+            if self._fresh(ds):
+                ds.hits += 1
+                return ds.value
+            ds.misses += 1
+            return await self._load(ds)
+
+    async def _load(self, ds: Dataset):
+        version = ds.version
+        value = await ds.loader()
+        ds.value = value
+        ds.loaded_at = time.monotonic()
+        # An invalidation during the load leaves the entry stale on purpose
+        ds.loaded_version = version
+        ds.source = "supabase"
+        return value
+
+    async def refresh(self, *names: str):
+        """
+        Reloads datasets from Supabase. Readers keep getting the current
+        value until the new one is in.
+        """
+        async def reload(ds: Dataset):
+            async with ds.lock:
+                await self._load(ds)
+
+        await asyncio.gather(*[reload(self._datasets[name]) for name in names])
+
+    def save_snapshot(self, path: str) -> list[str]:
+        """Writes every up-to-date cached dataset to `path` (atomically)."""
+        datasets = {
+            name: ds.value for name, ds in self._datasets.items()
+            if ds.loader is not None and ds.loaded_version == ds.version
+        }
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(orjson.dumps({"saved_at": time.time(), "datasets": datasets}, option=orjson.OPT_NON_STR_KEYS))
+        os.replace(tmp, path)
+        return list(datasets)
+
+    def load_snapshot(self, path: str, max_age: float) -> list[str]:
+        """
+        Seeds the cache from a save_snapshot() file; returns the datasets
+        restored (none when the file is missing, unreadable or too old).
+        """
+        try:
+            with open(path, "rb") as f:
+                snapshot = orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError):
+            return []
+        if time.time() - snapshot.get("saved_at", 0) > max_age:
+            return []
+        restored = []
+        for name, value in snapshot.get("datasets", {}).items():
+            ds = self._datasets.get(name)
+            if ds is None or ds.loader is None:
+                continue
+            if isinstance(value, dict):
+                # JSON object keys are strings; the id-keyed maps use ints
+                value = {int(k) if k.isdigit() else k: v for k, v in value.items()}
+            ds.value = value
+            ds.loaded_at = time.monotonic()
+            ds.loaded_version = ds.version
+            ds.source = "snapshot"
+            restored.append(name)
+        return restored
+
+    def invalidate(self, *names: str):
+        for name in names:
+            self._datasets[name].version += 1
+
+    def version(self, name: str) -> int:
+        return self._datasets[name].version
+
+    def stats(self) -> dict:
+        out = {}
+        for name, ds in self._datasets.items():
+            if ds.loader is None:
+                out[name] = {"version": ds.version}
+                continue
+            lookups = ds.hits + ds.misses
+            out[name] = {
+                "version": ds.version,
+                "cached": ds.loaded_version == ds.version,
+                "age_seconds": round(time.monotonic() - ds.loaded_at, 1) if ds.loaded_at else None,
+                "hits": ds.hits,
+                "misses": ds.misses,
+                "hit_rate": round(ds.hits / lookups, 3) if lookups else 0.0,
+                "source": ds.source,
+            }
+        return out
+
+
+async def _load_subjects() -> list[dict]:
+    return (await db.run(db.table("subjects").select("*").order("id"))).data
+
+
+async def _load_teachers() -> dict:
+    rows = (await db.run(db.table("users").select("id, name").eq("role", "teacher"))).data
+    return {t["id"]: t["name"] for t in rows}
+
+
+async def _load_students() -> dict:
+    rows = await db.fetch_all(lambda: db.table("students").select(STUDENT_COLUMNS).order("id"))
+    return {s["id"]: s for s in rows}
+
+
+ref = RefDataCache(ttl=float(os.getenv("REFDATA_TTL", "300")))
+ref.register("subjects", _load_subjects)
+ref.register("teachers", _load_teachers)
+ref.register("students", _load_students)
+# Versioned only: bumped by their write routes so conditional GETs notice
+ref.track("announcements")
+ref.track("results")
+ref.track("teacher_list")  # teachers table + teacher_subjects links behind /get-teachers
+
+
+async def subject_rows() -> list[dict]:
+    return await ref.get("subjects")
+
+
+async def subject_names() -> dict:
+    return {s["id"]: s["name"] for s in await ref.get("subjects")}
+
+
+async def teacher_names() -> dict:
+    return await ref.get("teachers")
+
+
+async def student_directory() -> dict:
+    return await ref.get("students")
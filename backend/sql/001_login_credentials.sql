@@ -0,0 +1,11 @@
+-- One projected lookup for /login across staff (users) and parents.
+-- Only the columns login needs; users rows win when an email exists in both.
+create or replace view login_credentials as
+    select id, name, email, role, password_hash, 'users' as source
+    from users
+    union all
+    select id, name, email, 'parent' as role, password_hash, 'parents' as source
+    from parents;
+
+create index if not exists users_email_idx on users (email);
+create index if not exists parents_email_idx on parents (email);
@@ -0,0 +1,42 @@
+-- Batched, incremental /admin/compile-results.
+
+-- One compiled row per student per term, so compiles can bulk-upsert.
+-- Existing duplicates are collapsed first (any copy will do: the next full
+-- compile rewrites every row), and the constraint is only added once.
+delete from compiled_results c
+using compiled_results other
+where c.student_id = other.student_id
+  and c.term = other.term
+  and c.ctid < other.ctid;
+
+do $$
+begin
+    if not exists (select 1 from pg_constraint where conname = 'compiled_results_student_term_key') then
+        alter table compiled_results
+            add constraint compiled_results_student_term_key unique (student_id, term);
+    end if;
+end
+$$;
+
+-- Change tracking on results: only students with newer marks are recompiled
+alter table results add column if not exists updated_at timestamptz not null default now();
+
+create or replace function touch_updated_at() returns trigger as $$
+begin
+    new.updated_at = now();
+    return new;
+end
+$$ language plpgsql;
+
+drop trigger if exists results_touch_updated_at on results;
+create trigger results_touch_updated_at
+    before update on results
+    for each row execute function touch_updated_at();
+
+create index if not exists results_term_updated_idx on results (term, updated_at);
+
+-- Last successful compile per term
+create table if not exists compile_watermarks (
+    term text primary key,
+    compiled_at timestamptz not null
+);
@@ -0,0 +1,17 @@
+-- Indexes behind keyset pagination and server-side filters on list endpoints.
+create index if not exists students_grade_id_idx on students (grade, id);
+-- name_prefix filters use ILIKE, which only a trigram index can serve.
+create extension if not exists pg_trgm;
+drop index if exists students_name_pattern_idx;
+drop index if exists parents_name_pattern_idx;
+drop index if exists teachers_name_pattern_idx;
+create index if not exists students_name_trgm_idx on students using gin (name gin_trgm_ops);
+create index if not exists parents_name_trgm_idx on parents using gin (name gin_trgm_ops);
+create index if not exists teachers_name_trgm_idx on teachers using gin (name gin_trgm_ops);
+create index if not exists results_term_id_idx on results (term, id);
+create index if not exists results_student_idx on results (student_id);
+create index if not exists results_subject_idx on results (subject_id);
+create index if not exists announcements_created_id_idx on announcements (created_at desc, id desc);
+create index if not exists parent_child_parent_idx on parent_child (parent_id);
+create index if not exists student_subjects_student_idx on student_subjects (student_id);
+create index if not exists student_subjects_subject_idx on student_subjects (subject_id);
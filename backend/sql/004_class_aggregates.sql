@@ -0,0 +1,60 @@
+-- Per-(term, grade, subject) marks aggregates behind /admin/class-results.
+
+-- `grade` is the student's current grade: sql/007_class_aggregate_triggers.sql
+-- refreshes a grade's rows when students move between grades.
+create table if not exists class_aggregates (
+    term text not null,
+    grade text not null,
+    subject_id bigint not null,
+    result_count integer not null default 0,
+    marks_sum numeric not null default 0,
+    marks_min numeric,
+    marks_max numeric,
+    teacher_id bigint,
+    updated_at timestamptz not null default now(),
+    primary key (term, grade, subject_id)
+);
+
+create index if not exists class_aggregates_grade_idx on class_aggregates (grade, term);
+
+-- Folds a batch of deltas into the table atomically, so concurrent uploads
+-- for the same class and subject never lose counts. Each delta is
+-- {term, grade, subject_id, result_count, marks_sum, marks_min, marks_max, teacher_id}.
+create or replace function apply_class_aggregates(deltas jsonb) returns void as $$
+    insert into class_aggregates as a
+        (term, grade, subject_id, result_count, marks_sum, marks_min, marks_max, teacher_id, updated_at)
+    select d.term, d.grade, d.subject_id, d.result_count, d.marks_sum, d.marks_min, d.marks_max,
+           d.teacher_id, now()
+    from jsonb_to_recordset(deltas) as d(
+        term text, grade text, subject_id bigint, result_count integer,
+        marks_sum numeric, marks_min numeric, marks_max numeric, teacher_id bigint)
+    on conflict (term, grade, subject_id) do update set
+        result_count = a.result_count + excluded.result_count,
+        marks_sum = a.marks_sum + excluded.marks_sum,
+        marks_min = least(a.marks_min, excluded.marks_min),
+        marks_max = greatest(a.marks_max, excluded.marks_max),
+        teacher_id = coalesce(excluded.teacher_id, a.teacher_id),
+        updated_at = now();
+$$ language sql;
+
+-- Backfill / repair: recomputes one term (or every term when p_term is null)
+-- from results joined to the students' current grades.
+create or replace function rebuild_class_aggregates(p_term text default null) returns integer as $$
+declare
+    rebuilt integer;
+begin
+    delete from class_aggregates where p_term is null or term = p_term;
+
+    insert into class_aggregates
+        (term, grade, subject_id, result_count, marks_sum, marks_min, marks_max, teacher_id, updated_at)
+    select r.term, s.grade, r.subject_id, count(*), coalesce(sum(r.marks), 0), min(r.marks), max(r.marks),
+           (array_agg(r.teacher_id order by r.id desc))[1], now()
+    from results r
+    join students s on s.id = r.student_id
+    where (p_term is null or r.term = p_term) and s.grade is not null
+    group by r.term, s.grade, r.subject_id;
+
+    get diagnostics rebuilt = row_count;
+    return rebuilt;
+end
+$$ language plpgsql;
@@ -0,0 +1,31 @@
+-- Idempotent result uploads (/results/upload).
+
+-- One mark per student, subject, term and exam, so re-uploading a sheet
+-- updates marks instead of duplicating them. Existing duplicates are
+-- collapsed first, keeping the most recently inserted row, and the
+-- constraint is only added once.
+delete from results r
+using results newer
+where r.student_id = newer.student_id
+  and r.subject_id = newer.subject_id
+  and r.term = newer.term
+  and r.exam_type = newer.exam_type
+  and r.id < newer.id;
+
+do $$
+begin
+    if not exists (select 1 from pg_constraint where conname = 'results_student_subject_term_exam_key') then
+        alter table results
+            add constraint results_student_subject_term_exam_key unique (student_id, subject_id, term, exam_type);
+    end if;
+end
+$$;
+
+-- Outcome of each upload, by its Idempotency-Key, shared by all workers
+create table if not exists result_uploads (
+    idempotency_key text primary key,
+    file_sha256 text not null,
+    status text not null default 'processing',  -- processing | done
+    report jsonb,
+    created_at timestamptz not null default now()
+);
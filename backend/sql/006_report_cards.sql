@@ -0,0 +1,14 @@
+-- Report-card snapshots written by /admin/release-results.
+
+-- One card per student per released term: subject names resolved, totals
+-- and average included. Parents read these with a single keyed lookup;
+-- withholding a term deletes its cards, and re-releasing rewrites them.
+-- After applying, POST /admin/report-cards/rebuild backfills terms that
+-- were released before this table existed.
+create table if not exists report_cards (
+    student_id bigint not null,
+    term text not null,
+    card jsonb not null,
+    generated_at timestamptz not null default now(),
+    primary key (student_id, term)
+);
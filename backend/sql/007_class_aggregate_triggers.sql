@@ -0,0 +1,130 @@
+-- Keeps class_aggregates (sql/004) in step with results inside the writing
+-- transaction. A trigger folds every inserted, updated or deleted mark in
+-- or out of its (term, grade, subject) row, using the row's OLD and NEW
+-- values, so concurrent writers and replaced marks are counted exactly
+-- once. Changing a student's grade, or deleting a student, refreshes the
+-- grades involved.
+
+-- Folds one mark into (p_sign = 1) or out of (p_sign = -1) its class aggregate
+create or replace function fold_class_aggregate(p_student_id bigint, p_term text, p_subject_id bigint,
+                                                p_marks numeric, p_teacher_id bigint, p_sign integer)
+returns void as $$
+declare
+    g text;
+begin
+    select grade into g from students where id = p_student_id;
+    if g is null then
+        return;
+    end if;
+
+    if p_sign > 0 then
+        insert into class_aggregates as a
+            (term, grade, subject_id, result_count, marks_sum, marks_min, marks_max, teacher_id, updated_at)
+        values (p_term, g, p_subject_id, 1, coalesce(p_marks, 0), p_marks, p_marks, p_teacher_id, now())
+        on conflict (term, grade, subject_id) do update set
+            result_count = a.result_count + 1,
+            marks_sum = a.marks_sum + excluded.marks_sum,
+            marks_min = least(a.marks_min, excluded.marks_min),
+            marks_max = greatest(a.marks_max, excluded.marks_max),
+            teacher_id = coalesce(excluded.teacher_id, a.teacher_id),
+            updated_at = now();
+        return;
+    end if;
+
+    update class_aggregates a set
+        result_count = a.result_count - 1,
+        marks_sum = a.marks_sum - coalesce(p_marks, 0),
+        updated_at = now()
+    where a.term = p_term and a.grade = g and a.subject_id = p_subject_id;
+
+    -- min / max can't be subtracted: when the removed mark was one of them,
+    -- recompute both for this one class and subject
+    update class_aggregates a set (marks_min, marks_max) = (
+        select min(r.marks), max(r.marks)
+        from results r
+        join students s on s.id = r.student_id
+        where r.term = p_term and r.subject_id = p_subject_id and s.grade = g)
+    where a.term = p_term and a.grade = g and a.subject_id = p_subject_id
+      and (a.marks_min = p_marks or a.marks_max = p_marks);
+
+    delete from class_aggregates a
+    where a.term = p_term and a.grade = g and a.subject_id = p_subject_id and a.result_count <= 0;
+end
+$$ language plpgsql;
+
+create or replace function results_fold_class_aggregates() returns trigger as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform fold_class_aggregate(old.student_id, old.term, old.subject_id, old.marks, old.teacher_id, -1);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform fold_class_aggregate(new.student_id, new.term, new.subject_id, new.marks, new.teacher_id, 1);
+    end if;
+    return null;
+end
+$$ language plpgsql;
+
+drop trigger if exists results_class_aggregates on results;
+create trigger results_class_aggregates
+    after insert or delete or update of student_id, subject_id, term, marks, teacher_id on results
+    for each row execute function results_fold_class_aggregates();
+
+-- Recomputes every aggregate of one grade from results
+create or replace function refresh_grade_aggregates(p_grade text) returns integer as $$
+declare
+    refreshed integer;
+begin
+    delete from class_aggregates where grade = p_grade;
+
+    insert into class_aggregates
+        (term, grade, subject_id, result_count, marks_sum, marks_min, marks_max, teacher_id, updated_at)
+    select r.term, s.grade, r.subject_id, count(*), coalesce(sum(r.marks), 0), min(r.marks), max(r.marks),
+           (array_agg(r.teacher_id order by r.id desc))[1], now()
+    from results r
+    join students s on s.id = r.student_id
+    where s.grade = p_grade
+    group by r.term, s.grade, r.subject_id;
+
+    get diagnostics refreshed = row_count;
+    return refreshed;
+end
+$$ language plpgsql;
+
+-- Statement-level, so promoting a whole class refreshes each grade once
+create or replace function students_refresh_class_aggregates() returns trigger as $$
+declare
+    g text;
+begin
+    if tg_op = 'DELETE' then
+        for g in select distinct grade from old_rows where grade is not null loop
+            perform refresh_grade_aggregates(g);
+        end loop;
+    else
+        for g in
+            select o.grade from old_rows o join new_rows n on n.id = o.id where o.grade is distinct from n.grade
+            union
+            select n.grade from old_rows o join new_rows n on n.id = o.id where o.grade is distinct from n.grade
+        loop
+            if g is not null then
+                perform refresh_grade_aggregates(g);
+            end if;
+        end loop;
+    end if;
+    return null;
+end
+$$ language plpgsql;
+
+drop trigger if exists students_update_class_aggregates on students;
+create trigger students_update_class_aggregates
+    after update on students
+    referencing old table as old_rows new table as new_rows
+    for each statement execute function students_refresh_class_aggregates();
+
+drop trigger if exists students_delete_class_aggregates on students;
+create trigger students_delete_class_aggregates
+    after delete on students
+    referencing old table as old_rows
+    for each statement execute function students_refresh_class_aggregates();
+
+-- Start from a clean slate
+select rebuild_class_aggregates();
@@ -4,6 +4,80 @@
 
 const API_URL = "https://brightpath-3.onrender.com"; // Local FastAPI backend
 
+// Admin write routes check the signed session token saved at login
+function authHeaders(headers = {}) {
+  const token = localStorage.getItem("authToken");
+  return token ? { ...headers, Authorization: `Bearer ${token}` } : headers;
+}
+
+/* ---------- Live updates (server push instead of polling) ---------- */
+// One EventSource per tab. Each registered loader re-runs (debounced) when
+// the backend publishes a matching change, and after a reconnect.
+let liveSource = null;
+const liveRefreshers = [];
+
+function onLiveEvent(topics, loader) {
+  if (!window.EventSource) {
+    setInterval(loader, 30000); // no SSE support: poll instead
+    return;
+  }
+  let timer = null;
+  const refresh = () => {
+    clearTimeout(timer);
+    timer = setTimeout(loader, 500); // a bulk upload is one reload, not many
+  };
+  if (!liveSource) {
+    liveSource = new EventSource(`${API_URL}/events?topics=results,release`);
+    let connected = false;
+    liveSource.onopen = () => {
+      if (connected) liveRefreshers.forEach((r) => r()); // reconnected: catch up
+      connected = true;
+    };
+    liveSource.addEventListener("resync", () => liveRefreshers.forEach((r) => r()));
+  }
+  liveRefreshers.push(refresh);
+  topics.forEach((topic) => liveSource.addEventListener(topic, refresh));
+}
+
+/* ---------- Batched reads (one /batch request per burst of GETs) ---------- */
+// GETs started in the same tick (e.g. every panel loading on page load) go
+// out together as one POST /batch; each caller gets its own parsed body.
+const BATCH_MAX = 20; // the backend's default BATCH_MAX_REQUESTS
+let pendingReads = [];
+
+function batchedGet(path) {
+  return new Promise((resolve, reject) => {
+    pendingReads.push({ path, resolve, reject });
+    if (pendingReads.length === 1) setTimeout(flushReads, 0);
+  });
+}
+
+function flushReads() {
+  const reads = pendingReads;
+  pendingReads = [];
+  for (let i = 0; i < reads.length; i += BATCH_MAX) sendBatch(reads.slice(i, i + BATCH_MAX));
+}
+
+async function sendBatch(reads) {
+  try {
+    const res = await fetch(`${API_URL}/batch`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ requests: reads.map((r) => ({ path: r.path })) }),
+    });
+    if (!res.ok) throw new Error(`Batch failed (${res.status})`);
+    const data = await res.json();
+    reads.forEach((r, i) => r.resolve(data.responses[i].body));
+  } catch (err) {
+    // Batch unavailable: fall back to one request per read
+    reads.forEach((r) =>
+      fetch(`${API_URL}${r.path}`)
+        .then((res) => res.json())
+        .then(r.resolve, r.reject)
+    );
+  }
+}
+
 document.addEventListener("DOMContentLoaded", () => {
   const userRole = localStorage.getItem("userRole");
   if (userRole !== "admin") return;
@@ -29,8 +103,7 @@ document.addEventListener("DOMContentLoaded", () => {
   const subjectList = document.getElementById("subjectList");
   async function loadSubjects() {
     try {
-      const res = await fetch(`${API_URL}/get-subjects`);
-      const data = await res.json();
+      const data = await batchedGet("/get-subjects");
       if (data.success && subjectList) {
         subjectList.innerHTML = data.subjects.map((s) => `<li>${s.name}</li>`).join("");
       }
@@ -48,7 +121,7 @@ document.addEventListener("DOMContentLoaded", () => {
       try {
         const res = await fetch(`${API_URL}/add-subject`, {
           method: "POST",
-          headers: { "Content-Type": "application/json" },
+          headers: authHeaders({ "Content-Type": "application/json" }),
           body: JSON.stringify({ name: subjectName }),
         });
         const data = await res.json();
@@ -82,7 +155,7 @@ document.addEventListener("DOMContentLoaded", () => {
       try {
         const res = await fetch(`${API_URL}/add-student`, {
           method: "POST",
-          headers: { "Content-Type": "application/json" },
+          headers: authHeaders({ "Content-Type": "application/json" }),
           body: JSON.stringify({
             name,
             gender,
@@ -234,8 +307,7 @@ async function setupAllTables() {
     let currentPage = 1;
 
     try {
-      const res = await fetch(`${API_URL}${refs.endpoint}`);
-      const json = await res.json();
+      const json = await batchedGet(refs.endpoint);
 
       // ✅ handle different API response shapes
       let raw =
@@ -366,6 +438,7 @@ document.addEventListener("click", async (e) => {
   try {
     const res = await fetch(`${API_URL}/delete-${type}/${id}`, {
       method: "DELETE",
+      headers: authHeaders(),
     });
     const data = await res.json();
     if (!res.ok) throw new Error(data?.detail || "Failed to delete");
@@ -423,7 +496,7 @@ document.getElementById("editStudentForm").addEventListener("submit", async (e)
   try {
     const res = await fetch(`${API_URL}/update-student/${id}`, {
       method: "PUT",
-      headers: { "Content-Type": "application/json" },
+      headers: authHeaders({ "Content-Type": "application/json" }),
       body: JSON.stringify({
         name,
         grade,
@@ -457,8 +530,7 @@ window.addEventListener("load", () => {
 
   async function loadResultsSummary() {
     try {
-      const res = await fetch(`${API_URL}/admin/results-summary?term=2025-T1`);
-      const data = await res.json();
+      const data = await batchedGet("/admin/results-summary?term=2025-T1");
       console.log("✅ Results Summary Data:", data);
 
       tableBody.innerHTML = "";
@@ -535,7 +607,7 @@ window.addEventListener("load", () => {
   }
 
   loadResultsSummary();
-  setInterval(loadResultsSummary, 30000);
+  onLiveEvent(["results", "release"], loadResultsSummary);
 });
 
 /* ===============================
@@ -548,8 +620,7 @@ document.addEventListener("DOMContentLoaded", () => {
 
   async function loadResults() {
     try {
-      const res = await fetch(`${API_URL}/admin/view-results`);
-      const data = await res.json();
+      const data = await batchedGet("/admin/view-results");
       tableBody.innerHTML = "";
       if (!data.success || data.results.length === 0) {
         tableBody.innerHTML = `<tr><td colspan="8" style="text-align:center;padding:1rem;">No results yet.</td></tr>`;
@@ -577,7 +648,7 @@ document.addEventListener("DOMContentLoaded", () => {
   }
 
   refreshBtn.addEventListener("click", loadResults);
-  setInterval(loadResults, 30000);
+  onLiveEvent(["results"], loadResults);
   loadResults();
 });
 
@@ -599,7 +670,7 @@ postButton.addEventListener("click", async () => {
 
     const res = await fetch("https://brightpath-3.onrender.com/add-announcement", {
       method: "POST",
-      headers: { "Content-Type": "application/json" },
+      headers: authHeaders({ "Content-Type": "application/json" }),
       body: JSON.stringify({ message, posted_by: adminName }),
     });
 
@@ -69,6 +69,7 @@ if (logoutBtn) {
     e.preventDefault();
     localStorage.removeItem("userEmail");
     localStorage.removeItem("userRole");
+    localStorage.removeItem("authToken");
     window.location.href = "index.html";
   });
 }
@@ -55,6 +55,7 @@ if (loginForm) {
       localStorage.setItem("userRole", user.role);
       localStorage.setItem("userEmail", user.email);
       localStorage.setItem("userName", user.name);
+      localStorage.setItem("authToken", user.token); // signed session token (Authorization: Bearer …)
 
       switch (user.role) {
         case "parent":
@@ -20,12 +20,14 @@ document.addEventListener("DOMContentLoaded", async () => {
   if (userRole !== "parent" || !parentId) return;
 
   try {
-    // === Fetch linked students ===
-    const response = await fetch(`https://brightpath-3.onrender.com/parents/${parentId}/students`);
+    // === One request: children, their released performance and announcements ===
+    const response = await fetch(`https://brightpath-3.onrender.com/parents/${parentId}/dashboard`);
     if (!response.ok) throw new Error("Failed to load student data.");
     const result = await response.json();
 
-    const studentData = result.students?.[0]; // first child
+    renderAnnouncements(result.announcements);
+
+    const studentData = result.children?.[0]; // first child
     if (!studentData) throw new Error("No linked students found.");
 
     // === Display student info ===
@@ -33,13 +35,10 @@ document.addEventListener("DOMContentLoaded", async () => {
     document.getElementById("studentReg").textContent = studentData.reg_no || "—";
     document.getElementById("studentGrade").textContent = studentData.grade || "—";
 
-    // === Fetch performance ===
-    const perfResponse = await fetch(`https://brightpath-3.onrender.com/students/${studentData.id}/performance`);
-    const perfResult = await perfResponse.json();
-
+    // === Display performance ===
     const performanceBody = document.getElementById("performanceData");
-    if (performanceBody && perfResult.performance && perfResult.performance.length > 0) {
-      performanceBody.innerHTML = perfResult.performance
+    if (performanceBody && studentData.performance && studentData.performance.length > 0) {
+      performanceBody.innerHTML = studentData.performance
         .map(
           (item) => `
           <tr>
@@ -59,6 +58,7 @@ document.addEventListener("DOMContentLoaded", async () => {
 
   } catch (err) {
     console.error("Error loading parent dashboard:", err);
+    loadAnnouncements(); // dashboard unavailable: fetch announcements on their own
   }
 
   // Smooth scrolling
@@ -82,14 +82,8 @@ if (summarizeBtn) {
     resultElem.innerText = "Summarizing... ⏳";
 
     try {
-      const res = await fetch("https://brightpath-3.onrender.com/summarize", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ text }),
-      });
-
-      const data = await res.json();
-      resultElem.innerText = data.summary || "No summary available.";
+      const summary = await streamAI("/summarize", { text }, resultElem, "summary");
+      if (!summary) resultElem.innerText = "No summary available.";
     } catch (err) {
       console.error("Summarization error:", err);
       resultElem.innerText = "An error occurred while summarizing.";
@@ -98,8 +92,70 @@ if (summarizeBtn) {
 }
 
 // ===============================
-// Parent: Load Announcements (Auto-refresh every 15s)
+// AI: Stream tokens into an element (Server-Sent Events)
+// ===============================
+async function streamAI(path, payload, resultElem, field) {
+  const res = await fetch(`https://brightpath-3.onrender.com${path}`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json", Accept: "text/event-stream" },
+    body: JSON.stringify({ ...payload, stream: true }),
+  });
+  if (!res.ok || !res.body) throw new Error(`AI request failed (${res.status})`);
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let text = "";
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Each SSE event ends with a blank line
+    const events = buffer.split("\n\n");
+    buffer = events.pop();
+    for (const evt of events) {
+      const type = evt.match(/^event: (.*)$/m)?.[1] || "message";
+      const data = JSON.parse(evt.match(/^data: (.*)$/m)?.[1] || "{}");
+      if (type === "error") throw new Error(data.detail);
+      if (type === "done") text = data[field] ?? text;
+      else text += data.token;
+      resultElem.innerText = text;
+    }
+  }
+  return text;
+}
+
 // ===============================
+// Parent: Load Announcements (live via server push)
+// ===============================
+function announcementItem(a) {
+  const div = document.createElement("div");
+  div.className = "announcement-item";
+  div.innerHTML = `
+    <p>${a.message}</p>
+    <small>— ${a.posted_by || "Admin"} (${new Date(
+      a.created_at
+    ).toLocaleString()})</small>
+  `;
+  return div;
+}
+
+function renderAnnouncements(announcements) {
+  const list = document.getElementById("announcementsList");
+  if (!list) return;
+
+  list.innerHTML = "";
+
+  if (!announcements || announcements.length === 0) {
+    list.innerHTML = `<p class="empty">No announcements yet.</p>`;
+    return;
+  }
+
+  announcements.forEach((a) => list.appendChild(announcementItem(a)));
+}
+
 async function loadAnnouncements() {
   const list = document.getElementById("announcementsList");
   if (!list) return;
@@ -107,35 +163,40 @@ async function loadAnnouncements() {
   try {
     const res = await fetch("https://brightpath-3.onrender.com/get-announcements");
     const data = await res.json();
-
-    list.innerHTML = "";
-
-    if (!data.success || !data.announcements || data.announcements.length === 0) {
-      list.innerHTML = `<p class="empty">No announcements yet.</p>`;
-      return;
-    }
-
-    data.announcements.forEach((a) => {
-      const div = document.createElement("div");
-      div.className = "announcement-item";
-      div.innerHTML = `
-        <p>${a.message}</p>
-        <small>— ${a.posted_by || "Admin"} (${new Date(
-          a.created_at
-        ).toLocaleString()})</small>
-      `;
-      list.appendChild(div);
-    });
+    renderAnnouncements(data.success ? data.announcements : []);
   } catch (err) {
     console.error("Error loading announcements:", err);
     list.innerHTML = `<p class="empty">⚠️ Could not load announcements.</p>`;
   }
 }
 
-// Initialize announcements once DOM is ready
+// New announcements arrive over /events; nothing is fetched while idle
+function watchAnnouncements() {
+  if (!window.EventSource) {
+    setInterval(loadAnnouncements, 15000); // no SSE support: poll instead
+    return;
+  }
+  const source = new EventSource("https://brightpath-3.onrender.com/events?topics=announcements");
+  let connected = false;
+  source.onopen = () => {
+    if (connected) loadAnnouncements(); // reconnected: catch up on anything missed
+    connected = true;
+  };
+  source.addEventListener("resync", loadAnnouncements);
+  source.addEventListener("announcements", (e) => {
+    const list = document.getElementById("announcementsList");
+    const a = JSON.parse(e.data);
+    if (!list || !a) return loadAnnouncements();
+    list.querySelector(".empty")?.remove();
+    list.prepend(announcementItem(a));
+  });
+}
+
+// Announcements arrive with the dashboard; afterwards only live updates are watched
 document.addEventListener("DOMContentLoaded", () => {
-  loadAnnouncements();
-  setInterval(loadAnnouncements, 15000); // refresh every 15s
+  const userRole = localStorage.getItem("userRole");
+  if (userRole !== "parent" || !localStorage.getItem("userId")) loadAnnouncements();
+  watchAnnouncements();
 });
 
 // ===============================